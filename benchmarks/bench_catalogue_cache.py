@@ -0,0 +1,96 @@
+"""
+Compare catalogue requests per second with and without the catalogue cache.
+
+Usage:
+    python benchmarks/bench_catalogue_cache.py [--videos 500] [--requests 500]
+
+The script creates a throwaway test database next to the configured one,
+fills it with videos and progress rows for one user, and calls the video
+list and single video endpoints through the test client, first building
+every response from the database and then through the cache configured in
+``CACHES`` (Redis in the default settings).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'videoflix.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from unittest.mock import patch  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models.signals import post_save  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from videoflix_videos.cache import catalogue_cache_stats, bump_catalogue_version  # noqa: E402
+from videoflix_videos.models import Video, UserVideoProgress  # noqa: E402
+from videoflix_videos.signals import trigger_hls_conversion  # noqa: E402
+
+
+def uncached(name, request, build):
+    return build()
+
+
+def measure(client, urls, requests):
+    """
+    Request the URLs round robin and return requests per second.
+    """
+
+    start = time.perf_counter()
+    for i in range(requests):
+        response = client.get(urls[i % len(urls)])
+        assert response.status_code == 200, response.status_code
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--videos', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        post_save.disconnect(trigger_hls_conversion, sender=Video)
+        user = User.objects.create_user(username='bench', password='bench')
+        Video.objects.bulk_create([
+            Video(title=f'Video {i}', file='videos/originals/x.mp4', thumbnail='thumbnails/x.jpg',
+                  description='Lorem ipsum ' * 20, genre=('Drama', 'Comedy', 'Action')[i % 3])
+            for i in range(args.videos)
+        ])
+        UserVideoProgress.objects.bulk_create([
+            UserVideoProgress(user=user, video=video, last_viewed_position=i)
+            for i, video in enumerate(Video.objects.all()[:args.videos // 4])
+        ])
+        bump_catalogue_version()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        ids = list(Video.objects.values_list('id', flat=True)[:20])
+        endpoints = {
+            'list': ['/videoflix/api/videos/', '/videoflix/api/videos/?genre=Drama',
+                     '/videoflix/api/videos/?fields=grid'],
+            'single': [f'/videoflix/api/videos/{pk}/' for pk in ids],
+        }
+
+        print(f"videos: {args.videos}, requests: {args.requests}")
+        print(f"{'endpoint':<10} {'uncached req/s':>15} {'cached req/s':>13}")
+        for name, urls in endpoints.items():
+            with patch('videoflix_videos.api.views.cached_catalogue_data', uncached):
+                before = measure(client, urls, args.requests)
+            after = measure(client, urls, args.requests)
+            print(f"{name:<10} {before:>15.0f} {after:>13.0f}")
+        print(f"cache stats: {catalogue_cache_stats()}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
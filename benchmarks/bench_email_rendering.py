@@ -0,0 +1,64 @@
+"""
+Compare per-message email rendering through Django with the precompiled templates.
+
+Usage:
+    python benchmarks/bench_email_rendering.py [--messages 20000]
+
+Reports the messages rendered per second for the welcome and password reset
+templates, first with ``render_to_string`` on every message as the email
+utils used to do, then with ``videoflix_auth.api.email_templates``.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'videoflix.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.staticfiles.storage import staticfiles_storage  # noqa: E402
+from django.template.loader import render_to_string  # noqa: E402
+from videoflix_auth.api.email_templates import render_email  # noqa: E402
+
+TEMPLATES = {
+    'emails/welcome_email.html': 'activation_link',
+    'emails/reset_password_email.html': 'reset_link',
+}
+
+
+def render_django(template_name, **context):
+    context['STATIC_URL'] = staticfiles_storage.url('')
+    return render_to_string(template_name, context)
+
+
+def measure(fn, template_name, link_name, messages):
+    """
+    Render the template for ``messages`` users and return messages per second.
+    """
+
+    start = time.perf_counter()
+    for i in range(messages):
+        fn(template_name, user_name=f'user{i}', **{link_name: f'https://videoflix.paul-ivan.com/x/{i}/'})
+    return messages / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'template':<34} {'django msg/s':>14} {'compiled msg/s':>16} {'speedup':>8}")
+    for template_name, link_name in TEMPLATES.items():
+        render_email(template_name, user_name='warmup', **{link_name: 'https://videoflix.paul-ivan.com/'})
+        before = measure(render_django, template_name, link_name, args.messages)
+        after = measure(render_email, template_name, link_name, args.messages)
+        print(f"{template_name:<34} {before:>14.0f} {after:>16.0f} {after / before:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
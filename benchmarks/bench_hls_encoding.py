@@ -0,0 +1,90 @@
+"""
+Compare the per-variant HLS encode loop against the single-pass encode.
+
+Usage:
+    python benchmarks/bench_hls_encoding.py path/to/source.mp4 [--runs 3]
+
+For each mode the script reports the wall-clock seconds and the CPU seconds
+spent by ffmpeg (user + system of the child processes), both normalised per
+minute of source video.
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from videoflix.settings import HLS_RENDITION_LADDER  # noqa: E402
+from videoflix_videos.hls import (  # noqa: E402
+    MASTER_PLAYLIST_NAME, build_ladder, build_variant_command,
+    build_single_pass_command, render_master_playlist, probe_video,
+)
+
+
+def run_per_variant(ffmpeg, input_file, output_dir, ladder):
+    """
+    Encode the ladder the old way: one ffmpeg process per variant.
+    """
+
+    for v in ladder:
+        cmd = build_variant_command(ffmpeg, input_file, output_dir, v)
+        subprocess.run(cmd, check=True, capture_output=True)
+    with open(os.path.join(output_dir, MASTER_PLAYLIST_NAME), 'w') as f:
+        f.write(render_master_playlist(ladder))
+
+
+def run_single_pass(ffmpeg, input_file, output_dir, ladder):
+    """
+    Encode the ladder with a single decode and one ffmpeg process.
+    """
+
+    cmd = build_single_pass_command(ffmpeg, input_file, output_dir, ladder)
+    subprocess.run(cmd, check=True, capture_output=True)
+
+
+def measure(fn, ffmpeg, input_file, ladder):
+    """
+    Run one encode into a scratch directory and return (wall, cpu) seconds.
+    """
+
+    output_dir = tempfile.mkdtemp(prefix='hls-bench-')
+    try:
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        fn(ffmpeg, input_file, output_dir, ladder)
+        wall = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+        return wall, cpu
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input_file')
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--ffmpeg', default=shutil.which('ffmpeg') or '/usr/bin/ffmpeg')
+    parser.add_argument('--ffprobe', default=shutil.which('ffprobe') or '/usr/bin/ffprobe')
+    args = parser.parse_args()
+
+    metadata = probe_video(args.ffprobe, args.input_file)
+    ladder = build_ladder(metadata['width'], metadata['height'], HLS_RENDITION_LADDER)
+    minutes = metadata['duration'] / 60
+    print(f"source: {args.input_file} ({minutes:.2f} min, {len(ladder)} renditions), runs: {args.runs}")
+    print(f"{'mode':<12} {'wall s/min':>12} {'cpu s/min':>12}")
+    for name, fn in (('per_variant', run_per_variant), ('single_pass', run_single_pass)):
+        results = [measure(fn, args.ffmpeg, args.input_file, ladder) for _ in range(args.runs)]
+        wall = sum(r[0] for r in results) / len(results)
+        cpu = sum(r[1] for r in results) / len(results)
+        print(f"{name:<12} {wall / minutes:>12.2f} {cpu / minutes:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
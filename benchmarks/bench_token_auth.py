@@ -0,0 +1,88 @@
+"""
+Compare authenticated requests per second with DRF's TokenAuthentication
+and CachedTokenAuthentication.
+
+Usage:
+    python benchmarks/bench_token_auth.py [--users 200] [--requests 2000]
+
+The script creates a throwaway test database next to the configured one,
+gives every user a token and sends conditional requests for the video list
+round robin over the users. Since the catalogue answers these with a 304
+from the cache, authentication is the only database work left per request.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'videoflix.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from unittest.mock import patch  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from rest_framework.authentication import TokenAuthentication  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework.views import APIView  # noqa: E402
+from videoflix_auth.authentication import CachedTokenAuthentication, local_cache  # noqa: E402
+from videoflix_auth.models import AuthToken  # noqa: E402
+
+URL = '/videoflix/api/videos/'
+
+
+class DatabaseTokenAuthentication(TokenAuthentication):
+    model = AuthToken
+
+
+def measure(clients, requests):
+    """
+    Send the requests round robin and return (requests per second, queries per request).
+    """
+
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for i in range(requests):
+            client, etag = clients[i % len(clients)]
+            response = client.get(URL, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == 304, response.status_code
+        elapsed = time.perf_counter() - start
+    return requests / elapsed, len(queries) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        clients = []
+        for i in range(args.users):
+            token = AuthToken.objects.create(user=User.objects.create_user(username=f'bench{i}'))
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            clients.append((client, client.get(URL)['ETag']))
+
+        print(f"users: {args.users}, requests: {args.requests}")
+        print(f"{'authentication':<28} {'req/s':>8} {'queries/req':>12}")
+        for name, auth_class in (('TokenAuthentication', DatabaseTokenAuthentication),
+                                 ('CachedTokenAuthentication', CachedTokenAuthentication)):
+            local_cache.clear()
+            with patch.object(APIView, 'authentication_classes', [auth_class]):
+                measure(clients, len(clients))
+                rate, queries = measure(clients, args.requests)
+            print(f"{name:<28} {rate:>8.0f} {queries:>12.2f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
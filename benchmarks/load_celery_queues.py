@@ -0,0 +1,137 @@
+"""
+Measure short-task latency while long tasks saturate the workers.
+
+Usage:
+    python benchmarks/load_celery_queues.py [--broker redis://127.0.0.1:6379/1]
+        [--long 8] [--long-seconds 20] [--short 40]
+
+The script starts Celery workers for this module in two layouts and reports
+how long short tasks wait between being enqueued and starting to run, while
+the long tasks (standing in for ``convert_to_hls``) keep the workers busy:
+
+    shared  one worker consuming the default queue for every task
+    routed  one worker per queue, long tasks on ``transcode`` and short
+            tasks on ``email``, tuned by ``CELERY_QUEUE_PROFILES``
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'videoflix.settings')
+
+from celery import Celery  # noqa: E402
+
+import videoflix.celery  # noqa: E402,F401  applies the queue profiles to the workers
+
+BROKER_URL = os.getenv('LOAD_BROKER_URL', 'redis://127.0.0.1:6379/1')
+
+app = Celery('load_celery_queues')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.conf.update(broker_url=BROKER_URL, result_backend=BROKER_URL)
+
+LAYOUTS = {
+    'shared': {'long': 'default', 'short': 'default', 'workers': [['default']]},
+    'routed': {'long': 'transcode', 'short': 'email', 'workers': [['transcode'], ['email']]},
+}
+
+
+@app.task(name='load.long_task', acks_late=True)
+def long_task(seconds):
+    """
+    Keep a worker process busy, like an encode would.
+    """
+
+    time.sleep(seconds)
+
+
+@app.task(name='load.short_task')
+def short_task(enqueued_at):
+    """
+    Return how long the task waited in the queue.
+    """
+
+    return time.time() - enqueued_at
+
+
+def start_workers(queue_sets):
+    """
+    Start one worker subprocess per queue set and wait until all answer a ping.
+    """
+
+    env = dict(os.environ, LOAD_BROKER_URL=BROKER_URL)
+    workers = []
+    for i, queues in enumerate(queue_sets):
+        cmd = [
+            sys.executable, '-m', 'celery', '-A', 'load_celery_queues', 'worker',
+            '-Q', ','.join(queues), '-n', f'load{i}@%h', '--loglevel=WARNING',
+        ]
+        workers.append(subprocess.Popen(cmd, cwd=os.path.dirname(__file__), env=env))
+    deadline = time.time() + 60
+    while len(app.control.ping(timeout=1) or []) < len(workers):
+        if time.time() > deadline:
+            stop_workers(workers)
+            raise RuntimeError('Workers did not start within 60 seconds.')
+    return workers
+
+
+def stop_workers(workers):
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.wait()
+
+
+def run_layout(name, args):
+    """
+    Saturate the long-task queue and return the queue latency of the short tasks.
+    """
+
+    layout = LAYOUTS[name]
+    app.control.purge()
+    workers = start_workers(layout['workers'])
+    try:
+        for _ in range(args.long):
+            long_task.apply_async((args.long_seconds,), queue=layout['long'])
+        time.sleep(1)
+        results = []
+        for _ in range(args.short):
+            results.append(short_task.apply_async((time.time(),), queue=layout['short']))
+            time.sleep(args.short_interval)
+        timeout = args.long * args.long_seconds + 60
+        return [r.get(timeout=timeout) for r in results]
+    finally:
+        stop_workers(workers)
+        app.control.purge()
+
+
+def main():
+    global BROKER_URL
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--broker', default=BROKER_URL)
+    parser.add_argument('--long', type=int, default=8)
+    parser.add_argument('--long-seconds', type=float, default=20)
+    parser.add_argument('--short', type=int, default=40)
+    parser.add_argument('--short-interval', type=float, default=0.25)
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), action='append')
+    args = parser.parse_args()
+
+    BROKER_URL = args.broker
+    app.conf.update(broker_url=BROKER_URL, result_backend=BROKER_URL)
+
+    print(f"long tasks: {args.long} x {args.long_seconds}s, short tasks: {args.short}")
+    print(f"{'layout':<8} {'p50 s':>8} {'p95 s':>8} {'max s':>8}")
+    for name in args.layout or ['shared', 'routed']:
+        latencies = sorted(run_layout(name, args))
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{name:<8} {statistics.median(latencies):>8.2f} {p95:>8.2f} {latencies[-1]:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Compare database writes of progress heartbeats with and without write-behind.
+
+Usage:
+    python benchmarks/load_progress_write_behind.py [--viewers 50] [--beats 20]
+        [--flush-every 200]
+
+The script creates a throwaway test database next to the configured one and
+lets every viewer send heartbeats to ``PATCH /video/<id>/progress/``, once
+writing straight to the database and once with ``PROGRESS_WRITE_BEHIND``,
+where the buffer is flushed after every ``--flush-every`` heartbeats as the
+periodic task would. After each heartbeat the viewer reads the video back to
+check that it sees its own write. The cache and progress buffer use the
+separate Redis database given by ``--cache-url``, which is flushed.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'videoflix.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models.signals import post_save  # noqa: E402
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from videoflix_videos.models import Video, UserVideoProgress  # noqa: E402
+from videoflix_videos.progress import flush_progress  # noqa: E402
+from videoflix_videos.signals import trigger_hls_conversion  # noqa: E402
+
+
+def run(viewers, videos, beats, flush_every):
+    """
+    Send the heartbeats and return (seconds, db writes, stale reads).
+    """
+
+    clients = []
+    for user, video in zip(viewers, videos):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        clients.append((client, video))
+    stale = 0
+    sent = 0
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for beat in range(beats):
+            for client, video in clients:
+                position = float(beat * 5)
+                client.patch(f'/videoflix/api/video/{video.id}/progress/',
+                             {'last_viewed_position': position, 'viewed': False}, format='json')
+                seen = client.get(f'/videoflix/api/videos/{video.id}/').data['user_progress']
+                if not seen or seen['last_viewed_position'] != position:
+                    stale += 1
+                sent += 1
+                if flush_every and sent % flush_every == 0:
+                    flush_progress()
+        while flush_every and flush_progress():
+            pass
+        elapsed = time.perf_counter() - start
+    writes = sum(1 for q in queries if q['sql'].startswith(('INSERT', 'UPDATE')))
+    return elapsed, writes, stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--viewers', type=int, default=50)
+    parser.add_argument('--beats', type=int, default=20)
+    parser.add_argument('--flush-every', type=int, default=200)
+    parser.add_argument('--cache-url', default='redis://127.0.0.1:6379/15')
+    args = parser.parse_args()
+    caches = {'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': args.cache_url,
+        'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+    }}
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with override_settings(CACHES=caches):
+            compare(args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def compare(args):
+    post_save.disconnect(trigger_hls_conversion, sender=Video)
+    viewers = [User.objects.create_user(username=f'viewer{i}') for i in range(args.viewers)]
+    videos = [Video.objects.create(title=f'Video {i}', file='videos/originals/x.mp4',
+                                   thumbnail='thumbnails/x.jpg') for i in range(args.viewers)]
+    print(f"viewers: {args.viewers}, heartbeats: {args.viewers * args.beats}")
+    print(f"{'mode':<14} {'db writes':>10} {'writes/s':>10} {'stale reads':>12}")
+    for mode, write_behind, flush_every in (('direct', False, 0), ('write_behind', True, args.flush_every)):
+        UserVideoProgress.objects.all().delete()
+        cache.clear()
+        with override_settings(PROGRESS_WRITE_BEHIND=write_behind):
+            elapsed, writes, stale = run(viewers, videos, args.beats, flush_every)
+        print(f"{mode:<14} {writes:>10} {writes / elapsed:>10.1f} {stale:>12}")
+    final = UserVideoProgress.objects.filter(last_viewed_position=(args.beats - 1) * 5).count()
+    print(f"rows with the last position after the final flush: {final}/{args.viewers}")
+
+if __name__ == '__main__':
+    main()
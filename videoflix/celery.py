@@ -0,0 +1,68 @@
+"""
+Celery application for the videoflix project.
+
+Workers are started per queue so that long transcodes never sit in front of
+short tasks such as emails, e.g.::
+
+    celery -A videoflix worker -Q transcode -n transcode@%h
+    celery -A videoflix worker -Q email,default -n light@%h
+
+Each queue has a profile in ``settings.CELERY_QUEUE_PROFILES`` which sets the
+prefetch multiplier and, unless ``--concurrency`` is given, the pool size of
+the worker consuming it.
+"""
+
+import os
+
+from celery import Celery
+from celery.signals import celeryd_init
+from celery.utils.text import str_to_list
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'videoflix.settings')
+
+app = Celery('videoflix')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+def apply_queue_profile(conf, queues, concurrency=None):
+    """
+    Tune a worker's prefetch and concurrency for the queues it consumes.
+
+    A worker consuming several queues gets the most conservative values of
+    their profiles, so a transcode queue is never prefetched eagerly just
+    because it shares a worker with the email queue.
+
+    Args:
+        conf: The Celery configuration of the worker.
+        queues: The queue names passed with ``-Q``, as a list or comma separated string.
+        concurrency: The ``--concurrency`` given on the command line, if any.
+
+    Returns:
+        dict: The applied profile, or ``None`` if no queue has a profile.
+    """
+
+    from django.conf import settings
+
+    profiles = [settings.CELERY_QUEUE_PROFILES[q] for q in str_to_list(queues or [])
+                if q in settings.CELERY_QUEUE_PROFILES]
+    if not profiles:
+        return None
+    profile = {
+        'prefetch_multiplier': min(p['prefetch_multiplier'] for p in profiles),
+        'concurrency': min(p['concurrency'] for p in profiles),
+    }
+    conf.worker_prefetch_multiplier = profile['prefetch_multiplier']
+    if not concurrency:
+        conf.worker_concurrency = profile['concurrency']
+    return profile
+
+
+@celeryd_init.connect
+def configure_worker(sender=None, conf=None, options=None, **kwargs):
+    """
+    Apply the queue profile when a worker starts.
+    """
+
+    options = options or {}
+    apply_queue_profile(conf, options.get('queues'), options.get('concurrency'))
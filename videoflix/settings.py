@@ -14,6 +14,8 @@ from pathlib import Path
 from dotenv import load_dotenv
 import os
 from urllib.parse import urlparse
+from kombu import Queue
+from importlib.util import find_spec
 
 load_dotenv()
 
@@ -21,6 +23,30 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# How MediaView hands files to the client: 'python' streams them with Range
+# support, 'x-accel-redirect' (nginx) and 'x-sendfile' (Apache, lighttpd)
+# leave the transfer to the front proxy after the access check.
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'python')
+# Internal nginx location aliasing MEDIA_ROOT, used with 'x-accel-redirect'.
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+# Media below these prefixes is served without a token.
+MEDIA_PUBLIC_PREFIXES = ['thumbnails/']
+# Browser cache lifetime of segments, originals and images, which never change.
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Originals and HLS output are kept below MEDIA_ROOT unless a bucket is set;
+# then they go to S3 or an S3 compatible store such as MinIO (set
+# AWS_S3_ENDPOINT_URL), which needs django-storages[s3]. MediaView checks
+# access and redirects to a signed URL of the object.
+AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME', '')
+if AWS_STORAGE_BUCKET_NAME:
+    AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL') or None
+    AWS_S3_REGION_NAME = os.getenv('AWS_S3_REGION_NAME') or None
+    AWS_QUERYSTRING_EXPIRE = int(os.getenv('AWS_QUERYSTRING_EXPIRE', 60 * 60))
+    STORAGES = {
+        'default': {'BACKEND': 'storages.backends.s3.S3Storage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
 
 
 SECRET_KEY = os.getenv('SECRET_KEY')
@@ -109,6 +135,43 @@ if REDIS_PASSWORD:
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
 else:
     CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
+
+# Long transcodes and short tasks live on separate queues so an encode backlog
+# never delays emails. Tasks without a route go to the default queue.
+CELERY_TASK_QUEUES = (
+    Queue('default', routing_key='default'),
+    Queue('transcode', routing_key='transcode'),
+    Queue('thumbnails', routing_key='thumbnails'),
+    Queue('email', routing_key='email'),
+    Queue('maintenance', routing_key='maintenance'),
+)
+CELERY_TASK_ROUTES = {
+    'videoflix_videos.tasks.convert_to_hls': {'queue': 'transcode'},
+    'videoflix_videos.tasks.encode_hls_chunk': {'queue': 'transcode'},
+    'videoflix_videos.tasks.stitch_hls_chunks': {'queue': 'transcode'},
+    'videoflix_videos.tasks.fail_transcode_job': {'queue': 'maintenance'},
+    'videoflix_videos.tasks.generate_artwork': {'queue': 'thumbnails'},
+    'videoflix_auth.tasks.send_outbox': {'queue': 'email'},
+    'videoflix_videos.tasks.flush_progress_buffer': {'queue': 'maintenance'},
+    'videoflix_auth.tasks.purge_expired_tokens': {'queue': 'maintenance'},
+    'videoflix_auth.tasks.purge_expired_reset_tokens': {'queue': 'maintenance'},
+    'videoflix_videos.tasks.purge_stale_uploads': {'queue': 'maintenance'},
+}
+# Per-queue worker tuning, applied by videoflix.celery when a worker starts.
+# Transcodes take one task at a time so a busy worker never hoards encodes.
+CELERY_QUEUE_PROFILES = {
+    'transcode': {'concurrency': 2, 'prefetch_multiplier': 1},
+    'thumbnails': {'concurrency': 4, 'prefetch_multiplier': 1},
+    'email': {'concurrency': 8, 'prefetch_multiplier': 4},
+    'maintenance': {'concurrency': 2, 'prefetch_multiplier': 4},
+    'default': {'concurrency': 4, 'prefetch_multiplier': 4},
+}
+# Long tasks are acknowledged after they finish (acks_late), so the broker must
+# not redeliver them while they are still running.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': int(os.getenv('CELERY_VISIBILITY_TIMEOUT', 6 * 60 * 60)),
+}
 
 CACHES = {
     'default': {
@@ -139,6 +202,31 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# New passwords are hashed with PASSWORD_HASHER ('argon2' needs argon2-cffi,
+# 'bcrypt' needs bcrypt) when its library is installed, else with PBKDF2.
+# Hashes made with another hasher are upgraded on the user's next login.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'argon2')
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+_FAST_HASHERS = {
+    'argon2': ('argon2', 'django.contrib.auth.hashers.Argon2PasswordHasher'),
+    'bcrypt': ('bcrypt', 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher'),
+}
+if PASSWORD_HASHER in _FAST_HASHERS and find_spec(_FAST_HASHERS[PASSWORD_HASHER][0]):
+    PASSWORD_HASHERS.remove(_FAST_HASHERS[PASSWORD_HASHER][1])
+    PASSWORD_HASHERS.insert(0, _FAST_HASHERS[PASSWORD_HASHER][1])
+
+# Failed logins per client IP and per account within LOGIN_ATTEMPT_WINDOW
+# seconds before further attempts are rejected without checking a password.
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv('LOGIN_MAX_FAILURES_PER_IP', 50))
+LOGIN_MAX_FAILURES_PER_ACCOUNT = int(os.getenv('LOGIN_MAX_FAILURES_PER_ACCOUNT', 10))
+LOGIN_ATTEMPT_WINDOW = int(os.getenv('LOGIN_ATTEMPT_WINDOW', 15 * 60))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -178,15 +266,143 @@ except ValueError:
 EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', 'True') == 'True'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+# Emails are queued in the MailOutbox and sent by the send_outbox task in
+# batches over one SMTP connection; failed sends back off exponentially.
+# Beat also runs the task every EMAIL_OUTBOX_SWEEP_INTERVAL seconds.
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 50))
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_BACKOFF = 60
+EMAIL_OUTBOX_SWEEP_INTERVAL = 60
 
 
 
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'videoflix_auth.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Reverse proxies in front of Django (nginx). Client IPs are read from
+    # X-Forwarded-For behind them; set to 0 when Django is exposed directly.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+}
+
+
+# Seconds an authenticated token stays in the shared cache and in the
+# in-process cache of each worker, see videoflix_auth.authentication.
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 5 * 60))
+AUTH_TOKEN_LOCAL_TTL = int(os.getenv('AUTH_TOKEN_LOCAL_TTL', 5))
+AUTH_TOKEN_LOCAL_SIZE = 10000
+# Tokens expire after this many seconds without use, and at the latest this
+# long after the login that created them.
+AUTH_TOKEN_IDLE_TIMEOUT = int(os.getenv('AUTH_TOKEN_IDLE_TIMEOUT', 14 * 24 * 60 * 60))
+AUTH_TOKEN_MAX_AGE = int(os.getenv('AUTH_TOKEN_MAX_AGE', 90 * 24 * 60 * 60))
+# last_used_at is written at most once per interval, not on every request.
+AUTH_TOKEN_TOUCH_INTERVAL = 60 * 60
+# A remember-login with a token older than this returns a new token.
+AUTH_TOKEN_ROTATE_AFTER = int(os.getenv('AUTH_TOKEN_ROTATE_AFTER', 7 * 24 * 60 * 60))
+AUTH_TOKEN_PURGE_BATCH_SIZE = 1000
+PASSWORD_RESET_PURGE_BATCH_SIZE = 1000
+
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', '/usr/bin/ffmpeg')
+# 'single_pass' decodes the source once for all HLS variants,
+# 'per_variant' runs one ffmpeg process per variant.
+HLS_ENCODING_MODE = os.getenv('HLS_ENCODING_MODE', 'single_pass')
+FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', '/usr/bin/ffprobe')
+# Sources at least this long (seconds) are split into chunks that are
+# encoded in parallel across workers; 0 disables the chunked pipeline.
+HLS_CHUNKED_MIN_DURATION = int(os.getenv('HLS_CHUNKED_MIN_DURATION', 600))
+HLS_CHUNK_SECONDS = int(os.getenv('HLS_CHUNK_SECONDS', 120))
+# With a remote storage, encodes run in scratch directories below HLS_WORK_DIR
+# (the system temp dir if unset) and HLS_UPLOAD_WORKERS threads store the
+# segments while ffmpeg runs, looking for new ones every poll interval.
+HLS_WORK_DIR = os.getenv('HLS_WORK_DIR') or None
+HLS_UPLOAD_WORKERS = int(os.getenv('HLS_UPLOAD_WORKERS', 8))
+HLS_UPLOAD_POLL_INTERVAL = 1.0
+# Poster thumbnails generated for every video: width in pixels per size and
+# image formats ('webp' needs an ffmpeg built with libwebp). The poster is
+# the first scene change scoring above the threshold in the scanned seconds,
+# which start after the opening 5% of the video.
+THUMBNAIL_SIZES = {'list': 320, 'card': 640, 'hero': 1280}
+THUMBNAIL_FORMATS = os.getenv('THUMBNAIL_FORMATS', 'webp,jpeg').split(',')
+THUMBNAIL_SCENE_THRESHOLD = 0.4
+THUMBNAIL_SCENE_SCAN_SECONDS = 300
+# Seek-preview sprites: a tile every SPRITE_INTERVAL seconds, SPRITE_COLUMNS
+# x SPRITE_ROWS tiles per sheet, indexed by a WebVTT file.
+SPRITE_INTERVAL = 10
+SPRITE_TILE_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+# Renditions offered to players. Rungs taller than the source are skipped.
+HLS_RENDITION_LADDER = [
+    {'name': '240p', 'height': 240, 'bitrate': '500k'},
+    {'name': '360p', 'height': 360, 'bitrate': '1000k'},
+    {'name': '480p', 'height': 480, 'bitrate': '1500k'},
+    {'name': '720p', 'height': 720, 'bitrate': '2500k'},
+    {'name': '1080p', 'height': 1080, 'bitrate': '5000k'},
+]
+# Publish the priority renditions first and add the others to the master
+# playlist once they finish, instead of waiting for the full ladder. In
+# single-pass mode this decodes the source twice.
+HLS_PROGRESSIVE_PUBLISH = os.getenv('HLS_PROGRESSIVE_PUBLISH', 'True') == 'True'
+HLS_PRIORITY_RENDITIONS = ['240p', '360p']
+TRANSCODE_MAX_RETRIES = int(os.getenv('TRANSCODE_MAX_RETRIES', 3))
+# Seconds before the first retry; doubles with every further attempt.
+TRANSCODE_RETRY_BACKOFF = int(os.getenv('TRANSCODE_RETRY_BACKOFF', 60))
+# Active jobs without an update for this long are taken over by a new run.
+TRANSCODE_STALE_SECONDS = int(os.getenv('TRANSCODE_STALE_SECONDS', 3600))
+
+# Seconds a serialized catalogue page or video stays cached. Entries are
+# invalidated earlier by bumping the catalogue version when videos change.
+CATALOGUE_CACHE_TIMEOUT = int(os.getenv('CATALOGUE_CACHE_TIMEOUT', 60 * 60))
+# Videos returned by the continue watching endpoint by default and at most.
+CONTINUE_WATCHING_LIMIT = 20
+CONTINUE_WATCHING_MAX_LIMIT = 100
+# Progress events accepted by one request to the bulk progress sync endpoint.
+PROGRESS_SYNC_MAX_EVENTS = 500
+
+# Hash uploaded files while they are received, then store them as usual.
+FILE_UPLOAD_HANDLERS = [
+    'videoflix_videos.uploads.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Resumable uploads: largest file accepted, largest chunk per PATCH request,
+# and seconds an unfinished upload is kept after its last chunk.
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 20 * 1024 ** 3))
+UPLOAD_MAX_CHUNK_SIZE = int(os.getenv('UPLOAD_MAX_CHUNK_SIZE', 100 * 1024 ** 2))
+UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 24 * 60 * 60))
+
+# Buffer playback progress heartbeats in Redis and write them to the
+# database in bulk every PROGRESS_FLUSH_INTERVAL seconds.
+PROGRESS_WRITE_BEHIND = os.getenv('PROGRESS_WRITE_BEHIND', 'False') == 'True'
+PROGRESS_FLUSH_INTERVAL = int(os.getenv('PROGRESS_FLUSH_INTERVAL', 10))
+PROGRESS_FLUSH_BATCH_SIZE = 1000
+PROGRESS_FLUSH_MAX_BATCHES = 20
+# Seconds buffered progress stays in Redis after the last heartbeat.
+PROGRESS_BUFFER_TTL = 60 * 60
+
+CELERY_BEAT_SCHEDULE = {
+    'send-outbox': {
+        'task': 'videoflix_auth.tasks.send_outbox',
+        'schedule': EMAIL_OUTBOX_SWEEP_INTERVAL,
+    },
+    'flush-progress-buffer': {
+        'task': 'videoflix_videos.tasks.flush_progress_buffer',
+        'schedule': PROGRESS_FLUSH_INTERVAL,
+    },
+    'purge-expired-tokens': {
+        'task': 'videoflix_auth.tasks.purge_expired_tokens',
+        'schedule': 60 * 60,
+    },
+    'purge-expired-reset-tokens': {
+        'task': 'videoflix_auth.tasks.purge_expired_reset_tokens',
+        'schedule': 60 * 60,
+    },
+    'purge-stale-uploads': {
+        'task': 'videoflix_videos.tasks.purge_stale_uploads',
+        'schedule': 60 * 60,
+    },
 }
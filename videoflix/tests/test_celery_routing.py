@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from videoflix.celery import app, apply_queue_profile
+
+
+class CeleryRoutingTestCase(SimpleTestCase):
+
+    def route(self, name):
+        return app.amqp.router.route({}, name)['queue'].name
+
+    def test_transcode_tasks_use_transcode_queue(self):
+        """Long running encode tasks are kept off the default queue."""
+        self.assertEqual(self.route('videoflix_videos.tasks.convert_to_hls'), 'transcode')
+        self.assertEqual(self.route('videoflix_videos.tasks.encode_hls_chunk'), 'transcode')
+
+    def test_unrouted_tasks_use_default_queue(self):
+        self.assertEqual(self.route('videoflix_videos.tasks.test_celery_task'), 'default')
+
+    def test_queues_have_own_routing_key(self):
+        for queue in app.conf.task_queues:
+            self.assertEqual(queue.routing_key, queue.name)
+
+    def test_long_tasks_ack_late(self):
+        from videoflix_videos.tasks import convert_to_hls, encode_hls_chunk
+        self.assertTrue(convert_to_hls.acks_late)
+        self.assertTrue(encode_hls_chunk.acks_late)
+
+
+class QueueProfileTestCase(SimpleTestCase):
+
+    def test_single_queue_profile(self):
+        conf = SimpleNamespace(worker_prefetch_multiplier=4, worker_concurrency=None)
+        apply_queue_profile(conf, 'transcode')
+        self.assertEqual(conf.worker_prefetch_multiplier, 1)
+        self.assertEqual(conf.worker_concurrency, 2)
+
+    def test_mixed_queues_use_most_conservative_values(self):
+        conf = SimpleNamespace(worker_prefetch_multiplier=4, worker_concurrency=None)
+        apply_queue_profile(conf, ['email', 'transcode'])
+        self.assertEqual(conf.worker_prefetch_multiplier, 1)
+        self.assertEqual(conf.worker_concurrency, 2)
+
+    def test_command_line_concurrency_wins(self):
+        conf = SimpleNamespace(worker_prefetch_multiplier=4, worker_concurrency=None)
+        apply_queue_profile(conf, 'email', concurrency=3)
+        self.assertEqual(conf.worker_prefetch_multiplier, 4)
+        self.assertIsNone(conf.worker_concurrency)
+
+    def test_unknown_queue_is_ignored(self):
+        conf = SimpleNamespace(worker_prefetch_multiplier=4, worker_concurrency=None)
+        self.assertIsNone(apply_queue_profile(conf, None))
+        self.assertIsNone(apply_queue_profile(conf, 'other'))
+        self.assertEqual(conf.worker_prefetch_multiplier, 4)
@@ -15,14 +15,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from videoflix_videos.api.media import MediaView
 
 urlpatterns = [
     path('videoflix/admin/', admin.site.urls),
     path('videoflix/api/', include ('videoflix_auth.api.urls')),
     path('videoflix/api/', include ('videoflix_videos.api.urls')),
-]
-
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', MediaView.as_view(), name='media'),
+]
\ No newline at end of file
@@ -1,3 +1,17 @@
 from django.contrib import admin
+from .models import MailOutbox, AuthToken
 
-# Register your models here.
+
+@admin.register(MailOutbox)
+class MailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'template', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'template')
+    search_fields = ('to_email',)
+    readonly_fields = ('created_at', 'sent_at')
+
+
+@admin.register(AuthToken)
+class AuthTokenAdmin(admin.ModelAdmin):
+    list_display = ('user', 'created_at', 'last_used_at')
+    search_fields = ('user__username', 'user__email')
+    raw_id_fields = ('user',)
@@ -0,0 +1,107 @@
+"""
+Precompiled rendering of the email templates in ``templates/emails``.
+
+The first time a template is rendered it goes through the Django template
+engine once, with ``STATIC_URL`` and every other static value resolved and
+each per-user variable replaced by a marker. The output is split at the
+markers into literal chunks, so every later render only escapes the user
+values and joins them with the chunks.
+
+A template that uses its variables in a way the markers cannot represent,
+such as filters or ``{% if %}`` blocks, is detected when it is compiled and
+keeps being rendered by Django.
+"""
+
+import re
+from functools import lru_cache
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template.loader import get_template
+from django.utils.html import conditional_escape
+import logging
+logger = logging.getLogger(__name__)
+
+MARKER = '\x00{}\x00'
+MARKER_RE = re.compile('\x00(\\w+)\x00')
+
+
+class CompiledEmailTemplate:
+    """
+    An email template rendered ahead of time into literal chunks.
+
+    Args:
+        template_name (str): The template to compile.
+        variables (tuple): The names of the per-user context variables.
+    """
+
+    def __init__(self, template_name, variables):
+        self.template_name = template_name
+        self.variables = variables
+        self.static_context = {'STATIC_URL': staticfiles_storage.url('')}
+        template = get_template(template_name)
+        markers = {name: MARKER.format(name) for name in variables}
+        parts = MARKER_RE.split(template.render({**self.static_context, **markers}))
+        self.chunks = parts[::2]
+        self.names = parts[1::2]
+        self.compiled = self.check(template)
+        if not self.compiled:
+            logger.warning(f"Email template {template_name} cannot be precompiled, rendering it with Django")
+            self.template = template
+
+    def check(self, template):
+        """
+        Return True if the chunks render exactly like the Django template.
+        """
+
+        if not set(self.names) <= set(self.variables):
+            return False
+        probe = {name: f'<probe {name} & "{i}">' for i, name in enumerate(self.variables)}
+        return self.render_chunks(probe) == template.render({**self.static_context, **probe})
+
+    def render_chunks(self, context):
+        values = [conditional_escape(context[name]) for name in self.names]
+        out = [self.chunks[0]]
+        for value, chunk in zip(values, self.chunks[1:]):
+            out.append(value)
+            out.append(chunk)
+        return ''.join(out)
+
+    def render(self, context):
+        """
+        Render the template for one recipient.
+
+        Args:
+            context (dict): The values of the per-user variables.
+
+        Returns:
+            str: The rendered HTML.
+        """
+
+        if self.compiled:
+            return self.render_chunks(context)
+        return self.template.render({**self.static_context, **context})
+
+
+@lru_cache(maxsize=None)
+def get_compiled_template(template_name, variables):
+    """
+    Return the compiled template, compiling it once per process.
+    """
+
+    return CompiledEmailTemplate(template_name, variables)
+
+
+def render_email(template_name, **context):
+    """
+    Render an email template with per-user values.
+
+    Args:
+        template_name (str): The template, e.g. ``'emails/welcome_email.html'``.
+        **context: The per-user variables of the template.
+
+    Returns:
+        str: The rendered HTML, identical to ``render_to_string`` with
+        ``STATIC_URL`` in the context.
+    """
+
+    return get_compiled_template(template_name, tuple(sorted(context))).render(context)
+
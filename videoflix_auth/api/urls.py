@@ -8,4 +8,5 @@ urlpatterns = [
   path('reset-password/confirm/<str:token>/', views.PasswordResetConfirmView.as_view(), name='password_reset_confirm'),
   path('login/', views.LoginView.as_view(), name='login'),
   path('remember-login/', views.TokenLoginView.as_view(), name='token_login'),
+  path('logout/', views.LogoutView.as_view(), name='logout'),
 ]
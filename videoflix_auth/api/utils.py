@@ -1,58 +1,128 @@
 from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.contrib.staticfiles.storage import staticfiles_storage
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.db import transaction
 from datetime import datetime, timedelta
+from videoflix_auth.models import MailOutbox
+from .email_templates import render_email
 
-def send_welcome_email(user_email, user_name, activation_link):
+FROM_EMAIL = "noreply@videoflix.paul-ivan.com"
+
+
+def build_welcome_email(user_email, user_name, activation_link):
     """
-    Sends a welcome email to a user with an activation link.
+    Builds the welcome email with an activation link, without sending it.
 
     Args:
         user_email (str): The user's email address.
         user_name (str): The user's name.
         activation_link (str): The link to activate the user's account.
+
+    Returns:
+        EmailMultiAlternatives: The message with text and HTML parts.
     """
-    context = {
-        'user_name': user_name,
-        'activation_link': activation_link,
-        'STATIC_URL': staticfiles_storage.url(''), 
-    }
-    html_content = render_to_string('emails/welcome_email.html', context)
+    html_content = render_email(
+        'emails/welcome_email.html', user_name=user_name, activation_link=activation_link,
+    )
     text_content = f"Hello {user_name},\n\nPlease activate your account here: {activation_link}"
     email = EmailMultiAlternatives(
         subject="Activate Your Videoflix Account",
-        body=text_content, 
-        from_email="noreply@videoflix.paul-ivan.com",
+        body=text_content,
+        from_email=FROM_EMAIL,
         to=[user_email],
     )
-    email.attach_alternative(html_content, "text/html") 
-    email.send()
-    
-    
-def send_password_reset_email(user_email, user_name, reset_link):
+    email.attach_alternative(html_content, "text/html")
+    return email
+
+
+def build_password_reset_email(user_email, user_name, reset_link):
     """
-    Sends a password reset email to a user with a reset link.
+    Builds the password reset email with a reset link, without sending it.
 
     Args:
         user_email (str): The user's email address.
         user_name (str): The user's name.
         reset_link (str): The link to reset the user's password.
+
+    Returns:
+        EmailMultiAlternatives: The message with text and HTML parts.
     """
-    context = {
-        'user_name': user_name,
-        'reset_link': reset_link,
-        'STATIC_URL': staticfiles_storage.url(''),
-    }
-    html_content = render_to_string('emails/reset_password_email.html', context)
+    html_content = render_email(
+        'emails/reset_password_email.html', user_name=user_name, reset_link=reset_link,
+    )
     text_content = f"Hello {user_name},\n\nYou can reset your password here: {reset_link}"
 
     email = EmailMultiAlternatives(
         subject="Reset Your Videoflix Password",
         body=text_content,
-        from_email="noreply@videoflix.paul-ivan.com",
+        from_email=FROM_EMAIL,
         to=[user_email],
     )
     email.attach_alternative(html_content, "text/html")
-    email.send()
-    
\ No newline at end of file
+    return email
+
+
+EMAIL_BUILDERS = {
+    MailOutbox.WELCOME: build_welcome_email,
+    MailOutbox.PASSWORD_RESET: build_password_reset_email,
+}
+
+
+def build_outbox_email(mail):
+    """
+    Builds the message of a queued outbox email.
+
+    Args:
+        mail (MailOutbox): The queued email.
+
+    Returns:
+        EmailMultiAlternatives: The rendered message.
+    """
+    return EMAIL_BUILDERS[mail.template](mail.to_email, **mail.context)
+
+
+def send_welcome_email(user_email, user_name, activation_link):
+    """
+    Sends a welcome email to a user with an activation link.
+
+    Args:
+        user_email (str): The user's email address.
+        user_name (str): The user's name.
+        activation_link (str): The link to activate the user's account.
+    """
+    build_welcome_email(user_email, user_name, activation_link).send()
+
+
+def send_password_reset_email(user_email, user_name, reset_link):
+    """
+    Sends a password reset email to a user with a reset link.
+
+    Args:
+        user_email (str): The user's email address.
+        user_name (str): The user's name.
+        reset_link (str): The link to reset the user's password.
+    """
+    build_password_reset_email(user_email, user_name, reset_link).send()
+
+
+def queue_email(template, user_email, **context):
+    """
+    Stores an email in the outbox and schedules its delivery.
+
+    The ``send_outbox`` task is queued once the surrounding transaction
+    commits, so the request never waits for the mail server. A broker error
+    while queueing it does not fail the request; the periodic run of the
+    task picks the email up instead.
+
+    Args:
+        template (str): One of the ``MailOutbox`` template names.
+        user_email (str): The recipient's email address.
+        **context: The arguments of the template's builder besides the address.
+
+    Returns:
+        MailOutbox: The queued email.
+    """
+    from videoflix_auth.tasks import send_outbox
+
+    mail = MailOutbox.objects.create(template=template, to_email=user_email, context=context)
+    transaction.on_commit(send_outbox.delay, robust=True)
+    return mail
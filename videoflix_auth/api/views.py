@@ -1,17 +1,23 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny
-from rest_framework.authtoken.models import Token
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed
 from .serializers import RegistrationSerializer
-from .utils import send_welcome_email, send_password_reset_email
+from .utils import queue_email
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_decode
 import uuid
 from django.contrib.auth.models import User
-from videoflix_auth.models import PasswordResetToken
+from django.db import transaction
+from django.conf import settings
+from django.utils.timezone import now
+from datetime import timedelta
+from videoflix_auth.models import PasswordResetToken, MailOutbox, AuthToken
+from videoflix_auth.authentication import CachedTokenAuthentication
+from videoflix_auth.throttling import client_ip, login_blocked, record_failed_login, reset_failed_logins, check_unknown_user_password
 from videoflix_videos.models import UserVideoProgress
 
 
@@ -28,17 +34,20 @@ class RegistrationView(APIView):
         Returns a JSON response with the following keys:
         - message (string): A message indicating that the user was registered successfully.
         - user_id (int): The ID of the user that was just registered.
+        The welcome email is queued in the outbox and sent by a Celery task.
         """
         serializer = RegistrationSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            uid = urlsafe_base64_encode(force_bytes(user.pk))  
-            token = default_token_generator.make_token(user)  
-            send_welcome_email(
-                user_email=user.email,
-                user_name=user.username,
-                activation_link=f"https://videoflix.paul-ivan.com/activate-account/{uid}/{token}/"
-            )
+            with transaction.atomic():
+                user = serializer.save()
+                uid = urlsafe_base64_encode(force_bytes(user.pk))  
+                token = default_token_generator.make_token(user)  
+                queue_email(
+                    MailOutbox.WELCOME,
+                    user.email,
+                    user_name=user.username,
+                    activation_link=f"https://videoflix.paul-ivan.com/activate-account/{uid}/{token}/"
+                )
             return Response({
                 'message': 'You registered successfully',
                 'user_id': user.id
@@ -81,25 +90,43 @@ class LoginView(APIView):
     def post(self, request, *args, **kwargs):
         """
         Authenticate a user using email and password.
+
+        Every successful login creates a new AuthToken, so each device has
+        its own token that expires independently.
+
+        After too many failed logins from the client IP or for the account,
+        see LOGIN_MAX_FAILURES_PER_IP and LOGIN_MAX_FAILURES_PER_ACCOUNT,
+        HTTP 429 is returned before any password is checked. Unknown users
+        are checked against a dummy hash, so they take as long as known ones.
+        A password hashed with an older hasher is rehashed on success.
         """
         username = request.data.get('email')  
         password = request.data.get('password')
+        ip = client_ip(request)
+        if login_blocked(ip, str(username)):
+            return Response({"message": "Too many failed login attempts. Please try again later."},
+                            status=status.HTTP_429_TOO_MANY_REQUESTS,
+                            headers={'Retry-After': str(settings.LOGIN_ATTEMPT_WINDOW)})
         try:
             user = User.objects.get(username=username)
             if not user.check_password(password):
+                record_failed_login(ip, str(username))
                 return Response({"message": "Invalid username or password."}, status=status.HTTP_401_UNAUTHORIZED)
+            reset_failed_logins(str(username))
             if not user.is_active:
                 return Response({"message": "You still didn't activate your account."}, status=status.HTTP_403_FORBIDDEN)
             if user.email == "guest.videoflix@gmail.com":
                 self.reset_guest_progress(user)
 
-            token, _ = Token.objects.get_or_create(user=user)
+            token = AuthToken.objects.create(user=user)
 
             return Response(
                 {"id": user.id, "username": user.username, "token": token.key},
                 status=status.HTTP_200_OK
             )
         except User.DoesNotExist:
+            check_unknown_user_password(password)
+            record_failed_login(ip, str(username))
             return Response({"message": "Invalid username or password."}, status=status.HTTP_401_UNAUTHORIZED)
 
     def reset_guest_progress(self, user):
@@ -124,18 +151,52 @@ class TokenLoginView(APIView):
         - email (string): The email address of the user.
         - token (string): The authentication token of the user.
 
-        The endpoint returns HTTP 200 if the authentication is successful, and HTTP 401 if the token is invalid.
+        The endpoint returns HTTP 200 if the authentication is successful, and HTTP 401 if the token is invalid,
+        expired or its user is inactive. The token is resolved like on every other request, see
+        CachedTokenAuthentication. A token older than AUTH_TOKEN_ROTATE_AFTER is replaced by a new one, which
+        is returned instead.
         """
         token = request.data.get('token')
         try:
-            user = Token.objects.get(key=token).user
+            if not token:
+                raise AuthenticationFailed()
+            user, auth_token = CachedTokenAuthentication().authenticate_credentials(token)
+            if now() - auth_token.created_at >= timedelta(seconds=settings.AUTH_TOKEN_ROTATE_AFTER):
+                token = self.rotate(auth_token).key
             return Response(
                 {  "id": user.id, "email": user.email, "token": token }, status=status.HTTP_200_OK
             )
-        except Token.DoesNotExist:  
+        except AuthenticationFailed:
             return Response(
                 {"message": "Invalid token."}, status=status.HTTP_401_UNAUTHORIZED
         )
+
+
+    def rotate(self, auth_token):
+        """
+        Replace a token by a new one of the same user.
+        """
+        with transaction.atomic():
+            new_token = AuthToken.objects.create(user_id=auth_token.user_id)
+            AuthToken.objects.filter(key=auth_token.key).delete()
+        return new_token
+
+
+class LogoutView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Log the user out by deleting the authentication token of the request.
+
+        The token stops working at once in this process and in the shared
+        cache, and in other workers once their local cache entry expires.
+
+        Returns a JSON response with a message and HTTP 200.
+        """
+        if isinstance(request.auth, AuthToken):
+            request.auth.delete()
+        return Response({"message": "Logged out successfully."}, status=status.HTTP_200_OK)
         
         
 class PasswordResetView(APIView):
@@ -151,19 +212,27 @@ class PasswordResetView(APIView):
         Returns a JSON response with the following key:
         - message (string): A message indicating that the password reset email was sent successfully.
 
-        The endpoint returns HTTP 200 if the email is sent successfully.
+        The endpoint returns HTTP 200 once the email is queued; it is sent by
+        a Celery task. A user has at most one live token: while the last one
+        is valid, further requests neither create a token nor send an email.
         """
         email = request.data.get('email')
         try:
-            user = User.objects.get(email=email)
-            token = str(uuid.uuid4()) 
-            PasswordResetToken.objects.create(user=user, token=token)
-            reset_link = f"https://videoflix.paul-ivan.com/reset-password/confirm/{token}/"
-            send_password_reset_email(
-                user_email=user.email,
-                user_name=user.username,
-                reset_link=reset_link
-            )
+            with transaction.atomic():
+                # Locking the user serializes concurrent requests for the same account.
+                user = User.objects.select_for_update().get(email=email)
+                live = PasswordResetToken.objects.filter(user=user, created_at__gte=PasswordResetToken.valid_since())
+                if not live.exists():
+                    PasswordResetToken.objects.filter(user=user).delete()
+                    token = str(uuid.uuid4()) 
+                    PasswordResetToken.objects.create(user=user, token=token)
+                    reset_link = f"https://videoflix.paul-ivan.com/reset-password/confirm/{token}/"
+                    queue_email(
+                        MailOutbox.PASSWORD_RESET,
+                        user.email,
+                        user_name=user.username,
+                        reset_link=reset_link
+                    )
             return Response({'message': 'Password reset email sent successfully'}, status=status.HTTP_200_OK)
         except User.DoesNotExist:
             return Response({'message': 'Password reset email sent successfully'}, status=status.HTTP_200_OK)  
@@ -190,7 +259,8 @@ class PasswordResetConfirmView(APIView):
         the password fields are missing or do not match.
 
         The endpoint returns HTTP 200 if the password is reset successfully, and HTTP 400 
-        if there is an error.
+        if there is an error. A successful reset deletes the user's authentication token,
+        which logs the user out everywhere.
         """
 
         token = kwargs.get('token')
@@ -201,13 +271,14 @@ class PasswordResetConfirmView(APIView):
         if password != repeated_password:
             return Response({'error': 'Passwords do not match'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            reset_token = PasswordResetToken.objects.get(token=token)
-            if not reset_token.is_valid():
-                return Response({'error': 'Invalid or expired token'}, status=status.HTTP_400_BAD_REQUEST)
+            reset_token = PasswordResetToken.objects.select_related('user').get(
+                token=token, created_at__gte=PasswordResetToken.valid_since()
+            )
             user = reset_token.user
             user.set_password(password)
             user.save()
-            reset_token.delete()
+            AuthToken.objects.filter(user=user).delete()
+            PasswordResetToken.objects.filter(user=user).delete()
             return Response({'message': 'Password reset successfully!'}, status=status.HTTP_200_OK)
         except PasswordResetToken.DoesNotExist:
             return Response({'error': 'Invalid or expired token'}, status=status.HTTP_400_BAD_REQUEST)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'videoflix_auth'
+
+    def ready(self):
+        """
+        Connect the signal handlers that keep the token cache up to date.
+        """
+
+        import videoflix_auth.signals
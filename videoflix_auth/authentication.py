@@ -0,0 +1,189 @@
+"""
+Token authentication without a database query per request.
+
+DRF's TokenAuthentication reads the token and its user from the database on
+every request. CachedTokenAuthentication first looks the token up in a small
+in-process LRU, then in the shared cache (Redis), and only then in the
+database, caching the result in both layers. The shared cache keeps neither
+the token key nor the password hash, see dump_credentials.
+
+The shared entries are deleted when a token is deleted (logout) and when its
+user is saved, e.g. deactivated or given a new password, see signals.py. The
+in-process entries of other workers cannot be reached and simply expire
+after ``AUTH_TOKEN_LOCAL_TTL`` seconds, which bounds how long a revoked token
+keeps working there.
+
+Tokens are AuthToken rows with a sliding expiry. The expiry is checked on
+the cached token, and ``last_used_at`` is only written when it is older than
+``AUTH_TOKEN_TOUCH_INTERVAL``, so steady traffic like progress heartbeats
+costs one token write per token and interval.
+"""
+
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.timezone import now
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from videoflix_auth.models import AuthToken
+from datetime import timedelta
+import copy
+import hashlib
+import threading
+import time
+import logging
+logger = logging.getLogger(__name__)
+
+TOKEN_CACHE_KEY = 'auth:credentials:{}'
+
+
+class LocalTokenCache:
+    """
+    A thread-safe LRU of authenticated tokens whose entries expire after ttl seconds.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalTokenCache(settings.AUTH_TOKEN_LOCAL_SIZE, settings.AUTH_TOKEN_LOCAL_TTL)
+
+
+def token_cache_key(key):
+    """
+    Return the shared cache key of a token; the token itself is only stored hashed.
+    """
+
+    return TOKEN_CACHE_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_tokens(*keys):
+    """
+    Drop tokens from the shared and the local cache.
+
+    Args:
+        *keys (str): The token keys to drop.
+    """
+
+    for key in keys:
+        local_cache.delete(key)
+    cache.delete_many([token_cache_key(key) for key in keys])
+
+
+def dump_credentials(user, token):
+    """
+    Return the shared cache entry of an authenticated token.
+
+    The entry holds the user's fields without the password hash and the
+    timestamps of the token. Its key is not stored; it is known from the
+    request whenever the entry is read.
+    """
+
+    return {
+        'user': {
+            field.attname: getattr(user, field.attname)
+            for field in User._meta.concrete_fields if field.attname != 'password'
+        },
+        'created_at': token.created_at,
+        'last_used_at': token.last_used_at,
+    }
+
+
+def load_credentials(key, entry):
+    """
+    Rebuild the user and token of a shared cache entry.
+
+    The password of the user is a deferred field: it is loaded from the
+    database when accessed, and saving the user does not overwrite it.
+
+    Returns:
+        tuple: The user and the token.
+    """
+
+    user = User.from_db(DEFAULT_DB_ALIAS, list(entry['user']), list(entry['user'].values()))
+    token = AuthToken.from_db(
+        DEFAULT_DB_ALIAS, ['key', 'user_id', 'created_at', 'last_used_at'],
+        [key, user.pk, entry['created_at'], entry['last_used_at']],
+    )
+    token.user = user
+    return user, token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that resolves tokens from the in-process LRU and
+    the shared cache before asking the database.
+
+    Only successful lookups are cached; unknown tokens and inactive users
+    go to the database every time and fail as in TokenAuthentication.
+    """
+
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        credentials = local_cache.get(key)
+        if credentials is None:
+            cache_key = token_cache_key(key)
+            entry = cache.get(cache_key)
+            if entry is None:
+                credentials = super().authenticate_credentials(key)
+                cache.set(cache_key, dump_credentials(*credentials), settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            else:
+                credentials = load_credentials(key, entry)
+            local_cache.set(key, credentials)
+        user, token = credentials
+        if token.is_expired():
+            invalidate_tokens(key)
+            raise AuthenticationFailed('Token has expired.')
+        if now() - token.last_used_at >= timedelta(seconds=settings.AUTH_TOKEN_TOUCH_INTERVAL):
+            self.touch(token)
+            credentials = (user, token)
+            cache.set(token_cache_key(key), dump_credentials(user, token), settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            local_cache.set(key, credentials)
+        # Requests may modify their user, so they never share the cached one.
+        return copy.copy(user), token
+
+    def touch(self, token):
+        """
+        Record that a token was used, extending its sliding expiry.
+
+        The update only applies if no other request touched the token in
+        the meantime.
+        """
+
+        current = now()
+        threshold = current - timedelta(seconds=settings.AUTH_TOKEN_TOUCH_INTERVAL)
+        AuthToken.objects.filter(key=token.key, last_used_at__lt=threshold).update(last_used_at=current)
+        token.last_used_at = current
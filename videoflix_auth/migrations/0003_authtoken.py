@@ -0,0 +1,48 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_drf_tokens(apps, schema_editor):
+    """
+    Keep existing logins working by copying the DRF tokens with their keys.
+
+    The copies start their lifetime now, so old tokens do not expire at once.
+    """
+
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('videoflix_auth', 'AuthToken')
+    current = django.utils.timezone.now()
+    AuthToken.objects.bulk_create(
+        [AuthToken(key=token.key, user_id=token.user_id, created_at=current, last_used_at=current)
+         for token in Token.objects.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_auth', '0002_mailoutbox'),
+        ('authtoken', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='authtoken_created_idx'), models.Index(fields=['last_used_at'], name='authtoken_last_used_idx')],
+            },
+        ),
+        migrations.RunPython(copy_drf_tokens, migrations.RunPython.noop),
+    ]
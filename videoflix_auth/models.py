@@ -1,16 +1,133 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.timezone import now
+from django.conf import settings
 from datetime import timedelta
+import binascii
+import os
 
 class PasswordResetToken(models.Model):
+    VALIDITY = timedelta(minutes=15)
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     token = models.CharField(max_length=64, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='resettoken_created_idx'),
+        ]
+
+    @classmethod
+    def valid_since(cls):
+        """
+        Return the creation time before which tokens are expired, for use in
+        queries like ``filter(created_at__gte=PasswordResetToken.valid_since())``.
+        """
+        return now() - cls.VALIDITY
+
     def is_valid(self):
         """
         Return True if the token is valid, False otherwise. A valid token is
         one that has been created within the last 15 minutes.
         """
-        return now() < self.created_at + timedelta(minutes=15)
+        return now() < self.created_at + self.VALIDITY
+
+
+class MailOutbox(models.Model):
+    """
+    An email waiting to be delivered by the ``send_outbox`` task.
+
+    Only the template name and its context are stored; the message is
+    rendered when it is sent, outside the request that queued it.
+    """
+
+    WELCOME = 'welcome'
+    PASSWORD_RESET = 'password_reset'
+    TEMPLATE_CHOICES = [
+        (WELCOME, 'Welcome'),
+        (PASSWORD_RESET, 'Password reset'),
+    ]
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    template = models.CharField(max_length=30, choices=TEMPLATE_CHOICES)
+    to_email = models.EmailField()
+    context = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='mailoutbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.template} to {self.to_email} - {self.status}"
+
+
+class AuthToken(models.Model):
+    """
+    An API token of a user that expires.
+
+    A user gets a new token on every login, one per device. A token expires
+    after ``AUTH_TOKEN_IDLE_TIMEOUT`` without use, and in any case
+    ``AUTH_TOKEN_MAX_AGE`` after it was created. ``last_used_at`` is only
+    updated every ``AUTH_TOKEN_TOUCH_INTERVAL``, see CachedTokenAuthentication,
+    and expired tokens are deleted by the ``purge_expired_tokens`` task.
+    """
+
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='auth_tokens')
+    created_at = models.DateTimeField(default=now)
+    last_used_at = models.DateTimeField(default=now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='authtoken_created_idx'),
+            models.Index(fields=['last_used_at'], name='authtoken_last_used_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = self.generate_key()
+        return super().save(*args, **kwargs)
+
+    @classmethod
+    def generate_key(cls):
+        return binascii.hexlify(os.urandom(20)).decode()
+
+    @classmethod
+    def expired(cls):
+        """
+        Return a filter matching all expired tokens.
+        """
+        current = now()
+        return (
+            models.Q(last_used_at__lt=current - timedelta(seconds=settings.AUTH_TOKEN_IDLE_TIMEOUT))
+            | models.Q(created_at__lt=current - timedelta(seconds=settings.AUTH_TOKEN_MAX_AGE))
+        )
+
+    @property
+    def expires_at(self):
+        return min(
+            self.last_used_at + timedelta(seconds=settings.AUTH_TOKEN_IDLE_TIMEOUT),
+            self.created_at + timedelta(seconds=settings.AUTH_TOKEN_MAX_AGE),
+        )
+
+    def is_expired(self):
+        return self.expires_at <= now()
+
+    def __str__(self):
+        return f"Token of {self.user.username}, last used {self.last_used_at}"
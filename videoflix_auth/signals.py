@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .authentication import invalidate_tokens
+from .models import AuthToken
+
+
+@receiver(post_delete, sender=AuthToken)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """
+    Stop accepting a token from the cache once it is deleted, e.g. on logout.
+    """
+
+    invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """
+    Drop the cached tokens of a user whenever the user is saved.
+
+    The cache holds the user with the token, so any change, like a
+    deactivation or a new password, has to be read from the database again.
+    """
+
+    if not created:
+        invalidate_tokens(*AuthToken.objects.filter(user=instance).values_list('key', flat=True))
@@ -0,0 +1,173 @@
+import smtplib
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils.timezone import now
+from datetime import timedelta
+from videoflix_auth.models import MailOutbox, AuthToken, PasswordResetToken
+from videoflix_auth.api.utils import build_outbox_email
+import logging
+logger = logging.getLogger(__name__)
+
+# Errors that mean the SMTP connection itself is gone rather than a single
+# message being refused.
+SMTP_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def mark_failed_attempt(mail, exc):
+    """
+    Record a failed delivery and schedule the next attempt with backoff.
+
+    After ``EMAIL_OUTBOX_MAX_ATTEMPTS`` attempts the email is marked failed
+    and no longer picked up.
+
+    Args:
+        mail (MailOutbox): The email that could not be sent.
+        exc (Exception): The error raised while sending it.
+    """
+
+    mail.attempts += 1
+    mail.error = str(exc)
+    if mail.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        mail.status = MailOutbox.FAILED
+        logger.error(f"Giving up on email {mail.id} to {mail.to_email}: {exc}")
+    else:
+        delay = settings.EMAIL_OUTBOX_RETRY_BACKOFF * 2 ** (mail.attempts - 1)
+        mail.next_attempt_at = now() + timedelta(seconds=delay)
+        logger.warning(f"Email {mail.id} to {mail.to_email} failed, retrying in {delay}s: {exc}")
+    mail.save(update_fields=['attempts', 'error', 'status', 'next_attempt_at'])
+
+
+@shared_task(bind=True, max_retries=settings.EMAIL_OUTBOX_MAX_ATTEMPTS)
+def send_outbox(self, batch_size=None):
+    """
+    Deliver due emails from the outbox over a single SMTP connection.
+
+    A batch of due emails is locked with ``SKIP LOCKED``, so concurrent
+    runs of the task never send the same email twice. All messages of the
+    batch go through one connection, which is opened once instead of once
+    per email. A message that fails is rescheduled with exponential backoff;
+    if the connection cannot be opened, or drops in the middle of the batch,
+    the whole task is retried and the emails not yet tried keep their
+    attempts. The beat schedule runs the task periodically as well, so
+    emails whose queued task was lost are still delivered.
+    When the batch was full the task queues itself again right away, and
+    when emails were rescheduled it queues itself for the earliest retry.
+
+    Args:
+        batch_size (int): The number of emails per batch, defaults to
+            ``EMAIL_OUTBOX_BATCH_SIZE``.
+
+    Returns:
+        int: The number of emails sent.
+    """
+
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    sent = 0
+    disconnected = None
+    with transaction.atomic():
+        batch = list(
+            MailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=MailOutbox.PENDING, next_attempt_at__lte=now())
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if not batch:
+            return 0
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as exc:
+            logger.warning(f"Could not open mail connection: {exc}")
+            raise self.retry(exc=exc, countdown=settings.EMAIL_OUTBOX_RETRY_BACKOFF)
+        try:
+            for mail in batch:
+                try:
+                    message = build_outbox_email(mail)
+                    message.connection = connection
+                    message.send()
+                except SMTP_CONNECTION_ERRORS as exc:
+                    mark_failed_attempt(mail, exc)
+                    disconnected = exc
+                    break
+                except Exception as exc:
+                    mark_failed_attempt(mail, exc)
+                    continue
+                mail.status = MailOutbox.SENT
+                mail.sent_at = now()
+                mail.save(update_fields=['status', 'sent_at'])
+                sent += 1
+        finally:
+            connection.close()
+    logger.info(f"Sent {sent} of {len(batch)} outbox emails")
+    if disconnected:
+        logger.warning(f"Mail connection lost, retrying the rest of the batch: {disconnected}")
+        raise self.retry(exc=disconnected, countdown=settings.EMAIL_OUTBOX_RETRY_BACKOFF)
+    if len(batch) == batch_size:
+        send_outbox.delay(batch_size)
+    elif sent < len(batch):
+        next_attempt_at = (
+            MailOutbox.objects.filter(status=MailOutbox.PENDING)
+            .order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+        )
+        if next_attempt_at:
+            send_outbox.apply_async((batch_size,), eta=next_attempt_at)
+    return sent
+
+
+@shared_task
+def purge_expired_tokens(batch_size=None):
+    """
+    Delete expired authentication tokens in batches.
+
+    Each batch is selected through the created/last-used indexes and
+    deleted in its own short transaction, so the token table is never
+    locked for long.
+
+    Args:
+        batch_size (int): The number of tokens per batch, defaults to
+            ``AUTH_TOKEN_PURGE_BATCH_SIZE``.
+
+    Returns:
+        int: The number of tokens deleted.
+    """
+
+    batch_size = batch_size or settings.AUTH_TOKEN_PURGE_BATCH_SIZE
+    deleted = 0
+    while True:
+        keys = list(AuthToken.objects.filter(AuthToken.expired()).values_list('key', flat=True)[:batch_size])
+        if keys:
+            deleted += AuthToken.objects.filter(key__in=keys).delete()[0]
+        if len(keys) < batch_size:
+            break
+    logger.info(f"Purged {deleted} expired tokens")
+    return deleted
+
+
+@shared_task
+def purge_expired_reset_tokens(batch_size=None):
+    """
+    Delete expired password reset tokens in batches.
+
+    Tokens of abandoned reset requests are never used, so this is the only
+    place they are removed. Batches are selected on the created_at index.
+
+    Args:
+        batch_size (int): The number of tokens per batch, defaults to
+            ``PASSWORD_RESET_PURGE_BATCH_SIZE``.
+
+    Returns:
+        int: The number of tokens deleted.
+    """
+
+    batch_size = batch_size or settings.PASSWORD_RESET_PURGE_BATCH_SIZE
+    cutoff = PasswordResetToken.valid_since()
+    deleted = 0
+    while True:
+        ids = list(PasswordResetToken.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if ids:
+            deleted += PasswordResetToken.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            break
+    logger.info(f"Purged {deleted} expired password reset tokens")
+    return deleted
@@ -0,0 +1,137 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+from django.utils.timezone import now
+from datetime import timedelta
+from videoflix_auth.models import AuthToken
+from videoflix_auth.tasks import purge_expired_tokens
+from videoflix_auth.authentication import CachedTokenAuthentication, LocalTokenCache, local_cache, token_cache_key
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(email="testuser@example.com", username="testuser", password="Password123")
+        self.token = AuthToken.objects.create(user=self.user)
+        self.url = "/videoflix/api/videos/continue/"
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_cached_token_skips_the_database(self):
+        self.client.get(self.url)
+        local_cache.clear()
+        with self.assertNumQueries(0):
+            user, token = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual((user, token), (self.user, self.token))
+        with self.assertNumQueries(0):
+            CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+    def test_token_is_stored_hashed(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(cache.get(token_cache_key(self.token.key)))
+        self.assertNotIn(self.token.key, token_cache_key(self.token.key))
+
+    def test_shared_cache_keeps_no_secrets(self):
+        self.client.get(self.url)
+        entry = repr(cache.get(token_cache_key(self.token.key)))
+        self.assertNotIn(self.user.password, entry)
+        self.assertNotIn(self.token.key, entry)
+        local_cache.clear()
+        user, token = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(token.key, self.token.key)
+        user.first_name = "Test"
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Test")
+        self.assertTrue(self.user.check_password("Password123"))
+        self.assertTrue(user.check_password("Password123"))
+
+    def test_logout_revokes_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        response = self.client.post(reverse('logout'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(AuthToken.objects.exists())
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deactivation_revokes_cached_token(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_password_reset_revokes_token(self):
+        self.client.get(self.url)
+        self.client.post(reverse('password_reset'), {'email': self.user.email})
+        reset_token = self.user.passwordresettoken_set.get().token
+        response = self.client.post(reverse('password_reset_confirm', kwargs={'token': reset_token}),
+                                    {'password': 'NewPass123', 'repeated_password': 'NewPass123'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_unknown_token_is_rejected(self):
+        with self.assertRaises(AuthenticationFailed):
+            CachedTokenAuthentication().authenticate_credentials('unknown')
+
+    def test_expired_token_is_rejected(self):
+        self.client.get(self.url)
+        AuthToken.objects.filter(pk=self.token.pk).update(last_used_at=now() - timedelta(days=15))
+        local_cache.clear()
+        cache.clear()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        AuthToken.objects.filter(pk=self.token.pk).update(last_used_at=now(), created_at=now() - timedelta(days=91))
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_last_used_is_written_coarsely(self):
+        AuthToken.objects.filter(pk=self.token.pk).update(last_used_at=now() - timedelta(hours=2))
+        self.client.get(self.url)
+        touched = AuthToken.objects.get(pk=self.token.pk).last_used_at
+        self.assertLess(now() - touched, timedelta(minutes=1))
+        with self.assertNumQueries(0):
+            CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(AuthToken.objects.get(pk=self.token.pk).last_used_at, touched)
+
+    def test_purge_deletes_expired_tokens_in_batches(self):
+        AuthToken.objects.filter(pk=self.token.pk).update(last_used_at=now() - timedelta(days=15))
+        for i in range(4):
+            user = User.objects.create_user(username=f"user{i}")
+            token = AuthToken.objects.create(user=user)
+            if i % 2:
+                AuthToken.objects.filter(pk=token.pk).update(created_at=now() - timedelta(days=91))
+        self.assertEqual(purge_expired_tokens(batch_size=2), 3)
+        self.assertEqual(AuthToken.objects.count(), 2)
+
+    def test_remember_login_rotates_old_tokens(self):
+        url = reverse('token_login')
+        self.assertEqual(self.client.post(url, {'token': self.token.key}).data['token'], self.token.key)
+        AuthToken.objects.filter(pk=self.token.pk).update(created_at=now() - timedelta(days=8))
+        cache.clear()
+        local_cache.clear()
+        new_key = self.client.post(url, {'token': self.token.key}).data['token']
+        self.assertNotEqual(new_key, self.token.key)
+        self.assertEqual(list(AuthToken.objects.values_list('key', flat=True)), [new_key])
+
+    def test_every_login_gets_its_own_token(self):
+        data = {'email': 'testuser', 'password': 'Password123'}
+        first = self.client.post(reverse('login'), data).data['token']
+        second = self.client.post(reverse('login'), data).data['token']
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.user.auth_tokens.count(), 3)
+
+
+class LocalTokenCacheTests(APITestCase):
+
+    def test_evicts_least_recently_used(self):
+        local = LocalTokenCache(maxsize=2, ttl=60)
+        local.set('a', 1)
+        local.set('b', 2)
+        local.get('a')
+        local.set('c', 3)
+        self.assertEqual((local.get('a'), local.get('b'), local.get('c')), (1, None, 3))
+
+    def test_entries_expire(self):
+        local = LocalTokenCache(maxsize=2, ttl=0)
+        local.set('a', 1)
+        self.assertIsNone(local.get('a'))
@@ -0,0 +1,40 @@
+from unittest.mock import patch
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template import engines
+from django.template.loader import get_template, render_to_string
+from django.test import SimpleTestCase
+from videoflix_auth.api.email_templates import get_compiled_template, render_email
+
+
+class EmailTemplateTestCase(SimpleTestCase):
+
+    def setUp(self):
+        get_compiled_template.cache_clear()
+
+    def assertRendersLikeDjango(self, template_name, **context):
+        expected = render_to_string(template_name, {'STATIC_URL': staticfiles_storage.url(''), **context})
+        self.assertEqual(render_email(template_name, **context), expected)
+
+    def test_welcome_email_matches_django_rendering(self):
+        self.assertRendersLikeDjango(
+            'emails/welcome_email.html', user_name="Test User", activation_link="http://example.com/a?x=1&y=2",
+        )
+
+    def test_reset_email_matches_django_rendering(self):
+        self.assertRendersLikeDjango(
+            'emails/reset_password_email.html', user_name="<script>", reset_link="http://example.com/reset",
+        )
+
+    def test_template_is_compiled_once(self):
+        with patch('videoflix_auth.api.email_templates.get_template', wraps=get_template) as mock_get:
+            for name in ("a", "b", "c"):
+                render_email('emails/reset_password_email.html', user_name=name, reset_link="http://example.com")
+        mock_get.assert_called_once()
+        self.assertTrue(get_compiled_template('emails/reset_password_email.html', ('reset_link', 'user_name')).compiled)
+
+    def test_unsupported_template_falls_back_to_django(self):
+        template = engines['django'].from_string("Hello {{ user_name|upper }}")
+        with patch('videoflix_auth.api.email_templates.get_template', return_value=template):
+            html = render_email('emails/upper.html', user_name="test & co")
+        self.assertEqual(html, "Hello TEST &amp; CO")
+        self.assertFalse(get_compiled_template('emails/upper.html', ('user_name',)).compiled)
@@ -0,0 +1,105 @@
+import smtplib
+from unittest.mock import patch
+from datetime import timedelta
+from django.core import mail
+from django.core.mail import get_connection
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+from django.contrib.auth.models import User
+from videoflix_auth.models import MailOutbox, PasswordResetToken
+from videoflix_auth.tasks import send_outbox, purge_expired_reset_tokens
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class SendOutboxTestCase(TestCase):
+
+    def queue(self, count=1, **fields):
+        return [
+            MailOutbox.objects.create(
+                template=MailOutbox.WELCOME,
+                to_email=f"user{i}@example.com",
+                context={'user_name': f"user{i}", 'activation_link': "http://example.com/activate"},
+                **fields,
+            )
+            for i in range(count)
+        ]
+
+    @patch('videoflix_auth.tasks.send_outbox.delay')
+    def test_sends_batch_over_one_connection(self, mock_delay):
+        self.queue(3)
+        with patch('videoflix_auth.tasks.get_connection', wraps=get_connection) as mock_connection:
+            sent = send_outbox()
+        self.assertEqual(sent, 3)
+        mock_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ["user0@example.com"])
+        self.assertIn("http://example.com/activate", mail.outbox[0].alternatives[0][0])
+        self.assertFalse(MailOutbox.objects.exclude(status=MailOutbox.SENT).exists())
+        mock_delay.assert_not_called()
+
+    @patch('videoflix_auth.tasks.send_outbox.delay')
+    def test_full_batch_queues_next_batch(self, mock_delay):
+        self.queue(3)
+        self.assertEqual(send_outbox(batch_size=2), 2)
+        mock_delay.assert_called_once_with(2)
+        self.assertEqual(MailOutbox.objects.filter(status=MailOutbox.PENDING).count(), 1)
+
+    def test_skips_emails_not_yet_due(self):
+        self.queue(1, next_attempt_at=now() + timedelta(minutes=5))
+        self.assertEqual(send_outbox(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    @patch('videoflix_auth.tasks.send_outbox.apply_async')
+    @patch('videoflix_auth.tasks.build_outbox_email', side_effect=RuntimeError("SMTP 451"))
+    def test_failed_send_is_rescheduled(self, mock_build, mock_apply_async):
+        outbox, = self.queue(1)
+        self.assertEqual(send_outbox(), 0)
+        outbox.refresh_from_db()
+        self.assertEqual(outbox.status, MailOutbox.PENDING)
+        self.assertEqual(outbox.attempts, 1)
+        self.assertEqual(outbox.error, "SMTP 451")
+        self.assertGreater(outbox.next_attempt_at, now())
+        mock_apply_async.assert_called_once()
+        self.assertEqual(mock_apply_async.call_args.kwargs['eta'], outbox.next_attempt_at)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    @patch('videoflix_auth.tasks.send_outbox.apply_async')
+    @patch('videoflix_auth.tasks.build_outbox_email', side_effect=RuntimeError("bounced"))
+    def test_gives_up_after_max_attempts(self, mock_build, mock_apply_async):
+        outbox, = self.queue(1, attempts=1)
+        send_outbox()
+        outbox.refresh_from_db()
+        self.assertEqual(outbox.status, MailOutbox.FAILED)
+        mock_apply_async.assert_not_called()
+
+    @patch('videoflix_auth.tasks.get_connection')
+    def test_connection_error_retries_task(self, mock_connection):
+        mock_connection.return_value.open.side_effect = OSError("Connection refused")
+        self.queue(1)
+        with self.assertRaises(OSError):
+            send_outbox()
+        self.assertEqual(MailOutbox.objects.get().attempts, 0)
+
+    @patch('videoflix_auth.tasks.send_outbox.apply_async')
+    @patch('videoflix_auth.tasks.get_connection')
+    def test_dropped_connection_stops_batch(self, mock_connection, mock_apply_async):
+        mock_connection.return_value.send_messages.side_effect = [1, smtplib.SMTPServerDisconnected("gone")]
+        first, second, third = self.queue(3)
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            send_outbox()
+        self.assertEqual(mock_connection.return_value.send_messages.call_count, 2)
+        self.assertEqual(MailOutbox.objects.get(id=first.id).status, MailOutbox.SENT)
+        self.assertEqual(MailOutbox.objects.get(id=second.id).attempts, 1)
+        third.refresh_from_db()
+        self.assertEqual((third.status, third.attempts), (MailOutbox.PENDING, 0))
+
+
+class PurgeExpiredResetTokensTestCase(TestCase):
+
+    def test_deletes_only_expired_tokens_in_batches(self):
+        for i in range(5):
+            user = User.objects.create_user(username=f"user{i}", email=f"user{i}@example.com")
+            PasswordResetToken.objects.create(user=user, token=f"token{i}")
+        PasswordResetToken.objects.exclude(token="token4").update(created_at=now() - timedelta(minutes=16))
+        self.assertEqual(purge_expired_reset_tokens(batch_size=2), 4)
+        self.assertEqual(list(PasswordResetToken.objects.values_list('token', flat=True)), ["token4"])
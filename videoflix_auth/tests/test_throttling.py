@@ -0,0 +1,70 @@
+from unittest.mock import patch
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+@override_settings(LOGIN_MAX_FAILURES_PER_IP=5, LOGIN_MAX_FAILURES_PER_ACCOUNT=3)
+class LoginThrottlingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="testuser@example.com", username="testuser", password="Password123")
+        self.url = reverse('login')
+
+    def login(self, username="testuser", password="WrongPassword", ip="10.0.0.1"):
+        return self.client.post(self.url, {"email": username, "password": password}, REMOTE_ADDR=ip)
+
+    def test_account_is_blocked_before_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.login().status_code, 401)
+        with patch('django.contrib.auth.hashers.check_password') as mock_check, \
+                patch.object(User, 'check_password') as mock_user_check:
+            response = self.login(password="Password123", ip="10.0.0.2")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        mock_check.assert_not_called()
+        mock_user_check.assert_not_called()
+
+    def test_ip_is_blocked_across_accounts(self):
+        for i in range(5):
+            self.login(username=f"unknown{i}")
+        self.assertEqual(self.login(password="Password123").status_code, 429)
+        self.assertEqual(self.login(password="Password123", ip="10.0.0.2").status_code, 200)
+
+    def test_ip_is_taken_from_forwarded_for(self):
+        for i in range(5):
+            self.client.post(self.url, {"email": f"unknown{i}", "password": "WrongPassword"},
+                             REMOTE_ADDR="10.0.0.100", HTTP_X_FORWARDED_FOR="203.0.113.1")
+        response = self.client.post(self.url, {"email": "testuser", "password": "Password123"},
+                                    REMOTE_ADDR="10.0.0.100", HTTP_X_FORWARDED_FOR="203.0.113.1")
+        self.assertEqual(response.status_code, 429)
+        response = self.client.post(self.url, {"email": "testuser", "password": "Password123"},
+                                    REMOTE_ADDR="10.0.0.100", HTTP_X_FORWARDED_FOR="198.51.100.7")
+        self.assertEqual(response.status_code, 200)
+
+    def test_success_resets_account_failures(self):
+        for _ in range(2):
+            self.login()
+        self.assertEqual(self.login(password="Password123").status_code, 200)
+        for _ in range(2):
+            self.assertEqual(self.login().status_code, 401)
+
+    def test_unknown_user_is_checked_against_dummy_hash(self):
+        with patch('videoflix_auth.throttling.check_password') as mock_check:
+            response = self.login(username="nobody")
+        self.assertEqual(response.status_code, 401)
+        mock_check.assert_called_once()
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ])
+    def test_login_rehashes_with_preferred_hasher(self):
+        self.user.password = make_password("Password123", hasher='pbkdf2_sha256')
+        self.user.save()
+        self.assertEqual(self.login(password="Password123").status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('md5$'))
@@ -1,6 +1,9 @@
 from unittest.mock import patch
 from django.test import TestCase, override_settings
-from videoflix_auth.api.utils import send_welcome_email, send_password_reset_email
+from videoflix_auth.api.utils import (
+    send_welcome_email, send_password_reset_email, queue_email, build_outbox_email,
+)
+from videoflix_auth.models import MailOutbox
 
 @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
 class EmailUtilsTestCase(TestCase):
@@ -18,4 +21,32 @@ class EmailUtilsTestCase(TestCase):
     @patch('videoflix_auth.api.utils.EmailMultiAlternatives.send')
     def test_send_password_reset_email(self, mock_send):
         send_password_reset_email(self.user_email, self.user_name, self.reset_link)
-        mock_send.assert_called_once()
\ No newline at end of file
+        mock_send.assert_called_once()
+
+class OutboxUtilsTestCase(TestCase):
+
+    @patch('videoflix_auth.tasks.send_outbox.delay')
+    def test_queue_email_sends_after_commit(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            outbox = queue_email(MailOutbox.PASSWORD_RESET, "testuser@example.com",
+                                 user_name="Test User", reset_link="http://example.com/reset")
+            mock_delay.assert_not_called()
+        mock_delay.assert_called_once()
+        self.assertEqual(outbox.status, MailOutbox.PENDING)
+
+    @patch('videoflix_auth.tasks.send_outbox.delay', side_effect=ConnectionError("broker down"))
+    def test_queue_email_survives_broker_error(self, mock_delay):
+        mock_delay.__qualname__ = 'send_outbox.delay'
+        with self.captureOnCommitCallbacks(execute=True):
+            outbox = queue_email(MailOutbox.PASSWORD_RESET, "testuser@example.com",
+                                 user_name="Test User", reset_link="http://example.com/reset")
+        mock_delay.assert_called_once()
+        self.assertTrue(MailOutbox.objects.filter(id=outbox.id, status=MailOutbox.PENDING).exists())
+
+    def test_build_outbox_email(self):
+        outbox = MailOutbox(template=MailOutbox.PASSWORD_RESET, to_email="testuser@example.com",
+                            context={'user_name': "Test User", 'reset_link': "http://example.com/reset"})
+        message = build_outbox_email(outbox)
+        self.assertEqual(message.to, ["testuser@example.com"])
+        self.assertEqual(message.subject, "Reset Your Videoflix Password")
+        self.assertIn("http://example.com/reset", message.body)
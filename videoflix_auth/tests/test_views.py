@@ -9,8 +9,9 @@ from django.contrib.auth.tokens import default_token_generator
 from django.utils.timezone import now
 from datetime import timedelta
 from rest_framework.test import APITestCase
-from rest_framework.authtoken.models import Token
 from rest_framework import status
+from unittest.mock import patch
+from videoflix_auth.models import MailOutbox, AuthToken
 
 
 class RegistrationViewTests(TestCase):
@@ -26,6 +27,23 @@ class RegistrationViewTests(TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(User.objects.filter(email="testuser@example.com").count(), 1)
 
+    @patch('videoflix_auth.tasks.send_outbox.delay')
+    def test_registration_queues_welcome_email(self, mock_delay):
+        url = reverse('register')
+        data = {
+            "email": "testuser@example.com",
+            "password": "Password123",
+            "repeated_password": "Password123"
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 201)
+        outbox = MailOutbox.objects.get()
+        self.assertEqual(outbox.template, MailOutbox.WELCOME)
+        self.assertEqual(outbox.to_email, "testuser@example.com")
+        self.assertIn("/activate-account/", outbox.context['activation_link'])
+        mock_delay.assert_called_once()
+
     def test_registration_existing_email(self):
         User.objects.create_user(email="testuser@example.com", username="testuser", password="Password123")
         url = reverse('register')
@@ -130,6 +148,24 @@ class PasswordResetTests(TestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(PasswordResetToken.objects.filter(user=self.user).count(), 1)
+        outbox = MailOutbox.objects.get()
+        self.assertEqual(outbox.template, MailOutbox.PASSWORD_RESET)
+        self.assertEqual(outbox.to_email, "testuser@example.com")
+
+    def test_repeated_requests_keep_one_live_token(self):
+        url = reverse('password_reset')
+        for _ in range(3):
+            self.client.post(url, {"email": "testuser@example.com"})
+        self.assertEqual(PasswordResetToken.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(MailOutbox.objects.count(), 1)
+
+    def test_request_after_expiry_replaces_token(self):
+        url = reverse('password_reset')
+        self.client.post(url, {"email": "testuser@example.com"})
+        PasswordResetToken.objects.update(created_at=now() - timedelta(minutes=16))
+        self.client.post(url, {"email": "testuser@example.com"})
+        self.assertTrue(PasswordResetToken.objects.get(user=self.user).is_valid())
+        self.assertEqual(MailOutbox.objects.count(), 2)
 
     def test_password_reset_request_invalid_email(self):
         url = reverse('password_reset')
@@ -224,7 +260,7 @@ class TokenLoginViewTest(APITestCase):
 
     def setUp(self):
         self.user = User.objects.create_user(email="testuser@example.com", username="testuser", password="Password123")
-        self.token_object = Token.objects.create(user=self.user)
+        self.token_object = AuthToken.objects.create(user=self.user)
         self.valid_token = self.token_object.key
         self.url = reverse('token_login')
 
@@ -0,0 +1,101 @@
+"""
+Counters of failed logins per client IP and per account.
+
+The counters live in the shared cache (Redis) in fixed windows of
+``LOGIN_ATTEMPT_WINDOW`` seconds. LoginView checks them before it looks at
+the password, so credential stuffing is turned away without spending any
+CPU on password hashing.
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, check_password
+from django.core.cache import cache
+from functools import lru_cache
+from rest_framework.throttling import BaseThrottle
+import hashlib
+import logging
+logger = logging.getLogger(__name__)
+
+IP_KEY = 'login:failures:ip:{}'
+ACCOUNT_KEY = 'login:failures:account:{}'
+
+
+def client_ip(request):
+    """
+    Return the IP of the client that sent a request.
+
+    Behind nginx REMOTE_ADDR is the proxy, so the address is taken from
+    X-Forwarded-For like DRF's throttles do, skipping the ``NUM_PROXIES``
+    trusted proxies set in REST_FRAMEWORK.
+    """
+
+    return BaseThrottle().get_ident(request)
+
+
+def account_key(username):
+    """
+    Return the counter key of an account; usernames are stored hashed.
+    """
+
+    return ACCOUNT_KEY.format(hashlib.sha256(username.lower().encode()).hexdigest())
+
+
+def login_blocked(ip, username):
+    """
+    Return whether an IP or account has too many recent failed logins.
+
+    Args:
+        ip (str): The client IP of the request.
+        username (str): The username the client tries to log in as.
+
+    Returns:
+        bool: True if the attempt must be rejected.
+    """
+
+    ip_key, user_key = IP_KEY.format(ip), account_key(username)
+    counts = cache.get_many([ip_key, user_key])
+    return (
+        counts.get(ip_key, 0) >= settings.LOGIN_MAX_FAILURES_PER_IP
+        or counts.get(user_key, 0) >= settings.LOGIN_MAX_FAILURES_PER_ACCOUNT
+    )
+
+
+def record_failed_login(ip, username):
+    """
+    Count a failed login for the IP and the account.
+    """
+
+    for key in (IP_KEY.format(ip), account_key(username)):
+        cache.add(key, 0, settings.LOGIN_ATTEMPT_WINDOW)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, settings.LOGIN_ATTEMPT_WINDOW)
+    logger.info(f"Failed login from {ip}")
+
+
+def reset_failed_logins(username):
+    """
+    Forget the failed logins of an account after a successful login.
+    """
+
+    cache.delete(account_key(username))
+
+
+@lru_cache
+def dummy_hash():
+    """
+    Return a password hash made once per process with the preferred hasher.
+    """
+
+    return make_password('videoflix-dummy-password')
+
+
+def check_unknown_user_password(password):
+    """
+    Spend the same time hashing as for a real user, so failed logins for
+    unknown usernames cannot be told apart by their timing.
+    """
+
+    check_password(password, dummy_hash())
+    return False
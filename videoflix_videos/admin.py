@@ -1,8 +1,32 @@
 from django.contrib import admin
-from .models import Video
+from .models import Video, TranscodeJob, UploadSession
+from .uploads import uploaded_sha256
 
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
     list_display = ('title', 'uploaded_at', 'hls_master_playlist')
     search_fields = ('title',)
     list_filter = ('uploaded_at',)
+    readonly_fields = ('content_hash',)
+
+    def save_model(self, request, obj, form, change):
+        if 'file' in form.changed_data:
+            obj.content_hash = uploaded_sha256(request, 'file')
+        super().save_model(request, obj, form, change)
+
+
+
+@admin.register(TranscodeJob)
+class TranscodeJobAdmin(admin.ModelAdmin):
+    list_display = ('video', 'state', 'progress', 'attempts', 'updated_at')
+    list_filter = ('state',)
+    search_fields = ('video__title',)
+    readonly_fields = ('video', 'dedupe_key', 'state', 'progress', 'renditions', 'attempts', 'error', 'task_id', 'created_at', 'updated_at', 'finished_at')
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'user', 'state', 'offset', 'size', 'updated_at')
+    list_filter = ('state',)
+    search_fields = ('filename', 'title', 'user__username')
+    readonly_fields = ('user', 'path', 'size', 'offset', 'expected_sha256', 'sha256', 'state', 'video', 'created_at', 'updated_at')
@@ -0,0 +1,44 @@
+from rest_framework import status
+from rest_framework.response import Response
+from django.utils.http import http_date, parse_etags
+
+
+def etag_matches(request, etag):
+    """
+    Return True if the request's If-None-Match header lists the ETag.
+    """
+
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return '*' in tags or etag in tags
+
+
+def not_modified(etag):
+    """
+    Return an empty 304 response carrying the ETag.
+    """
+
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    add_validators(response, etag)
+    return response
+
+
+def add_validators(response, etag, *timestamps):
+    """
+    Set ETag, Last-Modified and Cache-Control on a per-user response.
+
+    Args:
+        response (Response): The response to update.
+        etag (str): The quoted ETag.
+        *timestamps (datetime): Candidates for Last-Modified; the latest one
+            that is not None is used.
+    """
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    timestamps = [t for t in timestamps if t]
+    if timestamps:
+        response['Last-Modified'] = http_date(max(timestamps).timestamp())
+    return response
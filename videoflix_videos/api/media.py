@@ -0,0 +1,256 @@
+"""
+Serving of uploaded media: originals, HLS playlists and segments, thumbnails.
+
+Access is checked in Python. The bytes are then either handed to the front
+proxy with ``X-Accel-Redirect`` (nginx) or ``X-Sendfile`` (Apache, lighttpd),
+depending on ``MEDIA_SERVE_MODE``, or streamed by Django itself with support
+for single byte ranges. When Django streams, the WSGI server's
+``wsgi.file_wrapper`` (gunicorn's uses ``os.sendfile``) sends the requested
+range straight from the file descriptor. Media in a remote storage such as
+S3 is answered with a redirect to the storage's (signed) URL, except for
+playlists and WebVTT indexes: their URIs are relative, and would resolve
+against the signed URL without its signature, so they are read from the
+storage and served here to keep their URIs below ``/media/``.
+"""
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, Http404
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
+from videoflix_auth.authentication import CachedTokenAuthentication
+from videoflix_videos.storage import is_local
+from urllib.parse import quote
+import mimetypes
+import os
+import posixpath
+import re
+import logging
+logger = logging.getLogger(__name__)
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Segments and originals never change once written; playlists grow while
+# renditions are published and must be revalidated.
+IMMUTABLE_EXTENSIONS = {'.ts', '.m4s', '.mp4', '.aac', '.vtt', '.jpg', '.jpeg', '.png', '.webp'}
+PLAYLIST_EXTENSIONS = {'.m3u8'}
+# Files listing relative URIs, served by Django from a remote storage.
+INDEX_EXTENSIONS = PLAYLIST_EXTENSIONS | {'.vtt'}
+CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+    '.m4s': 'video/iso.segment',
+}
+
+
+class QueryTokenAuthentication(CachedTokenAuthentication):
+    """
+    Token authentication from the ``token`` query parameter, for media
+    elements that cannot send an Authorization header.
+    """
+
+    def authenticate(self, request):
+        key = request.query_params.get('token')
+        if not key:
+            return None
+        return self.authenticate_credentials(key)
+
+
+class RangeFile:
+    """
+    A read-only view of ``length`` bytes of a file starting at ``start``.
+
+    The underlying file is positioned at start, so a file_wrapper using
+    ``os.sendfile`` on ``fileno()`` sends exactly the range, given the
+    response's Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        self.name = file.name
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return the (start, end) byte positions, both inclusive, of a Range header.
+
+    Only single ranges are supported; for anything else the whole file is
+    served.
+
+    Args:
+        header (str): The Range header, e.g. ``bytes=0-1023`` or ``bytes=-500``.
+        size (int): The size of the file.
+
+    Returns:
+        tuple: (start, end), None to serve the whole file, or False if the
+        range cannot be satisfied.
+    """
+
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def cache_control(path):
+    """
+    Return the Cache-Control header for a media file.
+    """
+
+    visibility = 'public' if is_public(path) else 'private'
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PLAYLIST_EXTENSIONS:
+        return f'{visibility}, no-cache'
+    if extension in IMMUTABLE_EXTENSIONS:
+        return f'{visibility}, max-age={settings.MEDIA_IMMUTABLE_MAX_AGE}, immutable'
+    return f'{visibility}, max-age=3600'
+
+
+def clean_path(path):
+    """
+    Return a requested media path in normal form.
+
+    Paths with empty, ``.`` or ``..`` segments or a leading slash are
+    rejected, so ``thumbnails/../videos/...`` cannot pass the public prefix
+    check for a file outside it.
+
+    Raises:
+        Http404: If the path is not in normal form.
+    """
+
+    if path.startswith('/') or '\\' in path or any(part in ('', '.', '..') for part in path.split('/')):
+        raise Http404('File not found.')
+    return posixpath.normpath(path)
+
+
+def is_public(path):
+    return any(path.startswith(prefix) for prefix in settings.MEDIA_PUBLIC_PREFIXES)
+
+
+def content_type(path):
+    extension = os.path.splitext(path)[1].lower()
+    return CONTENT_TYPES.get(extension) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+class MediaView(APIView):
+    authentication_classes = [CachedTokenAuthentication, QueryTokenAuthentication]
+    permission_classes = [AllowAny]
+
+    def get(self, request, path, *args, **kwargs):
+        """
+        Serve a file below MEDIA_ROOT.
+
+        Files outside MEDIA_PUBLIC_PREFIXES require a token, either in the
+        Authorization header or in the ``token`` query parameter. Depending
+        on MEDIA_SERVE_MODE the transfer is delegated to the front proxy or
+        streamed by Django with Range support (HTTP 206, or 416 for a range
+        beyond the end of the file).
+
+        Args:
+            path (str): The path of the file relative to MEDIA_ROOT.
+
+        Returns:
+            HttpResponse: The file, an offload response for the proxy, 304
+            if the file is not newer than If-Modified-Since, or a redirect
+            to a segment, original or image in a remote storage.
+
+        Raises:
+            Http404: If the file does not exist, lies outside MEDIA_ROOT or
+            the path is not normalized, see clean_path.
+        """
+        path = clean_path(path)
+        if not is_public(path) and not request.user.is_authenticated:
+            raise NotAuthenticated()
+        if not is_local(default_storage):
+            return self.remote(path)
+        try:
+            full_path = safe_join(settings.MEDIA_ROOT, path)
+        except SuspiciousFileOperation:
+            raise Http404('File not found.')
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            raise Http404('File not found.')
+        if not os.path.isfile(full_path):
+            raise Http404('File not found.')
+        if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+            response = HttpResponse(status=304)
+        elif settings.MEDIA_SERVE_MODE == 'x-accel-redirect':
+            response = HttpResponse(content_type=content_type(path))
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+        elif settings.MEDIA_SERVE_MODE == 'x-sendfile':
+            response = HttpResponse(content_type=content_type(path))
+            response['X-Sendfile'] = full_path
+        else:
+            response = self.stream(request, full_path, stat.st_size, content_type(path))
+        response['Cache-Control'] = cache_control(path)
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        return response
+
+    def remote(self, path):
+        """
+        Answer for a file in a remote storage.
+
+        Playlists and WebVTT indexes are small and read through the storage,
+        everything else is redirected to its signed URL.
+        """
+        if os.path.splitext(path)[1].lower() not in INDEX_EXTENSIONS:
+            response = HttpResponseRedirect(default_storage.url(path))
+            response['Cache-Control'] = 'private, no-store'
+            return response
+        try:
+            with default_storage.open(path, 'rb') as f:
+                content = f.read()
+        except (FileNotFoundError, SuspiciousFileOperation):
+            raise Http404('File not found.')
+        response = HttpResponse(content, content_type=content_type(path))
+        response['Cache-Control'] = cache_control(path)
+        return response
+
+    def stream(self, request, full_path, size, mime_type):
+        """
+        Stream the file, or the requested byte range of it, with FileResponse.
+        """
+        byte_range = parse_range(request.headers.get('Range'), size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        start, end = byte_range or (0, size - 1)
+        length = max(end - start + 1, 0)
+        response = FileResponse(RangeFile(open(full_path, 'rb'), start, length), content_type=mime_type)
+        response['Content-Length'] = str(length)
+        response['Accept-Ranges'] = 'bytes'
+        if byte_range:
+            response.status_code = 206
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return response
@@ -0,0 +1,123 @@
+from rest_framework.pagination import BasePagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.db.models import BooleanField, DateTimeField, F, Func, IntegerField, Value
+from datetime import datetime
+import base64
+import binascii
+import json
+
+
+class RowBefore(Func):
+    """
+    The row comparison ``(uploaded_at, id) < (%s, %s)``.
+
+    Unlike the equivalent OR of two conditions, a row comparison is a single
+    range bound on the ``(uploaded_at, id)`` index, so the database seeks to
+    the cursor instead of filtering from the newest row.
+    """
+
+    arity = 4
+    output_field = BooleanField()
+
+    def __init__(self, uploaded_at, pk):
+        super().__init__(
+            F('uploaded_at'), F('id'),
+            Value(uploaded_at, output_field=DateTimeField()), Value(pk, output_field=IntegerField()),
+        )
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sqls, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            sqls.append(sql)
+            params.extend(expression_params)
+        return f'({sqls[0]}, {sqls[1]}) < ({sqls[2]}, {sqls[3]})', params
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate videos newest first by seeking on ``(uploaded_at, id)``.
+
+    Instead of an offset the ``cursor`` query parameter holds the position
+    of the last video of the previous page, and the next page is read with
+    ``WHERE (uploaded_at, id) < cursor ORDER BY uploaded_at DESC, id DESC``.
+    With the matching index every page costs the same, however deep.
+    """
+
+    page_size = 24
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-uploaded_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Return the videos of the page selected by the request's cursor.
+
+        One row more than the page size is read to know if a next page exists.
+        """
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position:
+            uploaded_at, pk = position
+            queryset = queryset.filter(RowBefore(uploaded_at, pk))
+        rows = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        """
+        Return the ``(uploaded_at, id)`` position encoded in the cursor, or None.
+
+        Raises:
+            NotFound: If the cursor cannot be decoded.
+        """
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            return datetime.fromisoformat(data['u']), int(data['i'])
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, video):
+        data = json.dumps({'u': video.uploaded_at.isoformat(), 'i': video.id})
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def get_next_cursor(self):
+        """
+        Return the cursor of the next page, or None on the last page.
+        """
+
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_link(self, request, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.get_link(self.request, self.get_next_cursor())
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -1,13 +1,47 @@
 from rest_framework import serializers
 from django.conf import settings
-from videoflix_videos.models import Video, UserVideoProgress
+from django.core.files.storage import default_storage
+from videoflix_videos.models import Video, UserVideoProgress, TranscodeJob, UploadSession
+
+
+def media_url(name, request=None):
+    """
+    Return the URL of a stored file, absolute when a request is given, like DRF's FileField.
+    """
+
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class SizedThumbnailMixin:
+    """
+    Serialize ``thumbnail`` as the generated poster of ``thumbnail_size``.
+
+    ``thumbnail`` becomes the URL of the JPEG of that size and
+    ``thumbnail_webp`` the URL of the WebP, so clients download a poster
+    made for the place it is shown in instead of the full-size upload. Until
+    the artwork is generated the uploaded thumbnail is returned.
+    """
+
+    thumbnail_size = 'list'
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'thumbnail' in data:
+            request = self.context.get('request')
+            variants = (instance.thumbnails or {}).get(self.thumbnail_size, {})
+            if variants.get('jpeg'):
+                data['thumbnail'] = media_url(variants['jpeg'], request)
+            data['thumbnail_webp'] = media_url(variants['webp'], request) if variants.get('webp') else None
+        return data
+
 
 class UserVideoProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserVideoProgress
         fields = ['last_viewed_position', 'viewed', 'last_viewed_at']
 
-class VideoSerializer(serializers.ModelSerializer):
+class VideoSerializer(SizedThumbnailMixin, serializers.ModelSerializer):
     user_progress = serializers.SerializerMethodField()
 
     class Meta:
@@ -17,37 +51,83 @@ class VideoSerializer(serializers.ModelSerializer):
     def get_user_progress(self, obj):
         """
         Return the user's progress for the given video as a serialized UserVideoProgress, or None if the user is not authenticated or no progress is found.
+
+        Lists serialize without progress, with ``include_user_progress`` set
+        to False, and merge the progress of all videos at once, see
+        videoflix_videos.cache.merge_user_progress.
         """
         request = self.context.get('request')
-        if request:
-            print(f"Request user: {request.user}, Authenticated: {request.user.is_authenticated}")
-        if request and request.user.is_authenticated:
-            progress = UserVideoProgress.objects.filter(user=request.user, video=obj).first()
-            print(f"Progress found: {progress}")
-            if progress:
-                return UserVideoProgressSerializer(progress).data
+        if not request or not request.user.is_authenticated or not self.context.get('include_user_progress', True):
+            return None
+        progress = UserVideoProgress.objects.filter(user=request.user, video=obj).first()
+        if progress:
+            return UserVideoProgressSerializer(progress).data
         return None
     
     
-class VideoSerializerSingle(serializers.ModelSerializer):
+class VideoGridSerializer(VideoSerializer):
+    """
+    Slim representation of a video for catalogue grids, requested with
+    ``?fields=grid`` on the video list. Thumbnails come in the card size.
+    """
+
+    thumbnail_size = 'card'
+
+    class Meta:
+        model = Video
+        fields = ['id', 'title', 'thumbnail', 'genre', 'uploaded_at', 'user_progress']
+
+
+class VideoSerializerSingle(SizedThumbnailMixin, serializers.ModelSerializer):
+    thumbnail_size = 'hero'
     user_progress = serializers.SerializerMethodField()
     hls_master_playlist_url = serializers.SerializerMethodField()
+    hls_status = serializers.SerializerMethodField()
+    preview_sprites_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Video
-        fields = ['title', 'file', 'thumbnail', 'description', 'hls_master_playlist_url', 'uploaded_at', 'user_progress', 'id', 'genre', 'user_progress'] 
+        fields = ['title', 'file', 'thumbnail', 'description', 'hls_master_playlist_url', 'hls_status', 'preview_sprites_url', 'uploaded_at', 'user_progress', 'id', 'genre', 'user_progress'] 
+
+    def get_preview_sprites_url(self, obj):
+        """
+        Return the URL of the WebVTT index of the seek-preview sprites, or None.
+
+        Each cue of the index references a tile of a sprite sheet with a
+        ``#xywh=`` fragment relative to the index.
+        """
+
+        if obj.preview_sprites:
+            return media_url(obj.preview_sprites.name, self.context.get('request'))
+        return None
 
     def get_hls_master_playlist_url(self, obj):
         """
         Return the URL of the HLS master playlist for the given video, or None if no HLS version of the video exists.
         
         The URL is constructed by concatenating the MEDIA_URL setting with the video ID and the path to the master.m3u8 file.
+        It is available as soon as the first renditions are published, while higher renditions may still be encoding;
+        see hls_status for which renditions the playlist currently lists.
         """
         
         if obj.hls_master_playlist:
             return f"https://vm.paul-ivan.com/media/videos/hls/{obj.id}/master.m3u8"
         return None
 
+    def get_hls_status(self, obj):
+        """
+        Return the publishing state of the HLS renditions of the given video.
+
+        Returns:
+            dict: 'complete' is True once the whole ladder is encoded and
+            'ready_renditions' lists the renditions players can use now.
+        """
+
+        return {
+            'complete': obj.hls_complete,
+            'ready_renditions': obj.hls_renditions,
+        }
+
     def get_user_progress(self, obj):
         """
         Retrieve the user's progress for the specified video.
@@ -65,7 +145,7 @@ class VideoSerializerSingle(serializers.ModelSerializer):
         """
 
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
+        if request and request.user.is_authenticated and self.context.get('include_user_progress', True):
             progress = UserVideoProgress.objects.filter(user=request.user, video=obj).first()
             if progress:
                 return UserVideoProgressSerializer(progress).data
@@ -76,3 +156,37 @@ class UserVideoProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserVideoProgress
         fields = ['last_viewed_position', 'viewed',]
+
+
+class ProgressEventSerializer(serializers.Serializer):
+    """
+    A progress event queued by an offline client, see ProgressSyncView.
+    """
+
+    video_id = serializers.IntegerField(min_value=1)
+    position = serializers.FloatField(min_value=0)
+    viewed = serializers.BooleanField()
+    client_ts = serializers.DateTimeField()
+
+
+class TranscodeJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TranscodeJob
+        fields = ['id', 'video', 'state', 'progress', 'renditions', 'attempts', 'error', 'task_id', 'created_at', 'updated_at', 'finished_at']
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """
+    A resumable upload, see videoflix_videos.uploads.
+
+    ``sha256`` is the SHA-256 of the whole file in hex as known to the
+    client; it is optional and checked when the upload is finalized.
+    """
+
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', source='expected_sha256', required=False, write_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'offset', 'state', 'title', 'description', 'genre', 'sha256', 'video', 'created_at']
+        read_only_fields = ['id', 'offset', 'state', 'video', 'created_at']
+        extra_kwargs = {'size': {'min_value': 1}}
@@ -1,9 +1,18 @@
 from django.urls import path
-from .views import UploadVideoView, VideoListView, SingleVideoView, VideoProgressView
+from .views import (
+    UploadVideoView, VideoListView, SingleVideoView, VideoProgressView, TranscodeJobView, ContinueWatchingView, ProgressSyncView,
+    UploadSessionListView, UploadSessionView, UploadFinalizeView,
+)
 
 urlpatterns = [
     path('videos/upload/', UploadVideoView.as_view(), name='upload_video'),
+    path('videos/uploads/', UploadSessionListView.as_view(), name='upload_sessions'),
+    path('videos/uploads/<uuid:upload_id>/', UploadSessionView.as_view(), name='upload_session'),
+    path('videos/uploads/<uuid:upload_id>/finalize/', UploadFinalizeView.as_view(), name='upload_finalize'),
     path('videos/', VideoListView.as_view(), name='video_list'),
+    path('videos/continue/', ContinueWatchingView.as_view(), name='continue_watching'),
     path('videos/<int:video_id>/', SingleVideoView.as_view(), name='single_video'),
+    path('videos/<int:video_id>/transcode/', TranscodeJobView.as_view(), name='transcode_job'),
+    path('video/progress/sync/', ProgressSyncView.as_view(), name='progress_sync'),
     path('video/<int:video_id>/progress/', VideoProgressView.as_view(), name='video-progress'),
 ]
\ No newline at end of file
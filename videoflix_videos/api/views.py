@@ -1,11 +1,17 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from videoflix_videos.models import Video, UserVideoProgress
+from videoflix_videos.models import Video, UserVideoProgress, TranscodeJob, UploadSession
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
-from ..tasks import convert_to_hls
-from .serializers import VideoSerializer, VideoSerializerSingle, UserVideoProgressSerializer
+from .serializers import VideoSerializer, VideoSerializerSingle, VideoGridSerializer, UserVideoProgressSerializer, ProgressEventSerializer, TranscodeJobSerializer, UploadSessionSerializer
+from .pagination import KeysetPagination
+from videoflix_videos.cache import cached_catalogue_data, cached_user_data, merge_user_progress, catalogue_etag, bump_progress_version
+from videoflix_videos.progress import record_progress, sync_progress, get_buffered_progress
+from videoflix_videos.uploads import create_upload, append_chunk, finalize_upload, abort_upload, parse_checksum, uploaded_sha256
+from django.conf import settings
+from .conditional import etag_matches, not_modified, add_validators
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 
 class UploadVideoView(APIView):
     permission_classes= [IsAdminUser]
@@ -15,42 +21,232 @@ class UploadVideoView(APIView):
         This API endpoint takes a POST request with the following fields:
         - title (string): The title of the video.
         - file (file): The video file to upload.
-        - thumbnail (file): The video thumbnail to upload.
+        - thumbnail (file): The video thumbnail to upload, optional; posters
+          are generated from the video, see generate_artwork.
         - description (string): The description of the video.
         - genre (string): The genre of the video.
         Returns a JSON response with the following keys:
         - message (string): A message indicating that the video was uploaded successfully and conversion has started.
         - video_id (int): The ID of the video that was just uploaded.
+        - job_id (int): The ID of the transcode job, see TranscodeJobView.
         - task_id (string): The Celery task ID for the HLS conversion task.
+
+        The conversion is queued by the post_save signal of the video. The
+        SHA-256 of the file is computed while it is uploaded; if an identical
+        file was uploaded before, its original and HLS output are reused
+        instead of converting again, see start_transcode.
         """
         serializer = VideoSerializer(data=request.data)
         if serializer.is_valid():
-            video = serializer.save()
-            task = convert_to_hls.delay(video.id)
+            video = serializer.save(content_hash=uploaded_sha256(request, 'file'))
+            job = video.transcode_jobs.first()
             return Response({
                 'message': 'Video uploaded successfully and conversion started.',
                 'video_id': video.id,
-                'task_id': task.id,
+                'job_id': job.id if job else None,
+                'task_id': job.task_id if job else None,
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
+
+
+def upload_response(session, status_code, data=None):
+    """
+    Return a response carrying the tus offset headers of an upload.
+    """
+    response = Response(data, status=status_code)
+    response['Upload-Offset'] = str(session.offset)
+    response['Upload-Length'] = str(session.size)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+class UploadSessionListView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Start a resumable upload of a video.
+
+        This API endpoint takes a JSON body with the fields:
+        - filename (string): The name of the original file.
+        - size (int): The total size of the file in bytes, at most UPLOAD_MAX_SIZE.
+        - title, description, genre (string): The fields of the video.
+        - sha256 (string): The SHA-256 of the file in hex, optional.
+
+        The file is then sent with PATCH requests to the returned ``upload_url``
+        and turned into a video with a POST to its ``finalize/`` URL.
+
+        Returns:
+            Response: The serialized upload with its ``upload_url``, a Location
+            header and HTTP 201 status, or HTTP 400 with the validation errors.
+        """
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        session = create_upload(
+            request.user, data['filename'], data['size'], data['title'], description=data.get('description', ''),
+            genre=data.get('genre', ''), sha256=data.get('expected_sha256', ''),
+        )
+        url = request.build_absolute_uri(reverse('upload_session', args=[session.id]))
+        response = upload_response(session, status.HTTP_201_CREATED, {**UploadSessionSerializer(session).data, 'upload_url': url})
+        response['Location'] = url
+        return response
+
+
+class UploadSessionView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get_session(self, request, upload_id):
+        return get_object_or_404(UploadSession, id=upload_id, user=request.user)
+
+    def get(self, request, upload_id, *args, **kwargs):
+        """
+        Retrieve an upload; its ``offset`` is where the next chunk must start.
+
+        Returns:
+            Response: The serialized upload with the Upload-Offset and
+            Upload-Length headers and HTTP 200 status. A HEAD request returns
+            the headers only.
+        """
+        session = self.get_session(request, upload_id)
+        return upload_response(session, status.HTTP_200_OK, UploadSessionSerializer(session).data)
+
+    def patch(self, request, upload_id, *args, **kwargs):
+        """
+        Append a chunk to an upload.
+
+        The request body is the raw chunk, e.g. with the content type
+        ``application/offset+octet-stream``. The request must carry:
+        - Upload-Offset: The current offset of the upload.
+        - Content-Length: The size of the chunk, at most UPLOAD_MAX_CHUNK_SIZE.
+        - Upload-Checksum: ``sha256 <base64 digest>`` of the chunk, optional.
+
+        The chunk is written to the file while it is read from the request,
+        see append_chunk.
+
+        Returns:
+            Response: HTTP 204 with the new Upload-Offset, HTTP 409 if the
+            offset does not match or another chunk is in flight, HTTP 460 if the checksum does not match,
+            HTTP 413 for a chunk larger than UPLOAD_MAX_CHUNK_SIZE, or HTTP
+            400 for missing headers.
+        """
+        session = self.get_session(request, upload_id)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({"error": "Upload-Offset and Content-Length are required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.UPLOAD_MAX_CHUNK_SIZE:
+            return Response({"error": f"Chunks are limited to {settings.UPLOAD_MAX_CHUNK_SIZE} bytes."},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        checksum = parse_checksum(request.headers.get('Upload-Checksum'))
+        session = append_chunk(session.id, offset, request.stream, length, checksum)
+        return upload_response(session, status.HTTP_204_NO_CONTENT)
+
+    def delete(self, request, upload_id, *args, **kwargs):
+        """
+        Abort an upload and delete the bytes received so far.
+
+        Returns:
+            Response: HTTP 204.
+        """
+        abort_upload(self.get_session(request, upload_id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadFinalizeView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, upload_id, *args, **kwargs):
+        """
+        Create the video of a complete upload and start its conversion.
+
+        Returns:
+            Response: A JSON response with the same keys as UploadVideoView and
+            the ``sha256`` of the file, with HTTP 201 status. HTTP 409 is
+            returned if the upload is incomplete or already finalized, and HTTP
+            400 if the file does not match the announced SHA-256.
+        """
+        session = get_object_or_404(UploadSession, id=upload_id, user=request.user)
+        video = finalize_upload(session.id)
+        job = video.transcode_jobs.first()
+        return Response({
+            'message': 'Video uploaded successfully and conversion started.',
+            'video_id': video.id,
+            'job_id': job.id if job else None,
+            'task_id': job.task_id if job else None,
+            'sha256': video.upload_session.sha256,
+        }, status=status.HTTP_201_CREATED)
+
+
 class VideoListView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request, *args, **kwargs):
         """
-        Retrieve a list of all available videos.
+        Retrieve a page of the available videos, newest first.
 
         This API endpoint requires authentication and returns a JSON response
-        containing a list of all videos available in the system. Each video is
-        serialized using the VideoSerializer, which includes fields such as
-        title, file, thumbnail, description, and genre.
+        with one page of videos in ``results`` and the URL of the following
+        page in ``next`` (None on the last page). Each video is serialized
+        using the VideoSerializer, which includes fields such as title, file,
+        thumbnail, description, and genre.
+
+        Query parameters:
+        - genre (string): Only list videos of this genre.
+        - search (string): Only list videos whose title contains this text.
+        - fields (string): ``grid`` returns the slim VideoGridSerializer fields.
+        - page_size (int): Videos per page, at most 100.
+        - cursor (string): The position to continue from, taken from ``next``.
+
+        Pages are read with keyset pagination on (uploaded_at, id), see
+        KeysetPagination. The serialized page is shared by all users and kept
+        in the versioned catalogue cache; the progress of the current user for
+        the videos of the page is merged in with one query per request.
+
+        The response carries a strong ETag built from the catalogue version
+        and the user's progress version, and Last-Modified from the newest
+        uploaded_at or last_viewed_at. When If-None-Match matches the ETag
+        an empty 304 is returned without any database query.
 
         Returns:
             Response: A JSON response with serialized video data and HTTP 200 status.
         """
+        etag = catalogue_etag('list', request)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        paginator = KeysetPagination()
+        page = cached_catalogue_data('list', request, lambda: self.build_page(request, paginator))
+        last_viewed_at = merge_user_progress(page['results'], request.user)
+        response = Response({
+            'next': paginator.get_link(request, page['next_cursor']),
+            'results': page['results'],
+        }, status=status.HTTP_200_OK)
+        return add_validators(response, etag, page['last_uploaded_at'], last_viewed_at)
+
+    def build_page(self, request, paginator):
+        """
+        Query and serialize one page of videos without user progress.
+        """
         videos = Video.objects.all()
-        serializer = VideoSerializer(videos, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        genre = request.query_params.get('genre')
+        if genre:
+            videos = videos.filter(genre=genre)
+        search = request.query_params.get('search')
+        if search:
+            videos = videos.filter(title__icontains=search)
+        serializer_class = VideoSerializer
+        if request.query_params.get('fields') == 'grid':
+            serializer_class = VideoGridSerializer
+            videos = videos.only('id', 'title', 'thumbnail', 'thumbnails', 'genre', 'uploaded_at')
+        page = paginator.paginate_queryset(videos, request)
+        serializer = serializer_class(page, many=True, context={'request': request, 'include_user_progress': False})
+        return {
+            'next_cursor': paginator.get_next_cursor(),
+            'last_uploaded_at': max((video.uploaded_at for video in page), default=None),
+            'results': serializer.data,
+        }
     
     
 class SingleVideoView(APIView):
@@ -67,14 +263,104 @@ class SingleVideoView(APIView):
         Args:
             video_id (int): The ID of the video to retrieve.
 
+        The video data is kept in the catalogue cache and the progress of the
+        current user is merged in per request. Like the video list, the
+        response carries an ETag; a request whose If-None-Match matches it
+        gets an empty 304 without any database query.
+
         Returns:
             Response: A JSON response with serialized video data and HTTP 200 status.
         """
+        etag = catalogue_etag(f'video:{video_id}', request)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        cached = cached_catalogue_data(f'video:{video_id}', request, lambda: self.build_video(request, video_id))
+        data = cached['video']
+        last_viewed_at = merge_user_progress([data], request.user)
+        response = Response(data, status=status.HTTP_200_OK)
+        return add_validators(response, etag, cached['uploaded_at'], last_viewed_at)
+
+    def build_video(self, request, video_id):
+        """
+        Serialize the video without user progress.
+
+        Raises:
+            Http404: If the video does not exist.
+        """
         video = get_object_or_404(Video, id=video_id)
-        serializer = VideoSerializerSingle(video, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = VideoSerializerSingle(video, context={'request': request, 'include_user_progress': False}).data
+        return {'video': data, 'uploaded_at': video.uploaded_at}
+
+
+class ContinueWatchingView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Retrieve the videos the user started but has not finished watching.
+
+        This API endpoint requires authentication and returns a JSON response
+        with the videos in ``results``, most recently watched first. Each
+        video is serialized with the VideoGridSerializer fields and carries
+        the user's progress and ``last_viewed_at``.
+
+        Query parameters:
+        - limit (int): The number of videos to return, at most
+          CONTINUE_WATCHING_MAX_LIMIT.
+
+        The list is read with one query on the (user, viewed, last_viewed_at)
+        index and cached per user under the user's progress version, so every
+        progress write invalidates it. Like the video list, the response
+        carries an ETag and answers a matching If-None-Match with a 304.
+
+        Returns:
+            Response: A JSON response with the videos and HTTP 200 status.
+        """
+        etag = catalogue_etag('continue', request)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        data = cached_user_data('continue', request, lambda: self.build_list(request))
+        last_viewed_at = max((video['last_viewed_at'] for video in data['results']), default=None)
+        response = Response(data, status=status.HTTP_200_OK)
+        return add_validators(response, etag, last_viewed_at)
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', settings.CONTINUE_WATCHING_LIMIT))
+        except ValueError:
+            return settings.CONTINUE_WATCHING_LIMIT
+        return max(1, min(limit, settings.CONTINUE_WATCHING_MAX_LIMIT))
+
+    def build_list(self, request):
+        """
+        Query and serialize the user's unfinished videos.
+
+        In write-behind mode the buffered progress of the listed videos is
+        applied on top; videos only started since the last flush appear
+        once the buffer is written.
+        """
+        rows = list(
+            UserVideoProgress.objects
+            .filter(user=request.user, viewed=False, last_viewed_position__gt=0)
+            .select_related('video')
+            .order_by('-last_viewed_at')[:self.get_limit(request)]
+        )
+        if settings.PROGRESS_WRITE_BEHIND:
+            buffered = get_buffered_progress(request.user.pk, [row.video_id for row in rows])
+            for row in rows:
+                for name, value in buffered.get(row.video_id, {}).items():
+                    setattr(row, name, value)
+            rows = sorted((row for row in rows if not row.viewed), key=lambda row: row.last_viewed_at, reverse=True)
+        context = {'request': request, 'include_user_progress': False}
+        results = []
+        for row in rows:
+            video = VideoGridSerializer(row.video, context=context).data
+            video['user_progress'] = UserVideoProgressSerializer(row).data
+            video['last_viewed_at'] = row.last_viewed_at
+            results.append(video)
+        return {'results': results}
+
 
-    
 class VideoProgressView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -93,18 +379,107 @@ class VideoProgressView(APIView):
         Returns:
             Response: A JSON response with the updated progress data and HTTP 200 status if successful,
             or a JSON response with error details and the appropriate HTTP status code if an error occurs.
+
+        The progress is written with a single upsert, see record_progress. With
+        PROGRESS_WRITE_BEHIND the update is buffered in Redis and written to the
+        database later by the flush_progress_buffer task.
         """
 
-        try:
-            progress, created = UserVideoProgress.objects.get_or_create(
-                user=request.user,
-                video_id=video_id
-            )
-            serializer = UserVideoProgressSerializer(progress, data=request.data, partial=True)
-            if serializer.is_valid():
-                serializer.save()
-                return Response(serializer.data, status=status.HTTP_200_OK)
+        serializer = UserVideoProgressSerializer(data=request.data, partial=True)
+        if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        progress = record_progress(request.user, video_id, serializer.validated_data)
+        if progress is None:
+            return Response({"error": "Video not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(UserVideoProgressSerializer(progress).data, status=status.HTTP_200_OK)
+
+
+class ProgressSyncView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Apply a batch of progress events queued by an offline client.
+
+        This API endpoint requires authentication and takes a JSON array of
+        events, each with the fields:
+        - video_id (int): The video the event is about.
+        - position (float): The playback position in seconds.
+        - viewed (bool): Whether the video was watched to the end.
+        - client_ts (datetime): When the event happened on the client.
+
+        Of several events for one video only the one with the latest
+        client_ts is applied. All events are written in one transaction with
+        a single upsert, which keeps stored progress that has a newer client
+        timestamp, e.g. from another device.
+
+        Returns:
+            Response: A JSON response with one result per event in ``results``,
+            in request order, and HTTP 200 status. Each result has the
+            ``video_id`` and a ``status`` of ``applied``, ``stale`` (newer
+            progress was kept), ``superseded`` (a later event in the batch
+            won), ``not_found`` or ``invalid`` with the ``errors``. Applied
+            and stale results carry the stored ``progress``. HTTP 400 is
+            returned if the body is not an array or has more than
+            PROGRESS_SYNC_MAX_EVENTS events.
+        """
+        if not isinstance(request.data, list):
+            return Response({"error": "Expected a list of progress events."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > settings.PROGRESS_SYNC_MAX_EVENTS:
+            return Response({"error": f"At most {settings.PROGRESS_SYNC_MAX_EVENTS} events per request."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        events = [ProgressEventSerializer(data=item) for item in request.data]
+        latest = {}
+        for serializer in events:
+            if serializer.is_valid():
+                event = serializer.validated_data
+                current = latest.get(event['video_id'])
+                if current is None or current['client_ts'] <= event['client_ts']:
+                    latest[event['video_id']] = event
+        applied = sync_progress(request.user.id, list(latest.values()))
+        if any(state == 'applied' for state, _ in applied.values()):
+            bump_progress_version(request.user.id)
+        return Response({'results': [self.result(serializer, latest, applied) for serializer in events]},
+                        status=status.HTTP_200_OK)
 
-        except Video.DoesNotExist:
-            return Response({"error": "Video not found."}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+    def result(self, serializer, latest, applied):
+        """
+        Describe the outcome of one event of the batch.
+        """
+        if serializer.errors:
+            item = serializer.initial_data
+            video_id = item.get('video_id') if isinstance(item, dict) else None
+            return {'video_id': video_id, 'status': 'invalid', 'errors': serializer.errors}
+        event = serializer.validated_data
+        if latest[event['video_id']] is not event:
+            return {'video_id': event['video_id'], 'status': 'superseded'}
+        state, progress = applied[event['video_id']]
+        result = {'video_id': event['video_id'], 'status': state}
+        if progress is not None:
+            result['progress'] = UserVideoProgressSerializer(progress).data
+        return result
+
+
+class TranscodeJobView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, video_id, *args, **kwargs):
+        """
+        Retrieve the latest transcode job of a video.
+
+        This API endpoint is meant to be polled by admins after an upload. It
+        returns the state of the conversion (queued, probing, encoding,
+        packaging, done or failed), the progress in percent, the status of
+        each rendition, the number of attempts and the last error.
+
+        Args:
+            video_id (int): The ID of the video whose job to retrieve.
+
+        Returns:
+            Response: A JSON response with the serialized job and HTTP 200 status,
+            or HTTP 404 if the video has no transcode job.
+        """
+        job = TranscodeJob.objects.filter(video_id=video_id).first()
+        if job is None:
+            return Response({"error": "No transcode job found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(TranscodeJobSerializer(job).data, status=status.HTTP_200_OK)
@@ -0,0 +1,183 @@
+import os
+import re
+import subprocess
+import tempfile
+
+SCENE_TIME_RE = re.compile(r'pts_time:(\d+(?:\.\d+)?)')
+FORMAT_EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp'}
+FORMAT_CODEC_ARGS = {
+    'jpeg': ['-c:v', 'mjpeg', '-q:v', '3'],
+    'webp': ['-c:v', 'libwebp', '-quality', '80'],
+}
+SPRITE_NAME = 'sprite_%03d.jpg'
+SPRITE_VTT_NAME = 'sprite.vtt'
+
+
+def even(value):
+    return max(2, int(round(value / 2)) * 2)
+
+
+def scene_scan_window(duration, scan_seconds):
+    """
+    Return the ``(start, length)`` in seconds of the part of a video scanned for scenes.
+
+    The scan starts where pick_poster_time starts accepting scene changes,
+    so no decoded frame is wasted on the intro, and ends at the latest
+    accepted time or after ``scan_seconds``.
+    """
+
+    duration = duration or 0.0
+    start = duration * 0.05
+    return start, min(scan_seconds, duration * 0.9 - start) if duration else scan_seconds
+
+
+def detect_scenes(ffmpeg, input_file, threshold, start, scan_seconds):
+    """
+    Return the timestamps in seconds of scene changes in a part of a video.
+
+    The frames are scaled down before scoring, which makes the decode the
+    only real cost, and only ``scan_seconds`` from ``start`` on are
+    analyzed, see scene_scan_window.
+
+    Args:
+        ffmpeg (str): Path of the ffmpeg binary.
+        input_file (str): Path or URL of the source video.
+        threshold (float): Minimum scene score between 0 and 1.
+        start (float): Second of the video to start at.
+        scan_seconds (float): Seconds of the video to analyze.
+
+    Returns:
+        list: Sorted timestamps of frames starting a new scene, in seconds
+        from the start of the video.
+    """
+
+    with tempfile.NamedTemporaryFile('r', suffix='.txt') as scenes:
+        subprocess.run(
+            [ffmpeg, '-hide_banner', '-nostats', '-ss', f'{start:.3f}', '-t', f'{scan_seconds:.3f}',
+             '-i', input_file, '-an',
+             '-vf', f"scale=160:-2,select='gt(scene,{threshold})',metadata=print:file={scenes.name}",
+             '-f', 'null', '-'],
+            check=True, capture_output=True, text=True,
+        )
+        # Seeking the input resets its timestamps to zero.
+        return sorted(start + float(match) for match in SCENE_TIME_RE.findall(scenes.read()))
+
+
+def pick_poster_time(scene_times, duration):
+    """
+    Choose the timestamp of the poster frame.
+
+    The first scene change after the opening 5% of the video is used, which
+    skips black intros and studio logos; without one the frame at 10% of the
+    video is taken.
+
+    Args:
+        scene_times (list): Sorted scene change timestamps, see detect_scenes.
+        duration (float): Duration of the video in seconds.
+
+    Returns:
+        float: The poster timestamp in seconds.
+    """
+
+    duration = duration or 0.0
+    for time in scene_times:
+        if duration * 0.05 <= time <= duration * 0.9:
+            return time
+    return duration * 0.1
+
+
+def thumbnail_name(size, fmt):
+    return f'{size}.{FORMAT_EXTENSIONS[fmt]}'
+
+
+def build_thumbnail_command(ffmpeg, input_file, output_dir, time, sizes, formats):
+    """
+    Build the ffmpeg command writing one frame in several sizes and formats.
+
+    The frame is decoded once and split into a scaled copy per size and
+    format, so all thumbnails come from a single seek.
+
+    Args:
+        ffmpeg (str): Path of the ffmpeg binary.
+        input_file (str): Path of the source video.
+        output_dir (str): Directory receiving ``<size>.<ext>`` files.
+        time (float): Timestamp of the frame in seconds.
+        sizes (dict): Thumbnail widths in pixels by size name.
+        formats (list): Image formats, ``jpeg`` and/or ``webp``.
+
+    Returns:
+        list: The ffmpeg command.
+    """
+
+    outputs = [(size, width, fmt) for size, width in sizes.items() for fmt in formats]
+    labels = ''.join(f'[s{i}]' for i in range(len(outputs)))
+    filters = [f'[0:v]split={len(outputs)}{labels}']
+    for i, (_, width, _) in enumerate(outputs):
+        filters.append(f'[s{i}]scale={width}:-2[t{i}]')
+    cmd = [ffmpeg, '-y', '-ss', f'{time:.3f}', '-i', input_file, '-filter_complex', ';'.join(filters)]
+    for i, (size, _, fmt) in enumerate(outputs):
+        cmd += ['-map', f'[t{i}]', '-frames:v', '1'] + FORMAT_CODEC_ARGS[fmt]
+        cmd.append(os.path.join(output_dir, thumbnail_name(size, fmt)))
+    return cmd
+
+
+def sprite_layout(width, height, duration, interval, tile_width):
+    """
+    Return the tile size and the number of tiles of a seek-preview sprite.
+
+    Returns:
+        tuple: (tile width, tile height, tile count).
+    """
+
+    tile_height = even(tile_width * height / width) if width and height else even(tile_width * 9 / 16)
+    count = max(1, int((duration or 0) // interval) + 1)
+    return even(tile_width), tile_height, count
+
+
+def build_sprite_command(ffmpeg, input_file, output_dir, interval, tile_width, tile_height, columns, rows):
+    """
+    Build the ffmpeg command rendering seek-preview sprite sheets.
+
+    One frame every ``interval`` seconds is scaled to a tile; every
+    ``columns`` x ``rows`` tiles form a JPEG sheet named ``sprite_NNN.jpg``.
+    """
+
+    return [
+        ffmpeg, '-y', '-i', input_file, '-an',
+        '-vf', f'fps=1/{interval},scale={tile_width}:{tile_height},tile={columns}x{rows}',
+        '-q:v', '5', '-start_number', '0', os.path.join(output_dir, SPRITE_NAME),
+    ]
+
+
+def format_vtt_time(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f'{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}'
+
+
+def render_sprite_vtt(count, duration, interval, tile_width, tile_height, columns, rows):
+    """
+    Render the WebVTT index mapping time ranges to sprite tiles.
+
+    Each cue covers ``interval`` seconds and points at its tile with a
+    media fragment, e.g. ``sprite_000.jpg#xywh=160,0,160,90``, relative to
+    the VTT file.
+
+    Returns:
+        str: The WebVTT content.
+    """
+
+    per_sheet = columns * rows
+    lines = ['WEBVTT', '']
+    for i in range(count):
+        start = i * interval
+        end = min((i + 1) * interval, duration) if duration else (i + 1) * interval
+        if end <= start:
+            break
+        sheet, index = divmod(i, per_sheet)
+        x = (index % columns) * tile_width
+        y = (index // columns) * tile_height
+        lines.append(f'{format_vtt_time(start)} --> {format_vtt_time(end)}')
+        lines.append(f'{SPRITE_NAME % sheet}#xywh={x},{y},{tile_width},{tile_height}')
+        lines.append('')
+    return '\n'.join(lines)
@@ -0,0 +1,224 @@
+"""
+Versioned cache of the shared catalogue data.
+
+The serialized videos are the same for every user, so they are cached once
+under keys that contain the catalogue version. Changing a video or finishing
+a transcode bumps the version (see signals.py), which makes all older keys
+unreachable at once; they expire after ``CATALOGUE_CACHE_TIMEOUT``. The
+progress of the requesting user is never cached here and is merged into the
+cached data per request by ``merge_user_progress``.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from videoflix_videos.models import UserVideoProgress
+from videoflix_videos.progress import get_buffered_progress
+import hashlib
+import time
+import logging
+logger = logging.getLogger(__name__)
+
+CATALOGUE_VERSION_KEY = 'catalogue:version'
+CATALOGUE_HITS_KEY = 'catalogue:stats:hits'
+CATALOGUE_MISSES_KEY = 'catalogue:stats:misses'
+PROGRESS_VERSION_KEY = 'progress:version:{}'
+
+
+def increment(key, start=0):
+    """
+    Increment a counter in the cache, creating it at start if missing.
+    """
+
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, start, timeout=None)
+        return cache.incr(key)
+
+
+def get_version(key):
+    """
+    Return the version counter stored under key, creating it if missing.
+
+    New counters start at the current Unix time rather than 1, so a counter
+    lost from the cache never restarts below a value handed out before and
+    ETags built from it are not reused for different data.
+    """
+
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time()), timeout=None)
+        version = cache.get(key, int(time.time()))
+    return version
+
+
+def catalogue_version():
+    """
+    Return the current catalogue version.
+    """
+
+    return get_version(CATALOGUE_VERSION_KEY)
+
+
+def bump_catalogue_version():
+    """
+    Invalidate all cached catalogue data by moving to a new version.
+    """
+
+    version = increment(CATALOGUE_VERSION_KEY, int(time.time()))
+    logger.debug(f"Catalogue cache version is now {version}")
+    return version
+
+
+def catalogue_key(name, request):
+    """
+    Return the cache key of a catalogue response for the current version.
+
+    The key covers the query parameters and the host, since file URLs in the
+    serialized data are absolute.
+
+    Args:
+        name (str): The cached resource, e.g. ``'list'`` or ``'video:5'``.
+        request (Request): The request the data is built for.
+    """
+
+    params = sorted(request.query_params.lists())
+    digest = hashlib.md5(f"{request.scheme}://{request.get_host()}|{params}".encode()).hexdigest()
+    return f"catalogue:v{catalogue_version()}:{name}:{digest}"
+
+
+def cached_catalogue_data(name, request, build):
+    """
+    Return cached catalogue data, building and caching it on a miss.
+
+    Args:
+        name (str): The cached resource, see catalogue_key.
+        request (Request): The current request.
+        build (callable): Returns the data to cache; it must not contain
+            anything specific to the requesting user.
+
+    Returns:
+        The cached or freshly built data.
+    """
+
+    key = catalogue_key(name, request)
+    data = cache.get(key)
+    if data is None:
+        increment(CATALOGUE_MISSES_KEY)
+        data = build()
+        cache.set(key, data, settings.CATALOGUE_CACHE_TIMEOUT)
+    else:
+        increment(CATALOGUE_HITS_KEY)
+    return data
+
+
+def progress_version(user_id):
+    """
+    Return the version of a user's playback progress.
+    """
+
+    return get_version(PROGRESS_VERSION_KEY.format(user_id))
+
+
+def bump_progress_version(user_id):
+    """
+    Mark the playback progress of a user as changed.
+    """
+
+    return increment(PROGRESS_VERSION_KEY.format(user_id), int(time.time()))
+
+
+def cached_user_data(name, request, build):
+    """
+    Return cached data of the requesting user, building it on a miss.
+
+    The key contains the user's progress version next to the catalogue key,
+    so every progress write of the user as well as every catalogue change
+    invalidates it.
+
+    Args:
+        name (str): The cached resource, e.g. ``'continue'``.
+        request (Request): The current request of an authenticated user.
+        build (callable): Returns the data to cache.
+
+    Returns:
+        The cached or freshly built data.
+    """
+
+    user_id = request.user.pk
+    key = f"progress:{user_id}:v{progress_version(user_id)}:{catalogue_key(name, request)}"
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, settings.CATALOGUE_CACHE_TIMEOUT)
+    return data
+
+
+def catalogue_etag(name, request):
+    """
+    Return a strong ETag for a catalogue response to the current user.
+
+    The tag is derived from the catalogue version, the user's progress
+    version and the request, so it is known without touching the database
+    and changes whenever the video data or the user's progress does.
+
+    Args:
+        name (str): The requested resource, see catalogue_key.
+        request (Request): The current request.
+
+    Returns:
+        str: The quoted ETag.
+    """
+
+    params = sorted(request.query_params.lists())
+    versions = f"{catalogue_version()}|{progress_version(request.user.pk)}|{request.user.pk}"
+    source = f"{versions}|{name}|{request.scheme}://{request.get_host()}|{params}"
+    return f'"{hashlib.md5(source.encode()).hexdigest()}"'
+
+
+def catalogue_cache_stats():
+    """
+    Return the number of catalogue cache hits and misses so far.
+    """
+
+    counts = cache.get_many([CATALOGUE_HITS_KEY, CATALOGUE_MISSES_KEY])
+    return {
+        'hits': counts.get(CATALOGUE_HITS_KEY, 0),
+        'misses': counts.get(CATALOGUE_MISSES_KEY, 0),
+    }
+
+
+def merge_user_progress(videos, user):
+    """
+    Set ``user_progress`` on serialized videos from one query for the user.
+
+    In write-behind mode values still buffered in Redis take precedence
+    over the database rows, see videoflix_videos.progress.
+
+    Args:
+        videos (list): Serialized videos, each a dict with an ``id``.
+        user (User): The requesting user.
+
+    Returns:
+        datetime: The latest ``last_viewed_at`` of the merged progress, or
+        None if the user has no progress for these videos.
+    """
+
+    from videoflix_videos.api.serializers import UserVideoProgressSerializer
+
+    progress = {}
+    last_viewed_at = None
+    if user.is_authenticated and videos:
+        video_ids = [v['id'] for v in videos]
+        rows = {row.video_id: row for row in UserVideoProgress.objects.filter(user=user, video_id__in=video_ids)}
+        if settings.PROGRESS_WRITE_BEHIND:
+            for video_id, values in get_buffered_progress(user.pk, video_ids).items():
+                row = rows.setdefault(video_id, UserVideoProgress(user=user, video_id=video_id))
+                for name, value in values.items():
+                    setattr(row, name, value)
+        for row in rows.values():
+            progress[row.video_id] = UserVideoProgressSerializer(row).data
+            last_viewed_at = max(filter(None, [last_viewed_at, row.last_viewed_at]))
+    for video in videos:
+        video['user_progress'] = progress.get(video['id'])
+    return last_viewed_at
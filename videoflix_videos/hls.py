@@ -0,0 +1,409 @@
+import json
+import math
+import os
+import subprocess
+import tempfile
+from fractions import Fraction
+
+HLS_SEGMENT_SECONDS = '5'
+MASTER_PLAYLIST_NAME = 'master.m3u8'
+
+
+def keyframe_args(frame_rate):
+    """
+    Return ffmpeg options placing a keyframe at every segment boundary.
+
+    Without a fixed GOP the encoder picks keyframes on its own and segments
+    drift away from ``HLS_SEGMENT_SECONDS``. Unknown frame rates fall back to
+    the encoder defaults.
+    """
+
+    if not frame_rate:
+        return []
+    gop = str(max(1, round(frame_rate * int(HLS_SEGMENT_SECONDS))))
+    return ['-g', gop, '-keyint_min', gop, '-sc_threshold', '0']
+
+
+def build_variant_command(ffmpeg, input_file, output_dir, variant, frame_rate=None):
+    """
+    Build the ffmpeg command that encodes a single HLS variant.
+
+    Every call decodes the whole source again, so encoding a full ladder this
+    way costs one decode per variant.
+
+    Args:
+        ffmpeg (str): Path to the ffmpeg binary.
+        input_file (str): Path of the source video.
+        output_dir (str): Directory receiving the playlist and its segments.
+        variant (dict): Ladder entry from build_ladder describing the rendition.
+        frame_rate (float): Source frame rate, used to align keyframes.
+
+    Returns:
+        list: The command as an argument list for subprocess.
+    """
+
+    return [
+        ffmpeg, '-i', input_file,
+        '-vf', f'scale={variant["scale"]}',
+        '-b:v', variant['bitrate'], '-c:v', 'h264', '-preset', 'fast',
+        *keyframe_args(frame_rate),
+        '-c:a', 'aac', '-b:a', '128k', '-ac', '2',
+        '-f', 'hls',
+        '-hls_time', HLS_SEGMENT_SECONDS,
+        '-hls_list_size', '0',
+        '-hls_segment_filename', os.path.join(output_dir, f'segment_{variant["variant"]}_%03d.ts'),
+        os.path.join(output_dir, f'variant_{variant["variant"]}.m3u8')
+    ]
+
+
+def build_single_pass_command(ffmpeg, input_file, output_dir, variants, has_audio=True,
+                              start=None, duration=None, prefix='', frame_rate=None,
+                              write_master=True):
+    """
+    Build one ffmpeg command that encodes all variants from a single decode.
+
+    The decoded video stream is split with ``-filter_complex split`` and each
+    branch is scaled and encoded in parallel. ``-var_stream_map`` ties every
+    video branch to its own audio encode, and ffmpeg writes the master
+    playlist for the produced variants in the same run.
+
+    When ``start`` and ``duration`` are given only that time range of the
+    source is encoded, its timestamps are shifted to their position in the
+    full video and no master playlist is written. ``prefix`` is prepended to
+    the playlist and segment names so several ranges can share a directory.
+    File names use the ``variant`` id of each ladder entry, so a subset of
+    the ladder can be encoded without renaming the other renditions.
+
+    Args:
+        ffmpeg (str): Path to the ffmpeg binary.
+        input_file (str): Path of the source video.
+        output_dir (str): Directory receiving the playlists and segments.
+        variants (list): Ladder entries from build_ladder to encode.
+        has_audio (bool): Whether the source has an audio stream to map.
+        start (float): Start of the range to encode, in seconds.
+        duration (float): Length of the range to encode, in seconds.
+        prefix (str): Prefix for the generated file names.
+        frame_rate (float): Source frame rate, used to align keyframes.
+        write_master (bool): Whether ffmpeg writes the master playlist.
+
+    Returns:
+        list: The command as an argument list for subprocess.
+    """
+
+    count = len(variants)
+    branches = ''.join(f'[v{i}]' for i in range(count))
+    filters = [f'[0:v]split={count}{branches}']
+    for i, v in enumerate(variants):
+        width, height = v['scale'].split('x')
+        filters.append(f'[v{i}]scale={width}:{height}[v{i}out]')
+
+    cmd = [ffmpeg]
+    if start is not None:
+        cmd += ['-ss', f'{start:.3f}', '-t', f'{duration:.3f}']
+    cmd += ['-i', input_file, '-filter_complex', ';'.join(filters)]
+    stream_map = []
+    for i, v in enumerate(variants):
+        cmd += ['-map', f'[v{i}out]', f'-c:v:{i}', 'h264', f'-b:v:{i}', v['bitrate']]
+        if has_audio:
+            cmd += ['-map', 'a:0', f'-c:a:{i}', 'aac', f'-b:a:{i}', '128k', f'-ac:a:{i}', '2']
+            stream_map.append(f'v:{i},a:{i},name:{v["variant"]}')
+        else:
+            stream_map.append(f'v:{i},name:{v["variant"]}')
+
+    cmd += ['-preset', 'fast'] + keyframe_args(frame_rate)
+    cmd += [
+        '-f', 'hls',
+        '-hls_time', HLS_SEGMENT_SECONDS,
+        '-hls_list_size', '0',
+        '-hls_segment_filename', os.path.join(output_dir, f'{prefix}segment_%v_%03d.ts'),
+    ]
+    if start is not None:
+        cmd += ['-output_ts_offset', f'{start:.3f}']
+    elif write_master:
+        cmd += ['-master_pl_name', MASTER_PLAYLIST_NAME]
+    cmd += [
+        '-var_stream_map', ' '.join(stream_map),
+        os.path.join(output_dir, f'{prefix}variant_%v.m3u8')
+    ]
+    return cmd
+
+
+def render_master_playlist(variants):
+    """
+    Render the master playlist referencing the given variant playlists.
+
+    Args:
+        variants (list): Ladder entries from build_ladder that were encoded.
+
+    Returns:
+        str: The playlist content.
+    """
+
+    lines = ['#EXTM3U']
+    for v in variants:
+        bandwidth = int(v['bitrate'].rstrip('k')) * 1000
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={v["scale"]}')
+        lines.append(f'variant_{v["variant"]}.m3u8')
+    return '\n'.join(lines)
+
+
+def rebase_playlist(content, prefix):
+    """
+    Prefix the relative URIs of a playlist, e.g. to serve it from another directory.
+
+    Args:
+        content (str): The playlist content.
+        prefix (str): Prepended to every URI line, e.g. ``../42/``.
+
+    Returns:
+        str: The playlist content.
+    """
+
+    lines = []
+    for line in content.splitlines():
+        if line and not line.startswith('#') and '://' not in line:
+            line = prefix + line
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def run_ffmpeg(cmd, duration=None, on_progress=None):
+    """
+    Run an ffmpeg command and report its progress while it runs.
+
+    ``-progress pipe:1`` makes ffmpeg print ``key=value`` progress blocks to
+    stdout. Each ``out_time_us`` value is turned into the fraction of
+    ``duration`` already encoded and passed to ``on_progress``. stderr goes
+    to a temporary file so a chatty encoder can never block on a full pipe;
+    its tail is attached to the error if ffmpeg fails.
+
+    Args:
+        cmd (list): The ffmpeg command as built by the build_* helpers.
+        duration (float): Seconds of media the command encodes.
+        on_progress (callable): Called with a fraction between 0 and 1.
+
+    Raises:
+        subprocess.CalledProcessError: If ffmpeg exits with an error.
+    """
+
+    cmd = [cmd[0], '-nostats', '-progress', 'pipe:1'] + list(cmd[1:])
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            if key in ('out_time_us', 'out_time_ms') and duration and on_progress:
+                try:
+                    on_progress(min(1.0, int(value) / 1_000_000 / duration))
+                except ValueError:
+                    pass
+        returncode = process.wait()
+        if returncode:
+            stderr.seek(0)
+            tail = stderr.read()[-2000:].decode(errors='replace')
+            raise subprocess.CalledProcessError(returncode, cmd, stderr=tail)
+
+
+def write_playlist(path, content):
+    """
+    Write a playlist so readers never see a partially written file.
+
+    The content goes to a temporary file in the same directory which then
+    replaces ``path`` with an atomic rename.
+    """
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def plan_publish_groups(ladder, priority, single_pass=True):
+    """
+    Order the renditions of a ladder into groups that are published together.
+
+    The ``priority`` renditions come first so something is playable early.
+    In single-pass mode they share one encode and all other renditions
+    share a second one, so the source is decoded twice in total. In
+    per-variant mode every rendition forms its own group, lowest first, and
+    the master playlist is updated as soon as each one is done.
+
+    Args:
+        ladder (list): Ladder entries from build_ladder.
+        priority (list): Rendition names to publish first.
+        single_pass (bool): Whether the priority renditions share an encode.
+
+    Returns:
+        list: Lists of ladder entries in encoding order.
+    """
+
+    first = [v for v in ladder if v['name'] in priority]
+    rest = [v for v in ladder if v['name'] not in priority]
+    if single_pass:
+        return [group for group in (first, rest) if group]
+    return [[v] for v in first + rest]
+
+
+def chunk_prefix(index):
+    """
+    Return the file name prefix used for the outputs of chunk ``index``.
+    """
+
+    return f'chunk_{index:03d}_'
+
+
+def probe_video(ffprobe, input_file):
+    """
+    Read the properties of a source file that drive the encoding ladder.
+
+    Args:
+        ffprobe (str): Path to the ffprobe binary.
+        input_file (str): Path of the source video.
+
+    Returns:
+        dict: ``width``, ``height``, ``frame_rate`` and ``duration`` of the
+        first video stream plus ``audio_channels`` and ``audio_layout`` of
+        the first audio stream (0 and '' without audio).
+    """
+
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-show_streams', '-show_format', '-of', 'json', input_file],
+        check=True, capture_output=True, text=True,
+    )
+    info = json.loads(result.stdout)
+    streams = info.get('streams', [])
+    video = next(s for s in streams if s.get('codec_type') == 'video')
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+    frame_rate = video.get('avg_frame_rate') or video.get('r_frame_rate') or '0/1'
+    try:
+        frame_rate = float(Fraction(frame_rate))
+    except (ValueError, ZeroDivisionError):
+        frame_rate = 0.0
+    duration = info.get('format', {}).get('duration') or video.get('duration') or 0
+    return {
+        'width': int(video['width']),
+        'height': int(video['height']),
+        'frame_rate': round(frame_rate, 3),
+        'duration': float(duration),
+        'audio_channels': int(audio.get('channels', 0)),
+        'audio_layout': audio.get('channel_layout', ''),
+    }
+
+
+def build_ladder(width, height, table):
+    """
+    Build the rendition ladder for a source of the given resolution.
+
+    Rungs of ``table`` taller than the source are dropped so nothing is
+    upscaled. A source smaller than the lowest rung is encoded once at its
+    own size with the lowest rung's bitrate. Widths follow the source aspect
+    ratio, rounded to even numbers as required by H.264.
+
+    Args:
+        width (int): Source width in pixels.
+        height (int): Source height in pixels.
+        table (list): Rungs as ``{'name', 'height', 'bitrate'}`` dicts, from
+            ``HLS_RENDITION_LADDER``.
+
+    Returns:
+        list: Variant dicts with ``name``, ``scale``, ``bitrate`` and
+        ``variant`` keys, lowest rung first.
+    """
+
+    rungs = sorted(table, key=lambda r: r['height'])
+    selected = [r for r in rungs if r['height'] <= height]
+    if not selected:
+        selected = [dict(rungs[0], height=height - height % 2, name=f'{height - height % 2}p')]
+    ladder = []
+    for index, rung in enumerate(selected):
+        scaled_width = round(rung['height'] * width / height / 2) * 2
+        ladder.append({
+            'name': rung['name'],
+            'scale': f"{scaled_width}x{rung['height']}",
+            'bitrate': rung['bitrate'],
+            'variant': str(index),
+        })
+    return ladder
+
+
+def probe_keyframes(ffprobe, input_file):
+    """
+    Return the timestamps in seconds of all video keyframes of a media file.
+
+    Only packet headers are read, so the source is not decoded.
+    """
+
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', input_file],
+        check=True, capture_output=True, text=True,
+    )
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+
+def plan_chunks(keyframes, duration, chunk_seconds):
+    """
+    Split a video into time ranges that start on keyframes.
+
+    The video is divided into ranges of roughly ``chunk_seconds`` and each
+    boundary is moved to the nearest keyframe, so every chunk can be encoded
+    independently without re-seeking into the middle of a GOP.
+
+    Args:
+        keyframes (list): Sorted keyframe timestamps in seconds.
+        duration (float): Duration of the video in seconds.
+        chunk_seconds (float): Target length of a chunk in seconds.
+
+    Returns:
+        list: ``(start, duration)`` tuples covering the whole video.
+    """
+
+    count = max(1, math.ceil(duration / chunk_seconds))
+    boundaries = [0.0]
+    for i in range(1, count):
+        target = duration * i / count
+        nearest = min(keyframes, key=lambda k: abs(k - target), default=target)
+        if boundaries[-1] < nearest < duration:
+            boundaries.append(nearest)
+    boundaries.append(duration)
+    return [(start, end - start) for start, end in zip(boundaries, boundaries[1:])]
+
+
+def stitch_playlists(playlists):
+    """
+    Join the variant playlists of consecutive chunks into one VOD playlist.
+
+    A discontinuity tag is placed between chunks because each chunk was
+    produced by its own encoder instance.
+
+    Args:
+        playlists (list): Contents of the chunk playlists, in playback order.
+
+    Returns:
+        str: The stitched playlist content.
+    """
+
+    entries = []
+    target = 0
+    for index, content in enumerate(playlists):
+        if index:
+            entries.append('#EXT-X-DISCONTINUITY')
+        for line in content.splitlines():
+            line = line.strip()
+            if line.startswith('#EXTINF:'):
+                target = max(target, math.ceil(float(line[8:].split(',')[0])))
+                entries.append(line)
+            elif line and not line.startswith('#'):
+                entries.append(line)
+    header = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        f'#EXT-X-TARGETDURATION:{target}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+    ]
+    return '\n'.join(header + entries + ['#EXT-X-ENDLIST'])
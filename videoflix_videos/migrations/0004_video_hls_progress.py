@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+def mark_converted_videos_complete(apps, schema_editor):
+    """
+    Videos converted before progressive publishing had their whole ladder
+    done by the time the master playlist was set.
+    """
+
+    Video = apps.get_model('videoflix_videos', 'Video')
+    Video.objects.exclude(hls_master_playlist__isnull=True).exclude(hls_master_playlist='').update(hls_complete=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_videos', '0003_video_source_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='hls_complete',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='hls_renditions',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(mark_converted_videos_complete, migrations.RunPython.noop),
+    ]
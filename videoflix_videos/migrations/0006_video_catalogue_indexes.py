@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_videos', '0005_transcodejob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='video_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['genre', '-uploaded_at', '-id'], name='video_genre_uploaded_idx'),
+        ),
+    ]
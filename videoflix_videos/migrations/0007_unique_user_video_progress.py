@@ -0,0 +1,49 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:14
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_progress(apps, schema_editor):
+    """
+    Keep one progress row per user and video before adding the constraint.
+
+    The most recently viewed row wins; it is marked viewed if any of the
+    duplicates was.
+    """
+
+    UserVideoProgress = apps.get_model('videoflix_videos', 'UserVideoProgress')
+    groups = (
+        UserVideoProgress.objects.values('user_id', 'video_id')
+        .annotate(rows=Count('id')).filter(rows__gt=1)
+    )
+    for group in groups:
+        rows = list(
+            UserVideoProgress.objects.filter(user_id=group['user_id'], video_id=group['video_id'])
+            .order_by('-last_viewed_at', '-id')
+        )
+        keep, duplicates = rows[0], rows[1:]
+        if not keep.viewed and any(row.viewed for row in duplicates):
+            UserVideoProgress.objects.filter(id=keep.id).update(viewed=True)
+        UserVideoProgress.objects.filter(id__in=[row.id for row in duplicates]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_videos', '0006_video_catalogue_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_progress, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='uservideoprogress',
+            constraint=models.UniqueConstraint(fields=('user', 'video'), name='unique_user_video_progress'),
+        ),
+        migrations.AddIndex(
+            model_name='uservideoprogress',
+            index=models.Index(fields=['user', 'video'], include=('last_viewed_position', 'viewed', 'last_viewed_at'), name='progress_user_video_cover_idx'),
+        ),
+    ]
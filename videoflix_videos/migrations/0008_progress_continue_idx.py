@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_videos', '0007_unique_user_video_progress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='uservideoprogress',
+            index=models.Index(fields=['user', 'viewed', '-last_viewed_at'], name='progress_continue_idx'),
+        ),
+    ]
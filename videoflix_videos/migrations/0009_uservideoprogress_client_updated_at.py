@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_videos', '0008_progress_continue_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uservideoprogress',
+            name='client_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_videos', '0010_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['content_hash'], name='video_content_hash_idx'),
+        ),
+    ]
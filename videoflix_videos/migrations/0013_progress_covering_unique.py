@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-18 18:57
+
+import videoflix_videos.models
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videoflix_videos', '0012_video_artwork'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='uservideoprogress',
+            name='unique_user_video_progress',
+        ),
+        migrations.RemoveIndex(
+            model_name='uservideoprogress',
+            name='progress_user_video_cover_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='uservideoprogress',
+            constraint=videoflix_videos.models.CoveringUniqueConstraint(fields=('user', 'video'), include=('last_viewed_position', 'viewed', 'last_viewed_at'), name='unique_user_video_progress'),
+        ),
+    ]
@@ -1,15 +1,77 @@
 from django.db import models
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils.timezone import now
+from videoflix_videos.hls import build_ladder
+import uuid
+
+
+class CoveringUniqueConstraint(models.UniqueConstraint):
+    """
+    A unique constraint whose index also stores the ``include`` columns.
+
+    Django skips a unique constraint with ``include`` entirely on backends
+    without covering indexes (SQLite), which would also drop the uniqueness
+    the ``ON CONFLICT`` upserts rely on. There the plain constraint is
+    created instead.
+    """
+
+    def for_backend(self, schema_editor):
+        if self.include and not schema_editor.connection.features.supports_covering_indexes:
+            return models.UniqueConstraint(fields=self.fields, name=self.name)
+        return self
+
+    def constraint_sql(self, model, schema_editor):
+        constraint = self.for_backend(schema_editor)
+        if constraint is self:
+            return super().constraint_sql(model, schema_editor)
+        return constraint.constraint_sql(model, schema_editor)
+
+    def create_sql(self, model, schema_editor):
+        constraint = self.for_backend(schema_editor)
+        if constraint is self:
+            return super().create_sql(model, schema_editor)
+        return constraint.create_sql(model, schema_editor)
+
+    def remove_sql(self, model, schema_editor):
+        constraint = self.for_backend(schema_editor)
+        if constraint is self:
+            return super().remove_sql(model, schema_editor)
+        return constraint.remove_sql(model, schema_editor)
 
 
 class Video(models.Model):
     title = models.CharField(max_length=255)
     file = models.FileField(upload_to='videos/originals/') 
-    thumbnail = models.FileField(upload_to='thumbnails/')  
+    thumbnail = models.FileField(upload_to='thumbnails/', blank=True)
     description = models.TextField(blank=True)
     hls_master_playlist = models.FileField(upload_to='videos/hls/', blank=True, null=True)
+    hls_renditions = models.JSONField(default=list, blank=True)
+    hls_complete = models.BooleanField(default=False)
     genre = models.CharField(max_length=50, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    frame_rate = models.FloatField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    audio_channels = models.PositiveSmallIntegerField(null=True, blank=True)
+    audio_layout = models.CharField(max_length=50, blank=True)
+    # SHA-256 of the original in hex; identical uploads share one original
+    # and its HLS output, see start_transcode.
+    content_hash = models.CharField(max_length=64, blank=True)
+    # Generated artwork, see generate_artwork: storage names of the poster
+    # thumbnails by size and format, e.g. {'card': {'jpeg': ..., 'webp': ...}},
+    # and the WebVTT index of the seek-preview sprites.
+    thumbnails = models.JSONField(default=dict, blank=True)
+    poster_time = models.FloatField(null=True, blank=True)
+    preview_sprites = models.FileField(upload_to='thumbnails/', blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-uploaded_at', '-id'], name='video_uploaded_idx'),
+            models.Index(fields=['genre', '-uploaded_at', '-id'], name='video_genre_uploaded_idx'),
+            models.Index(fields=['content_hash'], name='video_content_hash_idx'),
+        ]
 
     def __str__(self):
         """
@@ -18,6 +80,16 @@ class Video(models.Model):
 
         return self.title
 
+    def rendition_ladder(self):
+        """
+        Return the HLS renditions to encode for this video.
+
+        The ladder is derived from the probed source resolution and the
+        HLS_RENDITION_LADDER setting, so no rendition exceeds the source.
+        """
+
+        return build_ladder(self.width, self.height, settings.HLS_RENDITION_LADDER)
+
 
 class UserVideoProgress(models.Model):
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='video_progress')
@@ -25,6 +97,22 @@ class UserVideoProgress(models.Model):
     last_viewed_position = models.FloatField(default=0.0) 
     viewed = models.BooleanField(default=False)
     last_viewed_at = models.DateTimeField(auto_now=True)
+    # Client timestamp of the newest applied update, see ProgressSyncView.
+    client_updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Covers the progress columns, so per-user lookups are index-only scans.
+            CoveringUniqueConstraint(
+                fields=['user', 'video'],
+                include=['last_viewed_position', 'viewed', 'last_viewed_at'],
+                name='unique_user_video_progress',
+            ),
+        ]
+        indexes = [
+            # Serves the continue watching list of a user, most recent first.
+            models.Index(fields=['user', 'viewed', '-last_viewed_at'], name='progress_continue_idx'),
+        ]
 
     def __str__(self):
         """
@@ -35,3 +123,153 @@ class UserVideoProgress(models.Model):
         return f"{self.user.username} - {self.video.title}"
 
 
+class TranscodeJob(models.Model):
+    QUEUED = 'queued'
+    PROBING = 'probing'
+    ENCODING = 'encoding'
+    PACKAGING = 'packaging'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATE_CHOICES = [
+        (QUEUED, 'Queued'),
+        (PROBING, 'Probing'),
+        (ENCODING, 'Encoding'),
+        (PACKAGING, 'Packaging'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE_STATES = [QUEUED, PROBING, ENCODING, PACKAGING]
+    TRANSITIONS = {
+        QUEUED: [PROBING, FAILED],
+        PROBING: [ENCODING, QUEUED, FAILED],
+        ENCODING: [PACKAGING, QUEUED, FAILED],
+        PACKAGING: [DONE, QUEUED, FAILED],
+        DONE: [],
+        FAILED: [],
+    }
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='transcode_jobs')
+    dedupe_key = models.CharField(max_length=100)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default=QUEUED)
+    progress = models.FloatField(default=0.0)
+    renditions = models.JSONField(default=dict, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    task_id = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=models.Q(state__in=['queued', 'probing', 'encoding', 'packaging']),
+                name='unique_active_transcode_job',
+            ),
+        ]
+
+    def __str__(self):
+        """
+        Returns a string representation of the TranscodeJob instance,
+        which includes the title of the video and the current state.
+        """
+
+        return f"{self.video.title} - {self.state}"
+
+    @property
+    def is_active(self):
+        """
+        Return True while the job is queued or being processed.
+        """
+
+        return self.state in self.ACTIVE_STATES
+
+    def transition(self, state, **fields):
+        """
+        Move the job to a new state and save it.
+
+        Args:
+            state (str): The target state, which must be reachable from the
+                current one according to TRANSITIONS.
+            **fields: Further field values to store with the state change.
+
+        Raises:
+            ValueError: If the transition is not allowed.
+        """
+
+        if state not in self.TRANSITIONS[self.state]:
+            raise ValueError(f"Cannot move transcode job from {self.state} to {state}")
+        self.state = state
+        for name, value in fields.items():
+            setattr(self, name, value)
+        if state in (self.DONE, self.FAILED):
+            self.finished_at = now()
+        self.save()
+
+    def set_rendition_status(self, names, status):
+        """
+        Record the status of one or more renditions and save it.
+        """
+
+        for name in names:
+            self.renditions[name] = status
+        self.save(update_fields=['renditions', 'updated_at'])
+
+    def report_progress(self, percent):
+        """
+        Store the overall progress in percent.
+
+        Progress is only written when it moved by at least one percentage
+        point, so frequent ffmpeg progress reports do not turn into a write
+        per report.
+        """
+
+        percent = round(min(percent, 100.0), 1)
+        if percent - self.progress >= 1 or percent == 100.0:
+            self.progress = percent
+            self.save(update_fields=['progress', 'updated_at'])
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload of an original video, see videoflix_videos.uploads.
+
+    The file is written in chunks straight to ``path`` below MEDIA_ROOT;
+    ``offset`` is the number of bytes received so far. Finalizing the
+    complete upload creates the Video, which starts its transcode.
+    """
+
+    UPLOADING = 'uploading'
+    COMPLETE = 'complete'
+    STATE_CHOICES = [
+        (UPLOADING, 'Uploading'),
+        (COMPLETE, 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    path = models.CharField(max_length=500)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # SHA-256 of the whole file as announced by the client, and as received.
+    expected_sha256 = models.CharField(max_length=64, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default=UPLOADING)
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    genre = models.CharField(max_length=50, blank=True)
+    video = models.OneToOneField(Video, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['state', 'updated_at'], name='uploadsession_stale_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} - {self.offset}/{self.size}"
+
@@ -0,0 +1,366 @@
+"""
+Recording of playback progress heartbeats.
+
+By default every heartbeat is one ``INSERT ... ON CONFLICT DO UPDATE`` on the
+unique (user, video) pair, see upsert_progress. With ``PROGRESS_WRITE_BEHIND``
+enabled, progress updates are written to a Redis hash per (user, video)
+instead of the database, and the pair is added to a set of dirty entries.
+The ``flush_progress_buffer`` task periodically moves the dirty entries to
+Postgres in bulk. Reads merge the buffered values over the database rows, so
+users always see their own latest writes.
+
+The hashes outlive the flush for ``PROGRESS_BUFFER_TTL`` seconds and keep
+serving reads; a heartbeat arriving during a flush simply marks the entry
+dirty again. A buffered heartbeat counts as a client update at the time it
+arrived, so neither the flush nor sync_progress replaces newer progress.
+"""
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+from django_redis import get_redis_connection
+from django.contrib.auth.models import User
+from videoflix_videos.models import Video, UserVideoProgress
+import logging
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = 'progress:buffer:{}:{}'
+DIRTY_KEY = 'progress:dirty'
+BUFFERED_FIELDS = ['last_viewed_position', 'viewed', 'last_viewed_at']
+WRITTEN_FIELDS = BUFFERED_FIELDS + ['client_updated_at']
+
+
+def redis():
+    return get_redis_connection('default')
+
+
+def encode(values):
+    """
+    Convert progress field values to strings for a Redis hash.
+    """
+
+    encoded = {}
+    for name, value in values.items():
+        if name == 'viewed':
+            encoded[name] = '1' if value else '0'
+        elif name == 'last_viewed_at':
+            encoded[name] = value.isoformat()
+        else:
+            encoded[name] = str(value)
+    return encoded
+
+
+def decode(raw):
+    """
+    Convert a Redis hash back to progress field values.
+    """
+
+    values = {}
+    for name, value in raw.items():
+        name, value = name.decode(), value.decode()
+        if name == 'viewed':
+            values[name] = value == '1'
+        elif name == 'last_viewed_at':
+            values[name] = parse_datetime(value)
+        elif name == 'last_viewed_position':
+            values[name] = float(value)
+    return values
+
+
+def db_values(values):
+    """
+    Return the values of WRITTEN_FIELDS prepared for a raw SQL query.
+    """
+
+    fields = {field.name: field for field in UserVideoProgress._meta.fields}
+    return [fields[name].get_db_prep_value(values[name], connection) for name in WRITTEN_FIELDS]
+
+
+def buffer_progress(user_id, video_id, values):
+    """
+    Store a progress update in Redis and mark it for flushing.
+
+    Args:
+        user_id (int): The user who is watching.
+        video_id (int): The video being watched.
+        values (dict): The validated fields to update, a subset of
+            ``last_viewed_position`` and ``viewed``.
+
+    Returns:
+        dict: The buffered progress of the pair after the update.
+    """
+
+    key = BUFFER_KEY.format(user_id, video_id)
+    values = {**values, 'last_viewed_at': now()}
+    pipe = redis().pipeline()
+    pipe.hset(key, mapping=encode(values))
+    pipe.expire(key, settings.PROGRESS_BUFFER_TTL)
+    pipe.sadd(DIRTY_KEY, f'{user_id}:{video_id}')
+    pipe.hgetall(key)
+    return decode(pipe.execute()[-1])
+
+
+def get_buffered_progress(user_id, video_ids):
+    """
+    Return the buffered progress of a user for several videos.
+
+    Args:
+        user_id (int): The user.
+        video_ids (list): The videos to look up.
+
+    Returns:
+        dict: Buffered field values by video ID, only for videos that have any.
+    """
+
+    pipe = redis().pipeline()
+    for video_id in video_ids:
+        pipe.hgetall(BUFFER_KEY.format(user_id, video_id))
+    return {video_id: decode(raw) for video_id, raw in zip(video_ids, pipe.execute()) if raw}
+
+
+def flush_progress(batch_size=None):
+    """
+    Write a batch of dirty buffered progress entries to the database.
+
+    The entries are upserted in bulk, see write_progress. If the database
+    write fails the entries are marked dirty again, so nothing is lost.
+
+    Args:
+        batch_size (int): The number of entries to flush, defaults to
+            ``PROGRESS_FLUSH_BATCH_SIZE``.
+
+    Returns:
+        int: The number of entries written.
+    """
+
+    conn = redis()
+    members = conn.spop(DIRTY_KEY, batch_size or settings.PROGRESS_FLUSH_BATCH_SIZE)
+    if not members:
+        return 0
+    pairs = [tuple(int(part) for part in member.decode().split(':')) for member in members]
+    pipe = conn.pipeline()
+    for user_id, video_id in pairs:
+        pipe.hgetall(BUFFER_KEY.format(user_id, video_id))
+    buffered = {pair: decode(raw) for pair, raw in zip(pairs, pipe.execute()) if raw}
+    try:
+        write_progress(buffered)
+    except Exception:
+        conn.sadd(DIRTY_KEY, *members)
+        raise
+    return len(buffered)
+
+
+def write_progress(buffered):
+    """
+    Apply buffered progress values to the database in bulk.
+
+    Entries are upserted with one statement per set of buffered fields, so a
+    field that was never sent does not overwrite the stored value. The
+    statement is raw SQL like upsert_progress, so ``last_viewed_at`` keeps
+    the time of the heartbeat instead of the time of the flush. Rows whose
+    ``client_updated_at`` is newer, written by sync_progress after the
+    heartbeat, are kept. Entries of users or videos deleted in the meantime
+    are dropped. The progress version of every written user is bumped,
+    which drops their cached continue watching list.
+
+    Args:
+        buffered (dict): Field values by (user_id, video_id).
+    """
+
+    groups = {}
+    for pair, values in buffered.items():
+        groups.setdefault(tuple(sorted(values)) + ('client_updated_at',), []).append((pair, values))
+    table = connection.ops.quote_name(UserVideoProgress._meta.db_table)
+    users = connection.ops.quote_name(User._meta.db_table)
+    videos = connection.ops.quote_name(Video._meta.db_table)
+    written = set()
+    with transaction.atomic(), connection.cursor() as cursor:
+        for fields, entries in groups.items():
+            rows, params = [], []
+            for (user_id, video_id), values in entries:
+                rows.append('(%s, %s, %s, %s, %s, %s)')
+                params += [user_id, video_id] + db_values({
+                    'last_viewed_position': 0.0, 'viewed': False, **values,
+                    'client_updated_at': values['last_viewed_at'],
+                })
+            cursor.execute(
+                f"INSERT INTO {table} (user_id, video_id, {', '.join(WRITTEN_FIELDS)}) "
+                f"SELECT u.id, v.id, e.column3, e.column4, e.column5, e.column6 "
+                f"FROM (VALUES {', '.join(rows)}) e "
+                f"JOIN {users} u ON u.id = e.column1 JOIN {videos} v ON v.id = e.column2 WHERE true "
+                f"ON CONFLICT (user_id, video_id) DO UPDATE SET "
+                f"{', '.join(f'{name} = EXCLUDED.{name}' for name in fields)} "
+                f"WHERE {table}.client_updated_at IS NULL OR {table}.client_updated_at < EXCLUDED.client_updated_at "
+                f"RETURNING user_id",
+                params,
+            )
+            written.update(user_id for user_id, in cursor.fetchall())
+    from videoflix_videos.cache import bump_progress_version
+
+    for user_id in written:
+        bump_progress_version(user_id)
+
+
+def upsert_progress(user_id, video_id, values):
+    """
+    Create or update the progress of a user for a video in one statement.
+
+    The row is written with ``INSERT ... ON CONFLICT DO UPDATE`` on the
+    unique (user, video) pair, so concurrent heartbeats from several tabs
+    neither race nor create duplicates. Fields missing from values keep
+    their stored value, or get their default on insert. Selecting the video
+    in the INSERT makes a missing video insert nothing instead of failing.
+
+    Args:
+        user_id (int): The user who is watching.
+        video_id (int): The video being watched.
+        values (dict): The validated fields to update, a subset of
+            ``last_viewed_position`` and ``viewed``.
+
+    The write counts as the latest client update, see sync_progress.
+
+    Returns:
+        UserVideoProgress: The stored progress, or None if the video does not exist.
+    """
+
+    timestamp = now()
+    updated = [name for name in ('last_viewed_position', 'viewed') if name in values]
+    updated += ['last_viewed_at', 'client_updated_at']
+    values = {
+        'last_viewed_position': 0.0, 'viewed': False, **values,
+        'last_viewed_at': timestamp, 'client_updated_at': timestamp,
+    }
+    table = connection.ops.quote_name(UserVideoProgress._meta.db_table)
+    videos = connection.ops.quote_name(Video._meta.db_table)
+    sql = (
+        f"INSERT INTO {table} (user_id, video_id, {', '.join(WRITTEN_FIELDS)}) "
+        f"SELECT %s, v.id, %s, %s, %s, %s FROM {videos} v WHERE v.id = %s "
+        f"ON CONFLICT (user_id, video_id) DO UPDATE SET "
+        f"{', '.join(f'{name} = EXCLUDED.{name}' for name in updated)} "
+        f"RETURNING id, last_viewed_position, viewed"
+    )
+    params = [user_id] + db_values(values) + [video_id]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    pk, position, viewed = row
+    return UserVideoProgress(
+        id=pk, user_id=user_id, video_id=video_id, last_viewed_position=position,
+        viewed=bool(viewed), last_viewed_at=values['last_viewed_at'],
+    )
+
+
+def record_progress(user, video_id, values):
+    """
+    Store a progress heartbeat of a user, directly or in the write-behind buffer.
+
+    Args:
+        user (User): The user who is watching.
+        video_id (int): The video being watched.
+        values (dict): The validated fields to update.
+
+    Returns:
+        UserVideoProgress: The progress after the update, or None if the
+        video does not exist.
+    """
+
+    from videoflix_videos.cache import bump_progress_version
+
+    if not settings.PROGRESS_WRITE_BEHIND:
+        progress = upsert_progress(user.id, video_id, values)
+    elif Video.objects.filter(id=video_id).exists():
+        buffered = buffer_progress(user.id, video_id, values)
+        progress = UserVideoProgress(user=user, video_id=video_id)
+        if not set(BUFFERED_FIELDS) <= set(buffered):
+            progress = UserVideoProgress.objects.filter(user=user, video_id=video_id).first() or progress
+        for name, value in buffered.items():
+            setattr(progress, name, value)
+    else:
+        progress = None
+    if progress is not None:
+        bump_progress_version(user.id)
+    return progress
+
+
+def sync_progress(user_id, events):
+    """
+    Apply a batch of queued progress events of a user in one statement.
+
+    Every event is upserted unless the stored progress already carries a
+    newer client timestamp, so replaying old events never overwrites more
+    recent progress from another device. Events must have distinct videos.
+
+    In write-behind mode buffered heartbeats are compared as well: an event
+    older than the buffered heartbeat of its video is stale, and a newer one
+    drops the buffered values, which would otherwise shadow it on reads.
+
+    Args:
+        user_id (int): The user whose events to apply.
+        events (list): Dicts with ``video_id``, ``position``, ``viewed`` and
+            ``client_ts``.
+
+    Returns:
+        dict: A ``(status, progress)`` tuple by video ID, where status is
+        ``'applied'``, ``'stale'`` if newer progress was kept, or
+        ``'not_found'`` if the video does not exist.
+    """
+
+    if not events:
+        return {}
+    buffered = {}
+    if settings.PROGRESS_WRITE_BEHIND:
+        buffered = get_buffered_progress(user_id, [event['video_id'] for event in events])
+    superseded = {
+        event['video_id'] for event in events
+        if event['video_id'] in buffered and event['client_ts'] <= buffered[event['video_id']]['last_viewed_at']
+    }
+    events = [event for event in events if event['video_id'] not in superseded]
+    timestamp = now()
+    table = connection.ops.quote_name(UserVideoProgress._meta.db_table)
+    videos = connection.ops.quote_name(Video._meta.db_table)
+    rows, params = [], [user_id]
+    for event in events:
+        rows.append('(%s, %s, %s, %s, %s)')
+        params += [event['video_id']] + db_values({
+            'last_viewed_position': event['position'], 'viewed': event['viewed'],
+            'last_viewed_at': timestamp, 'client_updated_at': event['client_ts'],
+        })
+    # SQLite needs the WHERE to tell ON CONFLICT apart from a join constraint.
+    sql = (
+        f"INSERT INTO {table} (user_id, video_id, {', '.join(WRITTEN_FIELDS)}) "
+        f"SELECT %s, v.id, e.column2, e.column3, e.column4, e.column5 "
+        f"FROM (VALUES {', '.join(rows)}) e JOIN {videos} v ON v.id = e.column1 WHERE true "
+        f"ON CONFLICT (user_id, video_id) DO UPDATE SET "
+        f"{', '.join(f'{name} = EXCLUDED.{name}' for name in WRITTEN_FIELDS)} "
+        f"WHERE {table}.client_updated_at IS NULL OR {table}.client_updated_at < EXCLUDED.client_updated_at "
+        f"RETURNING id, video_id, last_viewed_position, viewed"
+    )
+    results = {}
+    with transaction.atomic():
+        if events:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                for pk, video_id, position, viewed in cursor.fetchall():
+                    results[video_id] = ('applied', UserVideoProgress(
+                        id=pk, user_id=user_id, video_id=video_id, last_viewed_position=position,
+                        viewed=bool(viewed), last_viewed_at=timestamp,
+                    ))
+        skipped = [event['video_id'] for event in events if event['video_id'] not in results]
+        skipped += superseded
+        if skipped:
+            for progress in UserVideoProgress.objects.filter(user_id=user_id, video_id__in=skipped):
+                results[progress.video_id] = ('stale', progress)
+    for video_id in superseded:
+        _, progress = results.get(video_id) or (None, UserVideoProgress(user_id=user_id, video_id=video_id))
+        for name, value in buffered[video_id].items():
+            setattr(progress, name, value)
+        results[video_id] = ('stale', progress)
+    dropped = [video_id for video_id in buffered if results.get(video_id, (None,))[0] == 'applied']
+    if dropped:
+        redis().delete(*(BUFFER_KEY.format(user_id, video_id) for video_id in dropped))
+    for video_id in skipped:
+        results.setdefault(video_id, ('not_found', None))
+    return results
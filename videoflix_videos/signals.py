@@ -1,13 +1,17 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Video
-from .tasks import convert_to_hls
+from .models import Video, TranscodeJob, UserVideoProgress
+from .tasks import start_transcode
+from .cache import bump_catalogue_version, bump_progress_version
 
 @receiver(post_save, sender=Video)
 def trigger_hls_conversion(sender, instance, created, **kwargs):
     """
     Signal receiver that triggers HLS conversion for a video when it is created.
 
+    This is the only place uploads are queued for conversion; the transcode
+    job created here deduplicates further requests for the same video.
+
     Args:
         sender (Model): The model class that sent the signal.
         instance (Video): The actual instance being saved.
@@ -16,4 +20,37 @@ def trigger_hls_conversion(sender, instance, created, **kwargs):
     """
 
     if created:
-        convert_to_hls.delay(instance.id)
\ No newline at end of file
+        start_transcode(instance)
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def invalidate_catalogue_on_video_change(sender, instance, **kwargs):
+    """
+    Invalidate the cached catalogue when a video is saved or deleted.
+
+    Publishing renditions saves the video as well, so players see new
+    renditions as soon as they are listed in the master playlist.
+    """
+
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=TranscodeJob)
+def invalidate_catalogue_on_transcode_done(sender, instance, **kwargs):
+    """
+    Invalidate the cached catalogue when a transcode job finishes.
+    """
+
+    if instance.state == TranscodeJob.DONE:
+        bump_catalogue_version()
+
+
+@receiver(post_save, sender=UserVideoProgress)
+@receiver(post_delete, sender=UserVideoProgress)
+def invalidate_progress_etags(sender, instance, **kwargs):
+    """
+    Change the ETags of the catalogue responses of a user whose progress changed.
+    """
+
+    bump_progress_version(instance.user_id)
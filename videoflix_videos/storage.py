@@ -0,0 +1,280 @@
+"""
+Originals and HLS output through Django's storage API.
+
+ffmpeg needs local files, so the pipeline keeps two places apart: the
+storage (``default_storage``) that holds originals and HLS output for the
+web nodes, and the worker's local disk where encodes run.
+
+With a local storage such as the default FileSystemStorage, ffmpeg reads
+the original in place and writes its output straight into the storage
+directory below MEDIA_ROOT. With an object storage such as S3 or MinIO
+through django-storages, the original is downloaded to ``HLS_WORK_DIR``,
+ffmpeg writes into a scratch directory there, and a SegmentUploader copies
+every finished segment to the storage with a thread pool while ffmpeg is
+still encoding. Playlists are saved only after their segments, so players
+never get a playlist listing a segment that is not stored yet.
+
+Work that reads only part of the original, or reads it once, does not
+download it: ffprobe, the chunk encodes and the artwork renders read the
+(signed) URL of the object, and ffmpeg fetches the byte ranges it seeks to.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from videoflix_videos.hls import MASTER_PLAYLIST_NAME, write_playlist
+import os
+import shutil
+import tempfile
+import threading
+import logging
+logger = logging.getLogger(__name__)
+
+
+def hls_dir(video_id):
+    """
+    Return the storage name of the directory holding the HLS output of a video.
+    """
+
+    return f'videos/hls/{video_id}'
+
+
+def is_local(storage=None):
+    """
+    Return True if the storage keeps its files on the local file system.
+    """
+
+    return isinstance(storage or default_storage, FileSystemStorage)
+
+
+@contextmanager
+def local_original(video):
+    """
+    Provide a local path of the original of a video.
+
+    The original is used in place on a local storage. Otherwise it is
+    downloaded to HLS_WORK_DIR for the duration of the block.
+
+    Yields:
+        str: The path of the original.
+    """
+
+    storage = video.file.storage
+    if is_local(storage):
+        yield video.file.path
+        return
+    suffix = os.path.splitext(video.file.name)[1]
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix=f'original_{video.id}_', dir=settings.HLS_WORK_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as local, storage.open(video.file.name, 'rb') as remote:
+            shutil.copyfileobj(remote, local, 1024 * 1024)
+        logger.info(f"Downloaded the original of video ID {video.id} to {path}")
+        yield path
+    finally:
+        os.remove(path)
+
+
+def original_input(video):
+    """
+    Return the path or URL ffmpeg reads the original of a video from without downloading it.
+
+    On a local storage this is the path of the file. Otherwise it is the
+    storage URL, which must be absolute and reachable from the workers, as
+    S3Storage's signed URLs are; ffmpeg seeks in it with range requests.
+    """
+
+    storage = video.file.storage
+    if is_local(storage):
+        return video.file.path
+    return storage.url(video.file.name)
+
+
+def clear_name(storage, name):
+    """
+    Make room for a new file under name.
+
+    Storages that overwrite by themselves, like S3Storage, are left alone;
+    the others would store the new file under a different name.
+    """
+
+    if not getattr(storage, 'file_overwrite', False) and storage.exists(name):
+        storage.delete(name)
+
+
+def save_file(storage, name, path):
+    """
+    Store a local file under name, replacing an existing file.
+    """
+
+    clear_name(storage, name)
+    with open(path, 'rb') as f:
+        storage.save(name, File(f))
+
+
+def save_text(storage, name, content):
+    """
+    Store a playlist under name, replacing an existing one.
+
+    On a local storage the file is replaced atomically, see write_playlist;
+    object stores replace objects atomically by themselves.
+    """
+
+    if is_local(storage):
+        path = storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_playlist(path, content)
+        return
+    clear_name(storage, name)
+    storage.save(name, ContentFile(content.encode()))
+
+
+def read_text(storage, name):
+    with storage.open(name, 'rb') as f:
+        return f.read().decode()
+
+
+def playlist_uris(content):
+    """
+    Return the URIs listed in a playlist.
+
+    The last line is skipped while it is not terminated, since the playlist
+    may be read while ffmpeg is rewriting it.
+    """
+
+    lines = content.split('\n')
+    if not content.endswith('\n'):
+        lines = lines[:-1]
+    return [line.strip() for line in lines if line.strip() and not line.startswith('#')]
+
+
+class SegmentUploader:
+    """
+    Copy HLS segments from a local directory to the storage while they are produced.
+
+    A watcher thread rereads the variant playlists in the directory every
+    HLS_UPLOAD_POLL_INTERVAL seconds. ffmpeg adds a segment to its playlist
+    once the segment is complete, so every newly listed segment is handed to
+    a pool of HLS_UPLOAD_WORKERS threads, stored and then deleted locally.
+
+    Args:
+        storage (Storage): The storage receiving the segments.
+        local_dir (str): The directory ffmpeg writes to.
+        name (str): The storage directory of the output.
+    """
+
+    def __init__(self, storage, local_dir, name):
+        self.storage = storage
+        self.local_dir = local_dir
+        self.name = name
+        self.futures = {}
+        self.playlists = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=settings.HLS_UPLOAD_WORKERS, thread_name_prefix='hls-upload')
+        self.watcher = threading.Thread(target=self.watch, daemon=True)
+
+    def start(self):
+        self.watcher.start()
+
+    def watch(self):
+        while not self.stopped.wait(settings.HLS_UPLOAD_POLL_INTERVAL):
+            try:
+                self.scan()
+            except Exception as e:
+                logger.warning(f"Scanning {self.local_dir} for segments failed: {e}")
+
+    def scan(self):
+        """
+        Queue the upload of every listed segment that was not queued yet.
+        """
+
+        for filename in sorted(os.listdir(self.local_dir)):
+            if not filename.endswith('.m3u8') or filename == MASTER_PLAYLIST_NAME:
+                continue
+            try:
+                with open(os.path.join(self.local_dir, filename)) as f:
+                    uris = playlist_uris(f.read())
+            except FileNotFoundError:
+                continue
+            with self.lock:
+                for uri in uris:
+                    if uri not in self.futures:
+                        self.futures[uri] = self.executor.submit(self.upload_segment, uri)
+
+    def upload_segment(self, filename):
+        path = os.path.join(self.local_dir, filename)
+        save_file(self.storage, f'{self.name}/{filename}', path)
+        os.remove(path)
+
+    def flush(self):
+        """
+        Store all segments and then the playlists changed since the last flush.
+
+        Raises:
+            Exception: The first error of a failed segment upload.
+        """
+
+        self.scan()
+        with self.lock:
+            futures = list(self.futures.values())
+        wait(futures)
+        for future in futures:
+            future.result()
+        for filename in sorted(os.listdir(self.local_dir)):
+            if not filename.endswith('.m3u8'):
+                continue
+            path = os.path.join(self.local_dir, filename)
+            modified = os.stat(path).st_mtime_ns
+            if self.playlists.get(filename) != modified:
+                save_file(self.storage, f'{self.name}/{filename}', path)
+                self.playlists[filename] = modified
+        logger.info(f"Stored {len(futures)} segments in {self.name}")
+
+    def stop(self):
+        self.stopped.set()
+        if self.watcher.is_alive():
+            self.watcher.join()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class HlsOutput:
+    """
+    The place an encode writes the HLS output of a video to.
+
+    Used as a context manager around the ffmpeg runs. ``dir`` is the local
+    directory to pass to ffmpeg; ``sync`` makes everything written there so
+    far available in the storage and must be called before a playlist
+    referencing it is published.
+
+    Args:
+        video_id (int): The video being encoded.
+        storage (Storage): The target storage, default_storage if omitted.
+    """
+
+    def __init__(self, video_id, storage=None):
+        self.storage = storage or default_storage
+        self.name = hls_dir(video_id)
+        self.uploader = None
+        self.dir = None
+
+    def __enter__(self):
+        if is_local(self.storage):
+            self.dir = self.storage.path(self.name)
+            os.makedirs(self.dir, exist_ok=True)
+        else:
+            self.dir = tempfile.mkdtemp(prefix=f'hls_{self.name.rsplit("/", 1)[-1]}_', dir=settings.HLS_WORK_DIR)
+            self.uploader = SegmentUploader(self.storage, self.dir, self.name)
+            self.uploader.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.uploader is not None:
+            self.uploader.stop()
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+    def sync(self):
+        if self.uploader is not None:
+            self.uploader.flush()
@@ -1,21 +1,351 @@
-from celery import shared_task
-import subprocess
-from videoflix_videos.models import Video
+from celery import shared_task, chord, group
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+from datetime import timedelta
+from videoflix_videos.models import Video, TranscodeJob, UploadSession
+from videoflix_videos.hls import (
+    MASTER_PLAYLIST_NAME, build_variant_command, build_single_pass_command,
+    render_master_playlist, rebase_playlist, plan_publish_groups, chunk_prefix,
+    probe_video, probe_keyframes, plan_chunks, stitch_playlists, run_ffmpeg,
+)
+from videoflix_videos.progress import flush_progress
+from videoflix_videos.uploads import abort_upload
+from videoflix_videos.storage import (
+    HlsOutput, hls_dir, local_original, original_input, read_text, save_file, save_text,
+)
+from videoflix_videos.artwork import (
+    SPRITE_VTT_NAME, build_sprite_command, build_thumbnail_command, detect_scenes, pick_poster_time,
+    render_sprite_vtt, scene_scan_window, sprite_layout, thumbnail_name,
+)
 import os
+import tempfile
 import time
 import logging
 logger = logging.getLogger(__name__)
 
-@shared_task
-def convert_to_hls(video_id):
+# Share of the job progress covered by encoding; the rest is packaging.
+ENCODING_PROGRESS_SHARE = 95.0
+
+SOURCE_METADATA_FIELDS = ['width', 'height', 'frame_rate', 'duration', 'audio_channels', 'audio_layout']
+ARTWORK_FIELDS = ['thumbnails', 'poster_time', 'preview_sprites']
+
+
+def probe_source(video, input_file):
+    """
+    Probe the original of a video with ffprobe and store its metadata.
+
+    Args:
+        video (Video): The video whose original is probed.
+        input_file (str): Path or URL of the original, see original_input.
+    """
+
+    metadata = probe_video(settings.FFPROBE_BINARY, input_file)
+    for field in SOURCE_METADATA_FIELDS:
+        setattr(video, field, metadata[field])
+    video.save(update_fields=SOURCE_METADATA_FIELDS)
+
+
+def transcode_dedupe_key(video):
+    """
+    Return the key identifying transcodes of the same video output.
+    """
+
+    return f'hls:{video.id}'
+
+
+def find_duplicate(video):
+    """
+    Return an earlier video with the same original, or None.
+
+    Videos whose HLS output is complete are preferred, so their output can
+    be reused.
+    """
+
+    if not video.content_hash:
+        return None
+    return (Video.objects.filter(content_hash=video.content_hash).exclude(id=video.id)
+            .order_by('-hls_complete', 'id').first())
+
+
+def share_original(video, source):
+    """
+    Point a video at the stored original of an identical video and delete its own copy.
+    """
+
+    if video.file.name == source.file.name:
+        return
+    duplicate = video.file.name
+    video.file.name = source.file.name
+    video.save(update_fields=['file'])
+    video.file.storage.delete(duplicate)
+    logger.info(f"Video ID {video.id} shares the original of video ID {source.id}")
+
+
+def reuse_hls_output(video, source):
+    """
+    Publish the complete HLS output of an identical video for a video.
+
+    The video gets its own master playlist whose URIs point into the output
+    directory of the source, so player URLs keep the usual layout while the
+    renditions are stored once. Generated artwork is shared the same way. A
+    finished transcode job records the reuse.
+
+    Args:
+        video (Video): The new video.
+        source (Video): The earlier video with the same original.
+
+    Returns:
+        TranscodeJob: The finished job of the video.
+    """
+
+    master = read_text(default_storage, f"{hls_dir(source.id)}/{MASTER_PLAYLIST_NAME}")
+    save_text(default_storage, f"{hls_dir(video.id)}/{MASTER_PLAYLIST_NAME}", rebase_playlist(master, f'../{source.id}/'))
+    reused = SOURCE_METADATA_FIELDS + ARTWORK_FIELDS if source.thumbnails else SOURCE_METADATA_FIELDS
+    for field in reused:
+        setattr(video, field, getattr(source, field))
+    video.hls_master_playlist = f"videos/hls/{video.id}/{MASTER_PLAYLIST_NAME}"
+    video.hls_renditions = source.hls_renditions
+    video.hls_complete = True
+    video.save(update_fields=reused + ['hls_master_playlist', 'hls_renditions', 'hls_complete'])
+    logger.info(f"Video ID {video.id} reuses the HLS output of video ID {source.id}")
+    return TranscodeJob.objects.create(
+        video=video, dedupe_key=transcode_dedupe_key(video), state=TranscodeJob.DONE, progress=100.0,
+        renditions={name: 'done' for name in source.hls_renditions}, finished_at=now(),
+    )
+
+
+def start_transcode(video):
+    """
+    Create the transcode job of a video and queue its conversion.
+
+    The conversion is queued when the current transaction commits, see
+    queue_transcode, together with the artwork, see queue_artwork. The
+    dedupe key of the job is unique among active jobs, so while a
+    conversion of the video is queued or running no second one is started
+    and the active job is returned instead.
+
+    If a video with the same content hash exists, the new video shares its
+    original. When that video's HLS output is complete it is reused as
+    well and nothing is encoded; otherwise the shared original is converted.
+
+    Args:
+        video (Video): The video to convert.
+
+    Returns:
+        TranscodeJob: The new or already active job, or the finished job of
+        a reused output.
+    """
+
+    source = find_duplicate(video)
+    if source is not None:
+        share_original(video, source)
+        if source.hls_complete:
+            try:
+                job = reuse_hls_output(video, source)
+            except OSError as e:
+                logger.warning(f"Cannot reuse the HLS output of video ID {source.id}, converting again: {e}")
+            else:
+                queue_artwork(video)
+                return job
+    try:
+        with transaction.atomic():
+            job = TranscodeJob.objects.create(video=video, dedupe_key=transcode_dedupe_key(video))
+    except IntegrityError:
+        logger.info(f"HLS conversion for video ID {video.id} is already queued")
+        return TranscodeJob.objects.get(dedupe_key=transcode_dedupe_key(video), state__in=TranscodeJob.ACTIVE_STATES)
+    transaction.on_commit(lambda: queue_transcode(job))
+    queue_artwork(video)
+    return job
+
+
+def queue_transcode(job):
+    """
+    Send the conversion of a transcode job to the workers and record its task ID.
+
+    Called once the transaction creating the video has committed, so the
+    worker always finds the video and its job.
+    """
+
+    task = convert_to_hls.delay(job.video_id)
+    job.task_id = str(task.id)
+    TranscodeJob.objects.filter(id=job.id).update(task_id=job.task_id)
+
+
+def queue_artwork(video):
+    """
+    Queue the artwork of a video without any once the current transaction commits.
+
+    Artwork is queued once per started conversion rather than by
+    convert_to_hls, whose retries and redeliveries would start concurrent
+    runs writing the same files.
+    """
+
+    if not video.thumbnails:
+        transaction.on_commit(lambda: generate_artwork.delay(video.id))
+
+
+def claim_transcode_job(video, task_id):
+    """
+    Take ownership of the active transcode job of a video.
+
+    A queued job is moved to ``probing`` with a single conditional UPDATE,
+    so when the same conversion is delivered twice only one run proceeds.
+    Jobs whose last update is older than ``TRANSCODE_STALE_SECONDS`` are
+    taken over as well, which recovers work from crashed workers.
+
+    Args:
+        video (Video): The video being converted.
+        task_id (str): The Celery task ID of the current run.
+
+    Returns:
+        TranscodeJob or None: The claimed job, or None if another run owns it.
+    """
+
+    key = transcode_dedupe_key(video)
+    try:
+        with transaction.atomic():
+            TranscodeJob.objects.get_or_create(
+                dedupe_key=key, state__in=TranscodeJob.ACTIVE_STATES,
+                defaults={'video': video, 'dedupe_key': key},
+            )
+    except IntegrityError:
+        pass
+    stale = now() - timedelta(seconds=settings.TRANSCODE_STALE_SECONDS)
+    jobs = TranscodeJob.objects.filter(dedupe_key=key, state__in=TranscodeJob.ACTIVE_STATES)
+    claimed = jobs.filter(Q(state=TranscodeJob.QUEUED) | Q(updated_at__lt=stale)).update(
+        state=TranscodeJob.PROBING, task_id=task_id or '', attempts=F('attempts') + 1, updated_at=now(),
+    )
+    if not claimed:
+        return None
+    return jobs.get()
+
+
+def retry_or_fail(task, job, exc):
+    """
+    Record a failed attempt and retry the task with exponential backoff.
+
+    The job goes back to ``queued`` while retries remain and to ``failed``
+    once ``TRANSCODE_MAX_RETRIES`` is exhausted. Renditions that were being
+    encoded are marked as failed.
+
+    Raises:
+        celery.exceptions.Retry: When the task is scheduled again.
+        Exception: ``exc`` itself once no retries remain.
+    """
+
+    job.renditions = {name: 'failed' if status == 'encoding' else status for name, status in job.renditions.items()}
+    if task.request.retries >= task.max_retries:
+        job.transition(TranscodeJob.FAILED, error=str(exc))
+        raise exc
+    job.transition(TranscodeJob.QUEUED, error=str(exc))
+    raise task.retry(exc=exc, countdown=settings.TRANSCODE_RETRY_BACKOFF * 2 ** task.request.retries)
+
+
+def progress_reporter(job, step, steps):
+    """
+    Return an ffmpeg progress callback for encode ``step`` of ``steps``.
+    """
+
+    return lambda fraction: job.report_progress(ENCODING_PROGRESS_SHARE * (step + fraction) / steps)
+
+
+def publish_renditions(video, ladder, ready, write_master=True):
+    """
+    Make the given renditions of a video available to players.
+
+    The master playlist listing ``ready`` is replaced atomically in the
+    storage, so players fetching it while a higher rendition is added never
+    see a partial file, and the ready renditions are recorded on the video.
+    The playlists and segments of ``ready`` must be stored already, see
+    HlsOutput.sync.
+
+    Args:
+        video (Video): The video being converted.
+        ladder (list): The full rendition ladder of the video.
+        ready (list): Ladder entries whose playlists are complete.
+        write_master (bool): False when ffmpeg already wrote the master.
+    """
+
+    if write_master:
+        save_text(default_storage, f"{hls_dir(video.id)}/{MASTER_PLAYLIST_NAME}", render_master_playlist(ready))
+    video.hls_master_playlist = f"{hls_dir(video.id)}/{MASTER_PLAYLIST_NAME}"
+    video.hls_renditions = [v['name'] for v in ready]
+    video.hls_complete = len(ready) == len(ladder)
+    video.save(update_fields=['hls_master_playlist', 'hls_renditions', 'hls_complete'])
+
+
+def encode_progressively(video, ladder, input_file, output, job):
+    """
+    Encode a ladder in priority order, publishing each group as it finishes.
+
+    The ``HLS_PRIORITY_RENDITIONS`` are encoded first and published with an
+    interim master playlist, so the video is playable long before the top
+    rendition is done. The remaining renditions are then encoded together,
+    or one by one in per-variant mode, and added to the master playlist,
+    see plan_publish_groups.
+
+    Args:
+        video (Video): The video being converted.
+        ladder (list): The rendition ladder of the video.
+        input_file (str): Path of the source video.
+        output (HlsOutput): The output receiving the renditions.
+        job (TranscodeJob): The job receiving progress and rendition status.
+    """
+
+    groups = plan_publish_groups(
+        ladder, settings.HLS_PRIORITY_RENDITIONS,
+        single_pass=settings.HLS_ENCODING_MODE != 'per_variant',
+    )
+    done = []
+    for step, group in enumerate(groups):
+        names = [v['name'] for v in group]
+        job.set_rendition_status(names, 'encoding')
+        cmd = build_single_pass_command(
+            settings.FFMPEG_BINARY, input_file, output.dir, group,
+            has_audio=bool(video.audio_channels), frame_rate=video.frame_rate,
+            write_master=False,
+        )
+        logger.info(f"Running command: {' '.join(cmd)}")
+        run_ffmpeg(cmd, video.duration, progress_reporter(job, step, len(groups)))
+        output.sync()
+        job.set_rendition_status(names, 'done')
+        done += group
+        publish_renditions(video, ladder, [v for v in ladder if v in done])
+        logger.info(f"Published renditions {video.hls_renditions} for video ID: {video.id}")
+
+@shared_task(
+    bind=True, max_retries=settings.TRANSCODE_MAX_RETRIES,
+    acks_late=True, reject_on_worker_lost=True,
+)
+def convert_to_hls(self, video_id):
     """
     Convert a video to HLS format with multiple quality variants.
 
     This Celery task takes a video ID, retrieves the corresponding video
     object, and converts the video file to HLS format with multiple 
-    quality variants using ffmpeg. The task generates four HLS 
-    playlists with different resolutions and bitrates, and creates a 
-    master playlist containing all variants.
+    quality variants using ffmpeg. The source is probed first and its
+    resolution, frame rate, duration and audio layout are stored on the
+    video. The rendition ladder is built from that metadata so no variant
+    is upscaled, and the master playlist lists the variants produced.
+
+    With ``HLS_PROGRESSIVE_PUBLISH`` the priority renditions are published
+    first and the others follow one by one, see ``encode_progressively``.
+    Otherwise ``HLS_ENCODING_MODE = 'single_pass'`` decodes the source once
+    and encodes all variants in a single ffmpeg run, which also writes the
+    master playlist, and ``'per_variant'`` runs ffmpeg once per variant.
+
+    Sources longer than ``HLS_CHUNKED_MIN_DURATION`` seconds are split at
+    keyframes into ranges of about ``HLS_CHUNK_SECONDS`` which are encoded
+    by parallel ``encode_hls_chunk`` tasks and joined by
+    ``stitch_hls_chunks``, so long uploads use every worker in the pool.
+
+    The work is tracked by the video's TranscodeJob: its state, progress
+    parsed from ffmpeg and the status of each rendition. A run that cannot
+    claim the job because another one owns it does nothing, and failed runs
+    are retried with exponential backoff.
 
     Args:
         video_id (int): The ID of the video to be converted.
@@ -26,59 +356,300 @@ def convert_to_hls(video_id):
         Error logs if any exceptions occur during the task execution.
 
     The converted HLS playlists are saved to the media storage, and the 
-    video object is updated with the path to the master playlist.
+    video object is updated with the path to the master playlist. The
+    original is read and the output stored through Django's storage API, so
+    workers need no shared disk with the web nodes, see
+    videoflix_videos.storage. The probe and the chunked pipeline read a
+    remote original through its URL; only a conversion encoded here
+    downloads it to HLS_WORK_DIR.
     """
 
     logger.info(f"Starting HLS conversion for video ID: {video_id}")
+    video = Video.objects.filter(id=video_id).first()
+    if video is None:
+        logger.error(f"Video ID {video_id} does not exist, skipping HLS conversion")
+        return
+    job = claim_transcode_job(video, self.request.id)
+    if job is None:
+        logger.info(f"HLS conversion for video ID {video_id} is already running, skipping")
+        return
 
     try:
-        video = Video.objects.get(id=video_id)
-        input_file = video.file.path
-        output_dir = os.path.join('videos', 'hls', str(video.id))
-        os.makedirs(output_dir, exist_ok=True)
-        variants = [
-            {'scale': '426x240', 'bitrate': '500k', 'variant': '0'},
-            {'scale': '640x360', 'bitrate': '1000k', 'variant': '1'},
-            {'scale': '1280x720', 'bitrate': '2500k', 'variant': '2'},
-            {'scale': '1920x1080', 'bitrate': '5000k', 'variant': '3'}
-        ]
-        for v in variants:
-            cmd = [
-                '/usr/bin/ffmpeg', '-i', input_file,
-                '-vf', f'scale={v["scale"]}',
-                '-b:v', v['bitrate'], '-c:v', 'h264', '-preset', 'fast',
-                '-c:a', 'aac', '-b:a', '128k',
-                '-f', 'hls',
-                '-hls_time', '5',
-                '-hls_list_size', '0',
-                '-hls_segment_filename', os.path.join(output_dir, f'segment_{v["variant"]}_%03d.ts'),
-                os.path.join(output_dir, f'variant_{v["variant"]}.m3u8')
-            ]
+        source = original_input(video)
+        probe_source(video, source)
+        ladder = video.rendition_ladder()
+        job.transition(TranscodeJob.ENCODING, renditions={v['name']: 'pending' for v in ladder})
+        if settings.HLS_CHUNKED_MIN_DURATION and video.duration >= settings.HLS_CHUNKED_MIN_DURATION:
+            keyframes = probe_keyframes(settings.FFPROBE_BINARY, source)
+            chunks = plan_chunks(keyframes, video.duration, settings.HLS_CHUNK_SECONDS)
+            logger.info(f"Encoding video ID {video_id} in {len(chunks)} chunks")
+            job.set_rendition_status(job.renditions, 'encoding')
+            chord(
+                group(encode_hls_chunk.s(video.id, i, start, length, job.id)
+                      for i, (start, length) in enumerate(chunks))
+            )(stitch_hls_chunks.s(video.id, len(chunks), job.id).on_error(fail_transcode_job.s(job.id)))
+            return
+        with local_original(video) as input_file, HlsOutput(video.id) as output:
+            if settings.HLS_PROGRESSIVE_PUBLISH:
+                encode_progressively(video, ladder, input_file, output, job)
+                job.transition(TranscodeJob.PACKAGING)
+            elif settings.HLS_ENCODING_MODE == 'per_variant':
+                for step, v in enumerate(ladder):
+                    job.set_rendition_status([v['name']], 'encoding')
+                    cmd = build_variant_command(settings.FFMPEG_BINARY, input_file, output.dir, v, video.frame_rate)
+                    logger.info(f"Running command: {' '.join(cmd)}")
+                    run_ffmpeg(cmd, video.duration, progress_reporter(job, step, len(ladder)))
+                    job.set_rendition_status([v['name']], 'done')
+                output.sync()
+                job.transition(TranscodeJob.PACKAGING)
+                publish_renditions(video, ladder, ladder)
+            else:
+                job.set_rendition_status(job.renditions, 'encoding')
+                cmd = build_single_pass_command(
+                    settings.FFMPEG_BINARY, input_file, output.dir, ladder,
+                    has_audio=bool(video.audio_channels), frame_rate=video.frame_rate,
+                )
+                logger.info(f"Running command: {' '.join(cmd)}")
+                run_ffmpeg(cmd, video.duration, progress_reporter(job, 0, 1))
+                output.sync()
+                job.set_rendition_status(job.renditions, 'done')
+                job.transition(TranscodeJob.PACKAGING)
+                publish_renditions(video, ladder, ladder, write_master=False)
+        job.transition(TranscodeJob.DONE, progress=100.0, error='')
+        logger.info(f"Successfully completed HLS conversion for video ID: {video_id}")
+
+    except Exception as e:
+        logger.error(f"Error in HLS conversion task: {e}")
+        retry_or_fail(self, job, e)
+
+
+@shared_task(
+    autoretry_for=(Exception,), max_retries=settings.TRANSCODE_MAX_RETRIES,
+    retry_backoff=settings.TRANSCODE_RETRY_BACKOFF,
+    acks_late=True, reject_on_worker_lost=True,
+)
+def encode_hls_chunk(video_id, index, start, duration, job_id):
+    """
+    Encode one time range of a video into all HLS variants.
+
+    Part of the chunked pipeline started by ``convert_to_hls``. The outputs
+    are written next to the other chunks with a ``chunk_<index>_`` prefix and
+    joined afterwards by ``stitch_hls_chunks``. Failed chunks are retried
+    with exponential backoff; the job's progress grows by the share of the
+    video each finished chunk covers.
+
+    Args:
+        video_id (int): The ID of the video being converted.
+        index (int): Position of the chunk in the video.
+        start (float): Start of the range in seconds.
+        duration (float): Length of the range in seconds.
+        job_id (int): The ID of the TranscodeJob of the conversion.
+
+    Returns:
+        int: The chunk index, collected by the chord callback.
+    """
 
+    try:
+        video = Video.objects.get(id=video_id)
+        with HlsOutput(video.id) as output:
+            cmd = build_single_pass_command(
+                settings.FFMPEG_BINARY, original_input(video), output.dir, video.rendition_ladder(),
+                has_audio=bool(video.audio_channels), start=start, duration=duration,
+                prefix=chunk_prefix(index), frame_rate=video.frame_rate,
+            )
             logger.info(f"Running command: {' '.join(cmd)}")
-            subprocess.run(cmd, check=True)
-        master_playlist = os.path.join(output_dir, 'master.m3u8')
-        master_content = """
-                #EXTM3U
-                #EXT-X-STREAM-INF:BANDWIDTH=500000,RESOLUTION=426x240
-                variant_0.m3u8
-                #EXT-X-STREAM-INF:BANDWIDTH=1000000,RESOLUTION=640x360
-                variant_1.m3u8
-                #EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720
-                variant_2.m3u8
-                #EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080
-                variant_3.m3u8
-            """
-
-        with open(master_playlist, 'w') as f:
-            f.write(master_content.strip())
-        video.hls_master_playlist = f"videos/hls/{video.id}/master.m3u8"
-
-        video.save()
+            run_ffmpeg(cmd)
+            output.sync()
+        TranscodeJob.objects.filter(id=job_id).update(
+            progress=F('progress') + ENCODING_PROGRESS_SHARE * duration / video.duration, updated_at=now(),
+        )
+        return index
+    except Exception as e:
+        logger.error(f"Error encoding chunk {index} of video ID {video_id}: {e}")
+        raise
+
+
+@shared_task
+def stitch_hls_chunks(results, video_id, chunk_count, job_id):
+    """
+    Join the chunk playlists of a video into continuous variant playlists.
+
+    Runs as the chord callback of the chunked pipeline once every
+    ``encode_hls_chunk`` task has finished. The per-chunk playlists are
+    replaced by one playlist per variant and the master playlist is written.
+
+    Args:
+        results (list): Chunk indexes returned by the encode tasks.
+        video_id (int): The ID of the video being converted.
+        chunk_count (int): Number of chunks the video was split into.
+        job_id (int): The ID of the TranscodeJob of the conversion.
+    """
+
+    job = TranscodeJob.objects.get(id=job_id)
+    try:
+        video = Video.objects.get(id=video_id)
+        job.transition(TranscodeJob.PACKAGING)
+        output_dir = hls_dir(video.id)
+        ladder = video.rendition_ladder()
+        for v in ladder:
+            chunk_playlists = [
+                f'{output_dir}/{chunk_prefix(i)}variant_{v["variant"]}.m3u8' for i in range(chunk_count)
+            ]
+            contents = [read_text(default_storage, name) for name in chunk_playlists]
+            save_text(default_storage, f'{output_dir}/variant_{v["variant"]}.m3u8', stitch_playlists(contents))
+            for name in chunk_playlists:
+                default_storage.delete(name)
+        publish_renditions(video, ladder, ladder)
+        job.renditions = {v['name']: 'done' for v in ladder}
+        job.transition(TranscodeJob.DONE, progress=100.0, error='')
         logger.info(f"Successfully completed HLS conversion for video ID: {video_id}")
 
     except Exception as e:
-        logger.error(f"Error in HLS conversion task: {e}")
+        logger.error(f"Error stitching HLS chunks for video ID {video_id}: {e}")
+        job.transition(TranscodeJob.FAILED, error=str(e))
+        raise
+
+
+@shared_task(
+    autoretry_for=(Exception,), max_retries=settings.TRANSCODE_MAX_RETRIES,
+    retry_backoff=settings.TRANSCODE_RETRY_BACKOFF,
+)
+def generate_artwork(video_id):
+    """
+    Generate the poster thumbnails and seek-preview sprites of a video.
+
+    Queued on the thumbnails queue by start_transcode, see queue_artwork,
+    so it runs next to the encode; the source is probed here if the
+    conversion has not done so yet. The poster frame is the first
+    scene change found in the ``THUMBNAIL_SCENE_SCAN_SECONDS`` after the
+    opening 5% of the video, see pick_poster_time. The original is read
+    through original_input, so a remote original is not downloaded. It is written once per size in ``THUMBNAIL_SIZES`` and
+    format in ``THUMBNAIL_FORMATS`` with a single ffmpeg run. A second run
+    tiles one frame every ``SPRITE_INTERVAL`` seconds into sprite sheets,
+    which a WebVTT file indexes for seek previews. Everything is stored below
+    ``thumbnails/<id>/``. A video without an uploaded thumbnail gets the
+    largest JPEG poster as its thumbnail.
+
+    Args:
+        video_id (int): The ID of the video.
+    """
+
+    video = Video.objects.filter(id=video_id).first()
+    if video is None:
+        logger.error(f"Video ID {video_id} does not exist, skipping artwork")
+        return
+    name = f"thumbnails/{video.id}"
+    sizes = settings.THUMBNAIL_SIZES
+    formats = settings.THUMBNAIL_FORMATS
+    input_file = original_input(video)
+    with tempfile.TemporaryDirectory(dir=settings.HLS_WORK_DIR) as work_dir:
+        if video.duration is None:
+            probe_source(video, input_file)
+        start, scan_seconds = scene_scan_window(video.duration, settings.THUMBNAIL_SCENE_SCAN_SECONDS)
+        scenes = detect_scenes(
+            settings.FFMPEG_BINARY, input_file, settings.THUMBNAIL_SCENE_THRESHOLD, start, scan_seconds,
+        )
+        poster_time = pick_poster_time(scenes, video.duration)
+        run_ffmpeg(build_thumbnail_command(settings.FFMPEG_BINARY, input_file, work_dir, poster_time, sizes, formats))
+        tile_width, tile_height, count = sprite_layout(
+            video.width, video.height, video.duration, settings.SPRITE_INTERVAL, settings.SPRITE_TILE_WIDTH,
+        )
+        run_ffmpeg(build_sprite_command(
+            settings.FFMPEG_BINARY, input_file, work_dir, settings.SPRITE_INTERVAL,
+            tile_width, tile_height, settings.SPRITE_COLUMNS, settings.SPRITE_ROWS,
+        ))
+        thumbnails = {}
+        for size in sizes:
+            thumbnails[size] = {}
+            for fmt in formats:
+                filename = thumbnail_name(size, fmt)
+                save_file(default_storage, f"{name}/{filename}", os.path.join(work_dir, filename))
+                thumbnails[size][fmt] = f"{name}/{filename}"
+        for filename in sorted(os.listdir(work_dir)):
+            if filename.startswith('sprite_'):
+                save_file(default_storage, f"{name}/{filename}", os.path.join(work_dir, filename))
+        save_text(default_storage, f"{name}/{SPRITE_VTT_NAME}", render_sprite_vtt(
+            count, video.duration, settings.SPRITE_INTERVAL, tile_width, tile_height,
+            settings.SPRITE_COLUMNS, settings.SPRITE_ROWS,
+        ))
+    video.thumbnails = thumbnails
+    video.poster_time = poster_time
+    video.preview_sprites = f"{name}/{SPRITE_VTT_NAME}"
+    fields = list(ARTWORK_FIELDS)
+    largest = thumbnails[max(sizes, key=sizes.get)]
+    if not video.thumbnail and 'jpeg' in largest:
+        video.thumbnail = largest['jpeg']
+        fields.append('thumbnail')
+    video.save(update_fields=fields)
+    logger.info(f"Generated artwork for video ID {video_id} from the frame at {poster_time:.1f}s")
+
+
+@shared_task
+def fail_transcode_job(request, exc, traceback, job_id):
+    """
+    Mark a transcode job as failed when a chunk of its chord fails for good.
+
+    Linked as error callback of the chunked pipeline's chord.
+
+    Args:
+        request: The request of the failed task.
+        exc (Exception): The exception that ended the chord.
+        traceback: The traceback of the exception.
+        job_id (int): The ID of the TranscodeJob of the conversion.
+    """
+
+    job = TranscodeJob.objects.get(id=job_id)
+    logger.error(f"Chunked HLS conversion of video ID {job.video_id} failed: {exc}")
+    if job.is_active:
+        job.renditions = {name: 'failed' for name in job.renditions}
+        job.transition(TranscodeJob.FAILED, error=str(exc))
+
+
+@shared_task
+def flush_progress_buffer():
+    """
+    Move buffered playback progress from Redis to the database.
+
+    Scheduled every PROGRESS_FLUSH_INTERVAL seconds by Celery beat. Flushes
+    batches until the dirty set is drained or PROGRESS_FLUSH_MAX_BATCHES
+    batches were written, leaving the rest for the next run.
+
+    Returns:
+        int: The number of progress entries written.
+    """
+
+    total = 0
+    for _ in range(settings.PROGRESS_FLUSH_MAX_BATCHES):
+        flushed = flush_progress()
+        total += flushed
+        if flushed < settings.PROGRESS_FLUSH_BATCH_SIZE:
+            break
+    if total:
+        logger.info(f"Flushed {total} buffered progress entries")
+    return total
+
+
+@shared_task
+def purge_stale_uploads():
+    """
+    Delete resumable uploads that received no chunk for UPLOAD_SESSION_TTL seconds.
+
+    Scheduled hourly by Celery beat. Their partial files are removed as well.
+
+    Returns:
+        int: The number of uploads deleted.
+    """
+
+    threshold = now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    stale = UploadSession.objects.filter(state=UploadSession.UPLOADING, updated_at__lt=threshold)
+    count = 0
+    for session in stale.iterator():
+        abort_upload(session)
+        count += 1
+    if count:
+        logger.info(f"Purged {count} stale uploads")
+    return count
+
 
 @shared_task(queue='default')
 def test_celery_task():
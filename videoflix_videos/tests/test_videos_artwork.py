@@ -0,0 +1,207 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch, MagicMock
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from videoflix_videos.api.serializers import VideoGridSerializer, VideoSerializer, VideoSerializerSingle
+from videoflix_videos.artwork import (
+    build_sprite_command, build_thumbnail_command, detect_scenes, pick_poster_time, render_sprite_vtt,
+    scene_scan_window, sprite_layout,
+)
+from videoflix_videos.models import Video
+from videoflix_videos.tasks import convert_to_hls, generate_artwork
+
+
+class ArtworkHelpersTestCase(TestCase):
+    def test_poster_skips_intro_scene_changes(self):
+        self.assertEqual(pick_poster_time([1.0, 2.5, 12.0, 40.0], 100.0), 12.0)
+
+    def test_poster_without_scene_change_uses_tenth_of_duration(self):
+        self.assertEqual(pick_poster_time([], 100.0), 10.0)
+        self.assertEqual(pick_poster_time([95.0], 100.0), 10.0)
+
+    def test_scan_covers_accepted_range_of_long_videos(self):
+        start, length = scene_scan_window(6000.0, 300)
+        self.assertEqual((start, length), (300.0, 300))
+        self.assertEqual(pick_poster_time([start + 12.0], 6000.0), 312.0)
+        self.assertEqual(scene_scan_window(20.0, 300), (1.0, 17.0))
+        self.assertEqual(scene_scan_window(None, 300), (0.0, 300))
+
+    def test_scene_times_are_relative_to_video_start(self):
+        def run(cmd, **kwargs):
+            output = cmd[cmd.index('-vf') + 1].rsplit('file=', 1)[1]
+            with open(output, 'w') as f:
+                f.write('frame:0    pts:300     pts_time:12.5\nlavfi.scene_score=0.6\n')
+
+        with patch('videoflix_videos.artwork.subprocess.run', side_effect=run) as mock_run:
+            self.assertEqual(detect_scenes('ffmpeg', 'in.mp4', 0.4, 300.0, 300.0), [312.5])
+        cmd = mock_run.call_args[0][0]
+        self.assertLess(cmd.index('-ss'), cmd.index('-i'))
+
+    def test_thumbnail_command_decodes_frame_once(self):
+        cmd = build_thumbnail_command('ffmpeg', 'in.mp4', '/out', 12.0, {'list': 320, 'hero': 1280}, ['webp', 'jpeg'])
+        self.assertEqual(cmd.count('-i'), 1)
+        self.assertEqual(cmd[cmd.index('-ss') + 1], '12.000')
+        graph = cmd[cmd.index('-filter_complex') + 1]
+        self.assertIn('split=4', graph)
+        self.assertIn('scale=1280:-2', graph)
+        self.assertEqual([arg for arg in cmd if arg.startswith('/out/')],
+                         ['/out/list.webp', '/out/list.jpg', '/out/hero.webp', '/out/hero.jpg'])
+        self.assertEqual(cmd.count('-frames:v'), 4)
+
+    def test_sprite_layout_keeps_aspect_ratio(self):
+        self.assertEqual(sprite_layout(1920, 1080, 95.0, 10, 160), (160, 90, 10))
+        self.assertEqual(sprite_layout(None, None, None, 10, 160), (160, 90, 1))
+
+    def test_sprite_command_tiles_frames(self):
+        cmd = build_sprite_command('ffmpeg', 'in.mp4', '/out', 10, 160, 90, 10, 10)
+        self.assertIn('fps=1/10,scale=160:90,tile=10x10', cmd)
+        self.assertEqual(cmd[-1], '/out/sprite_%03d.jpg')
+
+    def test_sprite_vtt_points_at_tiles(self):
+        vtt = render_sprite_vtt(5, 45.0, 10, 160, 90, 2, 2)
+        self.assertTrue(vtt.startswith('WEBVTT\n'))
+        self.assertIn('00:00:00.000 --> 00:00:10.000\nsprite_000.jpg#xywh=0,0,160,90', vtt)
+        self.assertIn('00:00:30.000 --> 00:00:40.000\nsprite_000.jpg#xywh=160,90,160,90', vtt)
+        self.assertIn('00:00:40.000 --> 00:00:45.000\nsprite_001.jpg#xywh=0,0,160,90', vtt)
+
+
+@override_settings(THUMBNAIL_SIZES={'list': 320, 'hero': 1280}, THUMBNAIL_FORMATS=['webp', 'jpeg'])
+class GenerateArtworkTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        patch('videoflix_videos.tasks.convert_to_hls.delay', return_value=MagicMock(id='task-1')).start()
+        self.addCleanup(patch.stopall)
+        self.video = Video.objects.create(
+            title='Movie', file=ContentFile(b'original', name='movie.mp4'), duration=25.0, width=1280, height=720,
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    @patch('videoflix_videos.tasks.detect_scenes', return_value=[0.5, 8.0])
+    @patch('videoflix_videos.tasks.run_ffmpeg')
+    def test_generates_thumbnails_and_sprites(self, mock_run, mock_scenes):
+        def encode(cmd, *args, **kwargs):
+            for arg in cmd:
+                if isinstance(arg, str) and arg.startswith('/') and os.path.splitext(arg)[1] in ('.jpg', '.webp'):
+                    with open(arg.replace('%03d', '000'), 'wb') as f:
+                        f.write(b'image')
+
+        mock_run.side_effect = encode
+        generate_artwork(self.video.id)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.poster_time, 8.0)
+        self.assertEqual(self.video.thumbnails['list'], {
+            'webp': f'thumbnails/{self.video.id}/list.webp', 'jpeg': f'thumbnails/{self.video.id}/list.jpg',
+        })
+        self.assertEqual(self.video.thumbnail.name, f'thumbnails/{self.video.id}/hero.jpg')
+        self.assertEqual(self.video.preview_sprites.name, f'thumbnails/{self.video.id}/sprite.vtt')
+        for name in ('list.webp', 'hero.jpg', 'sprite_000.jpg', 'sprite.vtt'):
+            self.assertTrue(default_storage.exists(f'thumbnails/{self.video.id}/{name}'), name)
+        with default_storage.open(self.video.preview_sprites.name) as f:
+            self.assertIn(b'sprite_000.jpg#xywh=0,0,160,90', f.read())
+
+    @patch('videoflix_videos.tasks.detect_scenes', return_value=[])
+    @patch('videoflix_videos.tasks.run_ffmpeg')
+    def test_uploaded_thumbnail_is_kept(self, mock_run, mock_scenes):
+        def encode(cmd, *args, **kwargs):
+            output_dir = os.path.dirname(cmd[-1])
+            for name in ('list.webp', 'list.jpg', 'hero.webp', 'hero.jpg', 'sprite_000.jpg'):
+                with open(os.path.join(output_dir, name), 'wb') as f:
+                    f.write(b'image')
+
+        mock_run.side_effect = encode
+        self.video.thumbnail = ContentFile(b'poster', name='poster.jpg')
+        self.video.save()
+        uploaded = self.video.thumbnail.name
+        generate_artwork(self.video.id)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.thumbnail.name, uploaded)
+        self.assertEqual(self.video.poster_time, 2.5)
+
+    @patch('videoflix_videos.tasks.probe_video', return_value={
+        'width': 640, 'height': 360, 'frame_rate': 25.0, 'duration': 30.0, 'audio_channels': 0, 'audio_layout': '',
+    })
+    @patch('videoflix_videos.tasks.detect_scenes', return_value=[])
+    @patch('videoflix_videos.tasks.run_ffmpeg')
+    def test_unprobed_source_is_probed(self, mock_run, mock_scenes, mock_probe):
+        def encode(cmd, *args, **kwargs):
+            output_dir = os.path.dirname(cmd[-1])
+            for name in ('list.webp', 'list.jpg', 'hero.webp', 'hero.jpg', 'sprite_000.jpg'):
+                with open(os.path.join(output_dir, name), 'wb') as f:
+                    f.write(b'image')
+
+        mock_run.side_effect = encode
+        Video.objects.filter(id=self.video.id).update(duration=None, width=None, height=None)
+        generate_artwork(self.video.id)
+        self.video.refresh_from_db()
+        self.assertEqual((self.video.duration, self.video.poster_time), (30.0, 3.0))
+
+    @patch('videoflix_videos.tasks.detect_scenes', return_value=[312.0])
+    @patch('videoflix_videos.tasks.run_ffmpeg')
+    def test_long_video_is_scanned_after_intro(self, mock_run, mock_scenes):
+        def encode(cmd, *args, **kwargs):
+            output_dir = os.path.dirname(cmd[-1])
+            for name in ('list.webp', 'list.jpg', 'hero.webp', 'hero.jpg', 'sprite_000.jpg'):
+                with open(os.path.join(output_dir, name), 'wb') as f:
+                    f.write(b'image')
+
+        mock_run.side_effect = encode
+        Video.objects.filter(id=self.video.id).update(duration=6000.0)
+        generate_artwork(self.video.id)
+        self.assertEqual(mock_scenes.call_args[0][3:], (300.0, 300))
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.poster_time, 312.0)
+
+
+class ArtworkQueueTestCase(TestCase):
+    @patch('videoflix_videos.tasks.generate_artwork.delay')
+    @patch('videoflix_videos.tasks.convert_to_hls.delay', return_value=MagicMock(id='task-1'))
+    def test_artwork_is_queued_once_per_upload(self, mock_convert, mock_artwork):
+        with self.captureOnCommitCallbacks(execute=True):
+            video = Video.objects.create(title='Movie', file='videos/originals/movie.mp4')
+            mock_artwork.assert_not_called()
+        mock_artwork.assert_called_once_with(video.id)
+        with patch('videoflix_videos.tasks.probe_video', side_effect=RuntimeError('probe failed')), \
+                patch('videoflix_videos.tasks.convert_to_hls.retry', return_value=RuntimeError('retry')):
+            with self.assertRaises(RuntimeError):
+                convert_to_hls(video.id)
+        mock_artwork.assert_called_once_with(video.id)
+
+
+class SizedThumbnailSerializerTestCase(TestCase):
+    def setUp(self):
+        patch('videoflix_videos.tasks.convert_to_hls.delay', return_value=MagicMock(id='task-1')).start()
+        self.addCleanup(patch.stopall)
+        self.request = APIRequestFactory().get('/videoflix/api/videos/')
+        self.request.user = MagicMock(is_authenticated=False)
+        self.video = Video.objects.create(title='Movie', file='videos/originals/movie.mp4', thumbnail='thumbnails/poster.jpg')
+
+    def serialize(self, serializer_class):
+        return serializer_class(self.video, context={'request': self.request}).data
+
+    def test_uploaded_thumbnail_until_generated(self):
+        data = self.serialize(VideoSerializer)
+        self.assertEqual(data['thumbnail'], 'http://testserver/media/thumbnails/poster.jpg')
+        self.assertIsNone(data['thumbnail_webp'])
+        self.assertIsNone(self.serialize(VideoSerializerSingle)['preview_sprites_url'])
+
+    def test_size_per_serializer(self):
+        self.video.thumbnails = {
+            size: {'jpeg': f'thumbnails/1/{size}.jpg', 'webp': f'thumbnails/1/{size}.webp'}
+            for size in ('list', 'card', 'hero')
+        }
+        self.video.preview_sprites = 'thumbnails/1/sprite.vtt'
+        self.assertEqual(self.serialize(VideoSerializer)['thumbnail'], 'http://testserver/media/thumbnails/1/list.jpg')
+        self.assertEqual(self.serialize(VideoGridSerializer)['thumbnail_webp'],
+                         'http://testserver/media/thumbnails/1/card.webp')
+        data = self.serialize(VideoSerializerSingle)
+        self.assertEqual(data['thumbnail'], 'http://testserver/media/thumbnails/1/hero.jpg')
+        self.assertEqual(data['preview_sprites_url'], 'http://testserver/media/thumbnails/1/sprite.vtt')
@@ -0,0 +1,129 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APITestCase, APIClient
+from videoflix_videos.cache import catalogue_cache_stats, catalogue_version
+from videoflix_videos.models import Video, UserVideoProgress, TranscodeJob
+
+
+class CatalogueCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.other = User.objects.create_user(username='other', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.video = Video.objects.create(
+            title="Cached Video",
+            file=SimpleUploadedFile("test_video.mp4", b"dummy_video_data", content_type="video/mp4"),
+            thumbnail=SimpleUploadedFile("thumbnail.jpg", b"image_data", content_type="image/jpeg"),
+            description="Cached",
+            genre="Action",
+        )
+        UserVideoProgress.objects.create(user=self.user, video=self.video, last_viewed_position=30)
+
+    def test_list_is_served_from_cache(self):
+        self.client.get("/videoflix/api/videos/")
+        with self.assertNumQueries(1):
+            response = self.client.get("/videoflix/api/videos/")
+        self.assertEqual(response.data['results'][0]['title'], "Cached Video")
+        self.assertEqual(catalogue_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_single_video_is_served_from_cache(self):
+        self.client.get(f"/videoflix/api/videos/{self.video.id}/")
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/videoflix/api/videos/{self.video.id}/")
+        self.assertEqual(response.data['title'], "Cached Video")
+        self.assertEqual(response.data['user_progress']['last_viewed_position'], 30)
+
+    def test_user_progress_is_not_shared(self):
+        self.client.get("/videoflix/api/videos/")
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get("/videoflix/api/videos/")
+        self.assertIsNone(response.data['results'][0]['user_progress'])
+        self.assertEqual(catalogue_cache_stats()['hits'], 1)
+
+    def test_progress_changes_show_without_invalidation(self):
+        self.client.get("/videoflix/api/videos/")
+        UserVideoProgress.objects.filter(user=self.user).update(last_viewed_position=90)
+        response = self.client.get("/videoflix/api/videos/")
+        self.assertEqual(response.data['results'][0]['user_progress']['last_viewed_position'], 90)
+
+    def test_video_save_invalidates(self):
+        self.client.get(f"/videoflix/api/videos/{self.video.id}/")
+        version = catalogue_version()
+        self.video.title = "Renamed"
+        self.video.save()
+        self.assertGreater(catalogue_version(), version)
+        response = self.client.get(f"/videoflix/api/videos/{self.video.id}/")
+        self.assertEqual(response.data['title'], "Renamed")
+
+    def test_video_delete_invalidates(self):
+        self.client.get("/videoflix/api/videos/")
+        self.video.delete()
+        response = self.client.get("/videoflix/api/videos/")
+        self.assertEqual(response.data['results'], [])
+
+    def test_transcode_done_invalidates(self):
+        job = self.video.transcode_jobs.first()
+        version = catalogue_version()
+        job.transition(TranscodeJob.PROBING)
+        self.assertEqual(catalogue_version(), version)
+        job.transition(TranscodeJob.ENCODING)
+        job.transition(TranscodeJob.PACKAGING)
+        job.transition(TranscodeJob.DONE)
+        self.assertGreater(catalogue_version(), version)
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.video = Video.objects.create(
+            title="Polled Video",
+            file=SimpleUploadedFile("test_video.mp4", b"dummy_video_data", content_type="video/mp4"),
+            thumbnail=SimpleUploadedFile("thumbnail.jpg", b"image_data", content_type="image/jpeg"),
+            genre="Action",
+        )
+        self.progress = UserVideoProgress.objects.create(user=self.user, video=self.video, last_viewed_position=30)
+        self.urls = ["/videoflix/api/videos/", f"/videoflix/api/videos/{self.video.id}/"]
+
+    def test_matching_etag_returns_304_without_queries(self):
+        for url in self.urls:
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+
+    def test_last_modified_from_progress_and_upload(self):
+        from django.utils.http import http_date
+        response = self.client.get(self.urls[1])
+        self.progress.refresh_from_db()
+        expected = max(self.progress.last_viewed_at, self.video.uploaded_at)
+        self.assertEqual(response['Last-Modified'], http_date(expected.timestamp()))
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_progress_change_changes_etag(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        self.progress.last_viewed_position = 60
+        self.progress.save()
+        for url, etag in zip(self.urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_video_change_changes_etag(self):
+        etag = self.client.get(self.urls[0])['ETag']
+        Video.objects.get(id=self.video.id).save()
+        self.assertEqual(self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_differs_per_user_and_query(self):
+        etag = self.client.get(self.urls[0])['ETag']
+        self.assertNotEqual(self.client.get(self.urls[0], {'genre': 'Action'})['ETag'], etag)
+        other = User.objects.create_user(username='other', password='testpassword')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.test import SimpleTestCase
+from unittest.mock import patch, MagicMock
+from videoflix_videos.hls import (
+    build_ladder, plan_chunks, plan_publish_groups, probe_video, rebase_playlist, render_master_playlist,
+    run_ffmpeg, stitch_playlists, write_playlist,
+)
+import json
+import subprocess
+import os
+import tempfile
+
+
+class ProbeVideoTestCase(SimpleTestCase):
+    @patch("videoflix_videos.hls.subprocess.run")
+    def test_probe_video(self, mock_run):
+        """Test ffprobe output is reduced to the ladder metadata"""
+        mock_run.return_value = MagicMock(stdout=json.dumps({
+            'streams': [
+                {'codec_type': 'video', 'width': 854, 'height': 480, 'avg_frame_rate': '30000/1001'},
+                {'codec_type': 'audio', 'channels': 6, 'channel_layout': '5.1'},
+            ],
+            'format': {'duration': '93.5'},
+        }))
+        self.assertEqual(probe_video('ffprobe', 'in.mp4'), {
+            'width': 854, 'height': 480, 'frame_rate': 29.97, 'duration': 93.5,
+            'audio_channels': 6, 'audio_layout': '5.1',
+        })
+
+    @patch("videoflix_videos.hls.subprocess.run")
+    def test_probe_video_without_audio(self, mock_run):
+        """Test a silent source reports no audio channels"""
+        mock_run.return_value = MagicMock(stdout=json.dumps({
+            'streams': [{'codec_type': 'video', 'width': 640, 'height': 360, 'avg_frame_rate': '0/0'}],
+            'format': {'duration': '10'},
+        }))
+        metadata = probe_video('ffprobe', 'in.mp4')
+        self.assertEqual(metadata['audio_channels'], 0)
+        self.assertEqual(metadata['frame_rate'], 0.0)
+
+
+class BuildLadderTestCase(SimpleTestCase):
+    def test_no_rungs_above_source(self):
+        """Test a 480p source is never upscaled"""
+        ladder = build_ladder(854, 480, settings.HLS_RENDITION_LADDER)
+        self.assertEqual([v['name'] for v in ladder], ['240p', '360p', '480p'])
+        self.assertEqual(ladder[-1]['scale'], '854x480')
+        self.assertEqual([v['variant'] for v in ladder], ['0', '1', '2'])
+
+    def test_widths_follow_aspect_ratio(self):
+        """Test rung widths keep the source aspect ratio and stay even"""
+        ladder = build_ladder(1440, 1080, settings.HLS_RENDITION_LADDER)
+        self.assertEqual(ladder[0]['scale'], '320x240')
+        self.assertEqual(ladder[-1]['scale'], '1440x1080')
+
+    def test_tiny_source_gets_one_rung(self):
+        """Test a source below the lowest rung is encoded at its own size"""
+        ladder = build_ladder(320, 181, settings.HLS_RENDITION_LADDER)
+        self.assertEqual(ladder, [{'name': '180p', 'scale': '318x180', 'bitrate': '500k', 'variant': '0'}])
+
+    def test_master_playlist_lists_ladder(self):
+        """Test the master playlist is rendered from the produced renditions"""
+        content = render_master_playlist(build_ladder(854, 480, settings.HLS_RENDITION_LADDER))
+        self.assertEqual(content.count('#EXT-X-STREAM-INF'), 3)
+        self.assertIn('BANDWIDTH=1500000,RESOLUTION=854x480', content)
+        self.assertNotIn('variant_3.m3u8', content)
+
+
+class PlanChunksTestCase(SimpleTestCase):
+    def test_boundaries_snap_to_keyframes(self):
+        """Test chunk boundaries move to the nearest keyframe"""
+        chunks = plan_chunks([0.0, 4.0, 9.5, 14.0, 21.0], 30.0, 10)
+        self.assertEqual(chunks, [(0.0, 9.5), (9.5, 11.5), (21.0, 9.0)])
+
+    def test_short_video_is_one_chunk(self):
+        """Test a video shorter than a chunk is not split"""
+        self.assertEqual(plan_chunks([0.0, 2.0], 8.0, 10), [(0.0, 8.0)])
+
+    def test_duplicate_boundaries_are_dropped(self):
+        """Test sparse keyframes never produce empty chunks"""
+        chunks = plan_chunks([0.0, 15.0], 30.0, 5)
+        self.assertEqual(chunks, [(0.0, 15.0), (15.0, 15.0)])
+
+
+class StitchPlaylistsTestCase(SimpleTestCase):
+    def test_stitch_playlists(self):
+        """Test chunk playlists are joined with discontinuities"""
+        first = "#EXTM3U\n#EXT-X-TARGETDURATION:5\n#EXTINF:5.005,\na.ts\n#EXTINF:2.1,\nb.ts\n#EXT-X-ENDLIST"
+        second = "#EXTM3U\n#EXT-X-TARGETDURATION:5\n#EXTINF:4.8,\nc.ts\n#EXT-X-ENDLIST"
+        lines = stitch_playlists([first, second]).splitlines()
+        self.assertEqual(lines[2], '#EXT-X-TARGETDURATION:6')
+        self.assertEqual(lines[5:], [
+            '#EXTINF:5.005,', 'a.ts', '#EXTINF:2.1,', 'b.ts',
+            '#EXT-X-DISCONTINUITY', '#EXTINF:4.8,', 'c.ts', '#EXT-X-ENDLIST',
+        ])
+
+
+class PublishTestCase(SimpleTestCase):
+    def test_priority_renditions_come_first(self):
+        """Test priority renditions share the first group and the rest share the second"""
+        ladder = build_ladder(1920, 1080, settings.HLS_RENDITION_LADDER)
+        groups = plan_publish_groups(ladder, ['240p', '360p'])
+        self.assertEqual([[v['name'] for v in g] for g in groups], [['240p', '360p'], ['480p', '720p', '1080p']])
+        self.assertEqual(len(plan_publish_groups(ladder, [])), 1)
+
+    def test_priority_renditions_per_variant(self):
+        """Test priority renditions are encoded separately outside single-pass mode"""
+        ladder = build_ladder(854, 480, settings.HLS_RENDITION_LADDER)
+        groups = plan_publish_groups(ladder, ['240p', '360p'], single_pass=False)
+        self.assertEqual([[v['name'] for v in g] for g in groups], [['240p'], ['360p'], ['480p']])
+
+    def test_write_playlist_replaces_file(self):
+        """Test playlists are replaced without leaving temporary files"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'master.m3u8')
+            write_playlist(path, 'old')
+            write_playlist(path, 'new')
+            with open(path) as f:
+                self.assertEqual(f.read(), 'new')
+            self.assertEqual(os.listdir(tmp), ['master.m3u8'])
+
+    def test_rebase_playlist_prefixes_uris(self):
+        """Test only the URI lines of a playlist are rebased"""
+        content = '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1000000\nvariant_0.m3u8\nhttps://cdn.example/v.m3u8'
+        self.assertEqual(
+            rebase_playlist(content, '../7/'),
+            '#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1000000\n../7/variant_0.m3u8\nhttps://cdn.example/v.m3u8',
+        )
+
+
+class RunFfmpegTestCase(SimpleTestCase):
+    @patch("videoflix_videos.hls.subprocess.Popen")
+    def test_progress_is_reported(self, mock_popen):
+        """Test out_time_us values of the progress pipe become fractions"""
+        process = mock_popen.return_value
+        process.stdout = iter(['frame=10\n', 'out_time_us=5000000\n', 'progress=continue\n', 'out_time_us=N/A\n', 'out_time_us=20000000\n'])
+        process.wait.return_value = 0
+        reported = []
+        run_ffmpeg(['ffmpeg', '-i', 'in.mp4', 'out.m3u8'], duration=10.0, on_progress=reported.append)
+        self.assertEqual(reported, [0.5, 1.0])
+        self.assertEqual(mock_popen.call_args[0][0][:4], ['ffmpeg', '-nostats', '-progress', 'pipe:1'])
+
+    @patch("videoflix_videos.hls.subprocess.Popen")
+    def test_failure_raises(self, mock_popen):
+        """Test a non-zero exit status raises CalledProcessError"""
+        process = mock_popen.return_value
+        process.stdout = iter([])
+        process.wait.return_value = 1
+        with self.assertRaises(subprocess.CalledProcessError):
+            run_ffmpeg(['ffmpeg', '-i', 'in.mp4', 'out.m3u8'])
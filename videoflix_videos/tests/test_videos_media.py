@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils.http import http_date
+from rest_framework.test import APITestCase, APIClient
+from videoflix_auth.authentication import local_cache
+from videoflix_auth.models import AuthToken
+from videoflix_videos.api.media import parse_range
+
+
+class MediaViewTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_SERVE_MODE='python')
+        self.settings_override.enable()
+        self.data = bytes(range(256)) * 4
+        self.write('videos/hls/1/720p/segment_000.ts', self.data)
+        self.write('videos/hls/1/master.m3u8', b'#EXTM3U\n')
+        self.write('thumbnails/poster.jpg', b'jpeg')
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.token = AuthToken.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.segment_url = '/media/videos/hls/1/720p/segment_000.ts'
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def write(self, path, data):
+        full_path = os.path.join(self.media_root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(data)
+
+    def test_requires_token_except_for_public_media(self):
+        anonymous = APIClient()
+        self.assertEqual(anonymous.get(self.segment_url).status_code, 401)
+        self.assertEqual(anonymous.get(f'{self.segment_url}?token={self.token.key}').status_code, 200)
+        self.assertEqual(anonymous.get('/media/thumbnails/poster.jpg').status_code, 200)
+
+    def test_full_file(self):
+        response = self.client.get(self.segment_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'video/mp2t')
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.segment_url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.data[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(response['Content-Length'], '10')
+        response = self.client.get(self.segment_url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-5:])
+        response = self.client.get(self.segment_url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_cache_headers_differ_for_segments_and_playlists(self):
+        self.assertIn('immutable', self.client.get(self.segment_url)['Cache-Control'])
+        self.assertEqual(self.client.get('/media/videos/hls/1/master.m3u8')['Cache-Control'], 'private, no-cache')
+        self.assertTrue(self.client.get('/media/thumbnails/poster.jpg')['Cache-Control'].startswith('public'))
+
+    def test_not_modified(self):
+        mtime = os.stat(os.path.join(self.media_root, 'videos/hls/1/master.m3u8')).st_mtime
+        response = self.client.get('/media/videos/hls/1/master.m3u8', HTTP_IF_MODIFIED_SINCE=http_date(mtime + 1))
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_and_outside_files(self):
+        self.assertEqual(self.client.get('/media/videos/missing.ts').status_code, 404)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/videos/hls').status_code, 404)
+
+    def test_public_prefix_cannot_be_escaped(self):
+        anonymous = APIClient()
+        for url in ('/media/thumbnails/../videos/hls/1/720p/segment_000.ts',
+                    '/media/thumbnails/%2e%2e/videos/hls/1/720p/segment_000.ts',
+                    '/media/thumbnails//poster.jpg', '/media/thumbnails/./poster.jpg'):
+            self.assertEqual(anonymous.get(url).status_code, 404, url)
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+        with override_settings(STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }):
+            self.assertEqual(anonymous.get('/media/thumbnails/%2e%2e/videos/hls/1/master.m3u8').status_code, 404)
+
+    def test_proxy_offload(self):
+        with override_settings(MEDIA_SERVE_MODE='x-accel-redirect'):
+            response = self.client.get(self.segment_url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/videos/hls/1/720p/segment_000.ts')
+        self.assertEqual(response.content, b'')
+        with override_settings(MEDIA_SERVE_MODE='x-sendfile'):
+            response = self.client.get(self.segment_url)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'videos/hls/1/720p/segment_000.ts'))
+        self.assertEqual(APIClient().get(self.segment_url).status_code, 401)
+
+
+class ParseRangeTestCase(APITestCase):
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=900-5000', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertIsNone(parse_range('bytes=0-1,5-9', 1000))
+        self.assertIsNone(parse_range(None, 1000))
+        self.assertFalse(parse_range('bytes=1000-', 1000))
+        self.assertFalse(parse_range('bytes=20-10', 1000))
@@ -1,6 +1,7 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
-from videoflix_videos.models import Video, UserVideoProgress
+from videoflix_videos.models import Video, UserVideoProgress, TranscodeJob
+from django.db import connection, IntegrityError, transaction
 from django.core.files.uploadedfile import SimpleUploadedFile
 import os
 
@@ -47,6 +48,51 @@ class VideoModelTestCase(TestCase):
         """Test that the uploaded video file exists"""
         self.assertTrue(os.path.exists(self.video.file.path))
 
+    def test_transcode_job_created_for_upload(self):
+        """Test creating a video queues exactly one transcode job"""
+        job = self.video.transcode_jobs.get()
+        self.assertEqual(job.state, TranscodeJob.QUEUED)
+        self.assertTrue(job.is_active)
+
+    def test_transcode_job_state_machine(self):
+        """Test only allowed state transitions are accepted"""
+        job = self.video.transcode_jobs.get()
+        with self.assertRaises(ValueError):
+            job.transition(TranscodeJob.DONE)
+        job.transition(TranscodeJob.PROBING)
+        job.transition(TranscodeJob.FAILED, error="probe failed")
+        self.assertFalse(job.is_active)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_transcode_job_dedupe_key(self):
+        """Test two active jobs with the same dedupe key are rejected"""
+        job = self.video.transcode_jobs.get()
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                TranscodeJob.objects.create(video=self.video, dedupe_key=job.dedupe_key)
+        job.transition(TranscodeJob.FAILED)
+        TranscodeJob.objects.create(video=self.video, dedupe_key=job.dedupe_key)
+
+    def test_progress_covering_constraint_is_unique(self):
+        """Test the covering progress constraint stays unique on every backend"""
+        UserVideoProgress.objects.create(user=self.user, video=self.video)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                UserVideoProgress.objects.create(user=self.user, video=self.video)
+        constraint = connection.introspection.get_constraints(
+            connection.cursor(), UserVideoProgress._meta.db_table,
+        )['unique_user_video_progress']
+        self.assertTrue(constraint['unique'])
+        self.assertEqual(constraint['columns'][:2], ['user_id', 'video_id'])
+
+    def test_transcode_job_progress_is_throttled(self):
+        """Test progress is only saved when it moved by a full percent"""
+        job = self.video.transcode_jobs.get()
+        job.report_progress(10.0)
+        job.report_progress(10.5)
+        job.refresh_from_db()
+        self.assertEqual(job.progress, 10.0)
+
     def tearDown(self):
         """Cleanup after tests"""
         if os.path.exists(self.video.file.path):
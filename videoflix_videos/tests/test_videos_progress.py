@@ -0,0 +1,236 @@
+from datetime import timedelta
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, IntegrityError, transaction
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils.timezone import now
+from rest_framework.test import APITestCase, APIClient
+from videoflix_videos.models import Video, UserVideoProgress
+from videoflix_videos.progress import DIRTY_KEY, buffer_progress, flush_progress, redis, sync_progress, upsert_progress
+from videoflix_videos.tasks import flush_progress_buffer
+
+
+class ProgressUpsertTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.video = Video.objects.create(title="Watched Video", file="videos/x.mp4", thumbnail="thumbnails/x.jpg")
+        self.url = f"/videoflix/api/video/{self.video.id}/progress/"
+
+    def test_heartbeat_is_one_upsert(self):
+        for position in (10, 20):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.patch(self.url, {"last_viewed_position": position, "viewed": False}, format="json")
+            self.assertEqual(response.data, {"last_viewed_position": position, "viewed": False})
+            statements = [q['sql'] for q in queries if q['sql'].startswith(('INSERT', 'UPDATE', 'SELECT'))]
+            self.assertEqual(len(statements), 1)
+            self.assertIn('ON CONFLICT', statements[0])
+        self.assertEqual(UserVideoProgress.objects.get().last_viewed_position, 20)
+
+    def test_partial_heartbeat_keeps_stored_fields(self):
+        UserVideoProgress.objects.create(user=self.user, video=self.video, last_viewed_position=10, viewed=True)
+        response = self.client.patch(self.url, {"last_viewed_position": 12}, format="json")
+        self.assertEqual(response.data, {"last_viewed_position": 12.0, "viewed": True})
+        self.assertEqual(UserVideoProgress.objects.count(), 1)
+
+    def test_heartbeat_for_missing_video(self):
+        response = self.client.patch("/videoflix/api/video/9999/progress/", {"last_viewed_position": 1}, format="json")
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(upsert_progress(self.user.id, 9999, {}))
+        self.assertFalse(UserVideoProgress.objects.exists())
+
+    def test_heartbeat_updates_etag(self):
+        etag = self.client.get("/videoflix/api/videos/")['ETag']
+        self.client.patch(self.url, {"last_viewed_position": 5}, format="json")
+        self.assertNotEqual(self.client.get("/videoflix/api/videos/")['ETag'], etag)
+
+    def test_duplicate_rows_are_rejected(self):
+        UserVideoProgress.objects.create(user=self.user, video=self.video)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UserVideoProgress.objects.create(user=self.user, video=self.video)
+
+
+@override_settings(PROGRESS_WRITE_BEHIND=True)
+class WriteBehindProgressTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.video = Video.objects.create(
+            title="Watched Video",
+            file=SimpleUploadedFile("test_video.mp4", b"dummy_video_data", content_type="video/mp4"),
+            thumbnail=SimpleUploadedFile("thumbnail.jpg", b"image_data", content_type="image/jpeg"),
+            genre="Action",
+        )
+        self.url = f"/videoflix/api/video/{self.video.id}/progress/"
+
+    def test_heartbeat_is_buffered_without_writes(self):
+        with self.assertNumQueries(1):
+            response = self.client.patch(self.url, {"last_viewed_position": 42.5, "viewed": False}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"last_viewed_position": 42.5, "viewed": False})
+        self.assertFalse(UserVideoProgress.objects.exists())
+
+    def test_partial_heartbeat_keeps_stored_fields(self):
+        UserVideoProgress.objects.create(user=self.user, video=self.video, last_viewed_position=10, viewed=True)
+        response = self.client.patch(self.url, {"last_viewed_position": 12}, format="json")
+        self.assertEqual(response.data, {"last_viewed_position": 12.0, "viewed": True})
+
+    def test_reads_see_buffered_progress(self):
+        UserVideoProgress.objects.create(user=self.user, video=self.video, last_viewed_position=10)
+        self.client.get("/videoflix/api/videos/")
+        self.client.patch(self.url, {"last_viewed_position": 99}, format="json")
+        response = self.client.get("/videoflix/api/videos/")
+        self.assertEqual(response.data['results'][0]['user_progress']['last_viewed_position'], 99.0)
+        response = self.client.get(f"/videoflix/api/videos/{self.video.id}/")
+        self.assertEqual(response.data['user_progress']['last_viewed_position'], 99.0)
+
+    def test_heartbeat_for_missing_video(self):
+        response = self.client.patch("/videoflix/api/video/9999/progress/", {"last_viewed_position": 1}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_flush_creates_and_updates_rows_in_bulk(self):
+        other = Video.objects.create(title="Other", file="videos/x.mp4", thumbnail="thumbnails/x.jpg")
+        UserVideoProgress.objects.create(user=self.user, video=self.video, last_viewed_position=10)
+        buffer_progress(self.user.id, self.video.id, {'last_viewed_position': 20.0})
+        buffer_progress(self.user.id, other.id, {'last_viewed_position': 5.0, 'viewed': True})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(flush_progress_buffer(), 2)
+        writes = [q['sql'] for q in queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(UserVideoProgress.objects.get(video=self.video).last_viewed_position, 20.0)
+        self.assertTrue(UserVideoProgress.objects.get(video=other).viewed)
+        self.assertEqual(redis().scard(DIRTY_KEY), 0)
+        self.assertEqual(flush_progress(), 0)
+
+    def test_flush_keeps_heartbeat_time(self):
+        heartbeat_at = now() - timedelta(minutes=5)
+        with patch('videoflix_videos.progress.now', return_value=heartbeat_at):
+            buffered = buffer_progress(self.user.id, self.video.id, {'last_viewed_position': 20.0})
+        self.assertEqual(buffered['last_viewed_at'], heartbeat_at)
+        flush_progress()
+        progress = UserVideoProgress.objects.get()
+        self.assertEqual(progress.last_viewed_at, buffered['last_viewed_at'])
+        self.assertEqual(progress.client_updated_at, buffered['last_viewed_at'])
+
+    def test_flush_keeps_newer_synced_progress(self):
+        with patch('videoflix_videos.progress.now', return_value=now() - timedelta(minutes=5)):
+            buffer_progress(self.user.id, self.video.id, {'last_viewed_position': 20.0})
+        with override_settings(PROGRESS_WRITE_BEHIND=False):
+            sync_progress(self.user.id, [{
+                'video_id': self.video.id, 'position': 80.0, 'viewed': False, 'client_ts': now() - timedelta(minutes=1),
+            }])
+        flush_progress()
+        self.assertEqual(UserVideoProgress.objects.get().last_viewed_position, 80.0)
+
+    def test_sync_compares_buffered_heartbeat(self):
+        buffer_progress(self.user.id, self.video.id, {'last_viewed_position': 20.0})
+        event = {'video_id': self.video.id, 'position': 10.0, 'viewed': False}
+        results = sync_progress(self.user.id, [event | {'client_ts': now() - timedelta(minutes=1)}])
+        self.assertEqual(results[self.video.id][0], 'stale')
+        self.assertEqual(results[self.video.id][1].last_viewed_position, 20.0)
+        self.assertFalse(UserVideoProgress.objects.exists())
+        results = sync_progress(self.user.id, [event | {'client_ts': now() + timedelta(minutes=1)}])
+        self.assertEqual(results[self.video.id][0], 'applied')
+        response = self.client.get(f"/videoflix/api/videos/{self.video.id}/")
+        self.assertEqual(response.data['user_progress']['last_viewed_position'], 10.0)
+        flush_progress()
+        self.assertEqual(UserVideoProgress.objects.get().last_viewed_position, 10.0)
+
+    def test_flush_drops_deleted_videos(self):
+        buffer_progress(self.user.id, self.video.id, {'last_viewed_position': 20.0})
+        self.video.delete()
+        self.assertEqual(flush_progress(), 1)
+        self.assertFalse(UserVideoProgress.objects.exists())
+
+    def test_failed_flush_keeps_entries_dirty(self):
+        buffer_progress(self.user.id, self.video.id, {'last_viewed_position': 20.0})
+        with patch('videoflix_videos.progress.write_progress', side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                flush_progress()
+        self.assertEqual(redis().scard(DIRTY_KEY), 1)
+        flush_progress()
+        self.assertEqual(UserVideoProgress.objects.get().last_viewed_position, 20.0)
+
+    def test_flush_refreshes_continue_watching(self):
+        url = "/videoflix/api/videos/continue/"
+        self.client.patch(self.url, {"last_viewed_position": 20, "viewed": False}, format="json")
+        self.assertEqual(self.client.get(url).data['results'], [])
+        flush_progress()
+        self.assertEqual(self.client.get(url).data['results'][0]['user_progress']['last_viewed_position'], 20.0)
+
+
+class ProgressSyncTestCase(APITestCase):
+    url = "/videoflix/api/video/progress/sync/"
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.videos = [
+            Video.objects.create(title=f"Video {i}", file="videos/x.mp4", thumbnail="thumbnails/x.jpg")
+            for i in range(3)
+        ]
+
+    def event(self, video, position, ts, viewed=False):
+        return {"video_id": video.id, "position": position, "viewed": viewed, "client_ts": f"2026-01-01T10:{ts:02d}:00Z"}
+
+    def test_batch_is_one_upsert(self):
+        events = [self.event(video, 10 * i, i) for i, video in enumerate(self.videos)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, events, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['results']], ['applied'] * 3)
+        self.assertEqual(response.data['results'][2]['progress'], {"last_viewed_position": 20.0, "viewed": False})
+        writes = [q['sql'] for q in queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(UserVideoProgress.objects.count(), 3)
+
+    def test_latest_client_timestamp_wins(self):
+        video = self.videos[0]
+        self.client.post(self.url, [self.event(video, 50, 30)], format="json")
+        response = self.client.post(self.url, [
+            self.event(video, 70, 40), self.event(video, 60, 35), self.event(self.videos[1], 5, 10),
+        ], format="json")
+        self.assertEqual([r['status'] for r in response.data['results']], ['applied', 'superseded', 'applied'])
+        response = self.client.post(self.url, [self.event(video, 10, 20, viewed=True)], format="json")
+        self.assertEqual(response.data['results'], [{
+            'video_id': video.id, 'status': 'stale', 'progress': {"last_viewed_position": 70.0, "viewed": False},
+        }])
+        self.assertEqual(UserVideoProgress.objects.get(video=video).last_viewed_position, 70.0)
+
+    def test_online_heartbeat_beats_older_events(self):
+        video = self.videos[0]
+        self.client.patch(f"/videoflix/api/video/{video.id}/progress/", {"last_viewed_position": 90}, format="json")
+        response = self.client.post(self.url, [self.event(video, 10, 0)], format="json")
+        self.assertEqual(response.data['results'][0]['status'], 'stale')
+
+    def test_invalid_and_missing_events(self):
+        response = self.client.post(self.url, [
+            {"video_id": self.videos[0].id, "position": -1},
+            self.event(self.videos[1], 5, 0) | {"video_id": 9999},
+            self.event(self.videos[2], 5, 0),
+        ], format="json")
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['invalid', 'not_found', 'applied'])
+        self.assertIn('position', results[0]['errors'])
+        self.assertEqual(UserVideoProgress.objects.count(), 1)
+
+    def test_rejects_non_list_and_oversized_batches(self):
+        self.assertEqual(self.client.post(self.url, {"video_id": 1}, format="json").status_code, 400)
+        with override_settings(PROGRESS_SYNC_MAX_EVENTS=1):
+            events = [self.event(video, 1, 0) for video in self.videos]
+            self.assertEqual(self.client.post(self.url, events, format="json").status_code, 400)
+
+    def test_sync_invalidates_continue_watching(self):
+        continue_url = "/videoflix/api/videos/continue/"
+        self.assertEqual(self.client.get(continue_url).data['results'], [])
+        self.client.post(self.url, [self.event(self.videos[0], 5, 0)], format="json")
+        self.assertEqual(len(self.client.get(continue_url).data['results']), 1)
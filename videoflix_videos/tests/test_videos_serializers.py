@@ -77,6 +77,18 @@ class VideoSerializerTestCase(TestCase):
         self.assertEqual(data["user_progress"], expected_progress)
 
 
+    def test_video_serializer_single_partial_hls(self):
+        """Test VideoSerializerSingle exposes which renditions are ready"""
+        self.video_with_hls.hls_renditions = ['240p', '360p']
+        self.video_with_hls.save()
+        request = self.factory.get("/")
+        request.user = self.user
+
+        data = VideoSerializerSingle(instance=self.video_with_hls, context={"request": request}).data
+
+        self.assertIsNotNone(data["hls_master_playlist_url"])
+        self.assertEqual(data["hls_status"], {"complete": False, "ready_renditions": ['240p', '360p']})
+
     def tearDown(self):
         """Cleanup created files"""
         for video in [self.video_no_hls, self.video_with_hls]:
@@ -12,11 +12,14 @@ class VideoSignalTestCase(TestCase):
         video_file = SimpleUploadedFile("test_video.mp4", b"dummy_video_data", content_type="video/mp4")
         thumbnail_file = SimpleUploadedFile("thumbnail.jpg", b"image_data", content_type="image/jpeg")
 
-        video = Video.objects.create(
-            title="Test Video",
-            file=video_file,
-            thumbnail=thumbnail_file,
-            description="Test Description",
-            genre="Action"
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            video = Video.objects.create(
+                title="Test Video",
+                file=video_file,
+                thumbnail=thumbnail_file,
+                description="Test Description",
+                genre="Action"
+            )
+            mock_convert_to_hls.assert_not_called()
         mock_convert_to_hls.assert_called_once_with(video.id)
+        self.assertEqual(video.transcode_jobs.get().task_id, str(mock_convert_to_hls.return_value.id))
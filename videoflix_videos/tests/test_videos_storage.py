@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+import time
+from urllib.parse import urljoin
+from unittest.mock import patch, MagicMock
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from videoflix_videos.models import Video
+from videoflix_videos.storage import SegmentUploader, is_local, local_original, playlist_uris
+from videoflix_videos.tasks import convert_to_hls, encode_hls_chunk
+
+# InMemoryStorage has no local paths, like S3 or MinIO.
+REMOTE_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+SOURCE_METADATA = {
+    'width': 1280, 'height': 720, 'frame_rate': 25.0, 'duration': 60.0,
+    'audio_channels': 2, 'audio_layout': 'stereo',
+}
+
+
+def write(path, content):
+    with open(path, 'w' if isinstance(content, str) else 'wb') as f:
+        f.write(content)
+
+
+class RemoteStorageTestCase(TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            STORAGES=REMOTE_STORAGES, HLS_WORK_DIR=self.work_dir, HLS_UPLOAD_POLL_INTERVAL=0.01,
+        )
+        self.settings_override.enable()
+        self.delay = patch('videoflix_videos.tasks.convert_to_hls.delay', return_value=MagicMock(id='task-1')).start()
+        self.addCleanup(patch.stopall)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.work_dir)
+
+    def test_storage_is_remote(self):
+        self.assertFalse(is_local())
+
+    def test_playlist_uris_skip_unterminated_line(self):
+        content = '#EXTM3U\n#EXTINF:4.0,\nsegment_0_000.ts\n#EXTINF:4.0,\nsegment_0_0'
+        self.assertEqual(playlist_uris(content), ['segment_0_000.ts'])
+
+    def test_segments_are_stored_while_encoding(self):
+        local_dir = tempfile.mkdtemp(dir=self.work_dir)
+        uploader = SegmentUploader(default_storage, local_dir, 'videos/hls/1')
+        uploader.start()
+        try:
+            write(os.path.join(local_dir, 'segment_0_000.ts'), b'first')
+            write(os.path.join(local_dir, 'variant_0.m3u8'), '#EXTM3U\n#EXTINF:4.0,\nsegment_0_000.ts\n')
+            deadline = time.monotonic() + 5
+            while not default_storage.exists('videos/hls/1/segment_0_000.ts') and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(default_storage.exists('videos/hls/1/segment_0_000.ts'))
+            self.assertFalse(default_storage.exists('videos/hls/1/variant_0.m3u8'))
+            write(os.path.join(local_dir, 'segment_0_001.ts'), b'second')
+            write(os.path.join(local_dir, 'variant_0.m3u8'),
+                  '#EXTM3U\n#EXTINF:4.0,\nsegment_0_000.ts\n#EXTINF:4.0,\nsegment_0_001.ts\n#EXT-X-ENDLIST\n')
+            uploader.flush()
+        finally:
+            uploader.stop()
+        with default_storage.open('videos/hls/1/segment_0_001.ts') as f:
+            self.assertEqual(f.read(), b'second')
+        with default_storage.open('videos/hls/1/variant_0.m3u8') as f:
+            self.assertIn(b'segment_0_001.ts', f.read())
+        self.assertEqual(os.listdir(local_dir), ['variant_0.m3u8'])
+
+    def test_original_is_downloaded_for_encoding(self):
+        video = Video.objects.create(title='Movie', file=ContentFile(b'original', name='movie.mp4'))
+        with local_original(video) as path:
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'original')
+        self.assertFalse(os.path.exists(path))
+
+    @override_settings(HLS_PROGRESSIVE_PUBLISH=False)
+    @patch('videoflix_videos.tasks.probe_video', return_value=SOURCE_METADATA)
+    @patch('videoflix_videos.tasks.run_ffmpeg')
+    def test_convert_to_hls_stores_output(self, mock_run, mock_probe):
+        def encode(cmd, *args, **kwargs):
+            output_dir = os.path.dirname(cmd[-1])
+            for v in range(4):
+                write(os.path.join(output_dir, f'segment_{v}_000.ts'), b'ts')
+                write(os.path.join(output_dir, f'variant_{v}.m3u8'), f'#EXTM3U\n#EXTINF:4.0,\nsegment_{v}_000.ts\n')
+            write(os.path.join(output_dir, 'master.m3u8'), '#EXTM3U\n')
+
+        mock_run.side_effect = encode
+        video = Video.objects.create(title='Movie', file=ContentFile(b'original', name='movie.mp4'))
+        convert_to_hls(video.id)
+        self.assertEqual(mock_probe.call_args[0][1], default_storage.url(video.file.name))
+        for name in ('master.m3u8', 'variant_3.m3u8', 'segment_0_000.ts', 'segment_3_000.ts'):
+            self.assertTrue(default_storage.exists(f'videos/hls/{video.id}/{name}'), name)
+        video.refresh_from_db()
+        self.assertTrue(video.hls_complete)
+        self.assertEqual(os.listdir(self.work_dir), [])
+
+    @patch('videoflix_videos.tasks.run_ffmpeg')
+    def test_chunk_encode_reads_original_url(self, mock_run):
+        def encode(cmd, *args, **kwargs):
+            output_dir = os.path.dirname(cmd[-1])
+            write(os.path.join(output_dir, 'chunk_001_segment_0_000.ts'), b'ts')
+            write(os.path.join(output_dir, 'chunk_001_variant_0.m3u8'), '#EXTM3U\n#EXTINF:4.0,\nchunk_001_segment_0_000.ts\n')
+
+        mock_run.side_effect = encode
+        video = Video.objects.create(title='Movie', file=ContentFile(b'original', name='movie.mp4'), **SOURCE_METADATA)
+        job = video.transcode_jobs.get()
+        with patch('videoflix_videos.storage.shutil.copyfileobj') as mock_download:
+            encode_hls_chunk(video.id, 1, 30.0, 30.0, job.id)
+        mock_download.assert_not_called()
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(cmd[1:7], ['-ss', '30.000', '-t', '30.000', '-i', default_storage.url(video.file.name)])
+        self.assertTrue(default_storage.exists(f'videos/hls/{video.id}/chunk_001_segment_0_000.ts'))
+
+    def test_media_view_redirects_to_storage(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='viewer', password='viewerpassword'))
+        response = client.get('/media/videos/hls/1/720p/segment_000.ts')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], default_storage.url('videos/hls/1/720p/segment_000.ts'))
+
+    def test_playlists_are_served_below_media(self):
+        default_storage.save('videos/hls/1/master.m3u8', ContentFile(
+            b'#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1000000,RESOLUTION=640x360\nvariant_0.m3u8\n'))
+        default_storage.save('videos/hls/1/variant_0.m3u8', ContentFile(
+            b'#EXTM3U\n#EXTINF:4.0,\nsegment_0_000.ts\n#EXT-X-ENDLIST\n'))
+        default_storage.save('videos/hls/1/segment_0_000.ts', ContentFile(b'ts'))
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='viewer', password='viewerpassword'))
+        url = '/media/videos/hls/1/master.m3u8'
+        for _ in range(2):
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/vnd.apple.mpegurl')
+            url = urljoin(url, playlist_uris(response.content.decode())[0])
+        self.assertEqual(url, '/media/videos/hls/1/segment_0_000.ts')
+        response = client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], default_storage.url('videos/hls/1/segment_0_000.ts'))
+        self.assertEqual(client.get('/media/videos/hls/1/variant_9.m3u8').status_code, 404)
+
+    def test_finalized_upload_is_moved_to_storage(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_superuser(username='admin', password='adminpassword'))
+        with override_settings(MEDIA_ROOT=media_root):
+            upload_id = client.post('/videoflix/api/videos/uploads/', {
+                'filename': 'movie.mp4', 'size': 8, 'title': 'Movie',
+            }, format='json').data['id']
+            client.generic('PATCH', f'/videoflix/api/videos/uploads/{upload_id}/', b'original',
+                           content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0')
+            video_id = client.post(f'/videoflix/api/videos/uploads/{upload_id}/finalize/').data['video_id']
+        video = Video.objects.get(id=video_id)
+        with default_storage.open(video.file.name) as f:
+            self.assertEqual(f.read(), b'original')
+        self.assertEqual(os.listdir(os.path.join(media_root, 'videos', 'originals')), [])
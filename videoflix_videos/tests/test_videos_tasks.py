@@ -1,9 +1,21 @@
-from django.test import TestCase
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
 from unittest.mock import patch, MagicMock
-from videoflix_videos.models import Video
-from videoflix_videos.tasks import convert_to_hls, test_celery_task
+from videoflix_videos.models import Video, TranscodeJob
+from videoflix_videos.tasks import (
+    convert_to_hls, encode_hls_chunk, stitch_hls_chunks, fail_transcode_job, start_transcode, test_celery_task,
+)
 from django.core.files.uploadedfile import SimpleUploadedFile
 import os
+import shutil
+import subprocess
+import tempfile
+
+SOURCE_METADATA = {
+    'width': 1280, 'height': 720, 'frame_rate': 25.0, 'duration': 60.0,
+    'audio_channels': 2, 'audio_layout': 'stereo',
+}
+
 
 class CeleryTasksTestCase(TestCase):
     def setUp(self):
@@ -16,24 +28,200 @@ class CeleryTasksTestCase(TestCase):
             genre="Action"
         )
 
-    @patch("videoflix_videos.tasks.subprocess.run")
+    @override_settings(HLS_PROGRESSIVE_PUBLISH=False)
+    @patch("videoflix_videos.tasks.probe_video", return_value=SOURCE_METADATA)
+    @patch("videoflix_videos.tasks.run_ffmpeg")
     @patch("os.makedirs") 
     @patch("builtins.open", new_callable=MagicMock) 
     @patch("videoflix_videos.tasks.logger")  
-    def test_convert_to_hls(self, mock_logger, mock_open, mock_makedirs, mock_subprocess):
-        """Test HLS conversion task with all dependencies mocked"""
+    def test_convert_to_hls(self, mock_logger, mock_open, mock_makedirs, mock_subprocess, mock_probe):
+        """Test single-pass HLS conversion decodes the source only once"""
         mock_subprocess.return_value = MagicMock()
         convert_to_hls(self.video.id)
         mock_makedirs.assert_called_once() 
-        self.assertEqual(mock_subprocess.call_count, 4) 
-        mock_open.assert_called_once_with(
-            os.path.join('videos', 'hls', str(self.video.id), 'master.m3u8'), 'w'
-        )
+        self.assertEqual(mock_subprocess.call_count, 1)
+        cmd = mock_subprocess.call_args[0][0]
+        self.assertEqual(cmd.count('-i'), 1)
+        self.assertIn('-var_stream_map', cmd)
+        self.assertIn('master.m3u8', cmd)
+        self.assertEqual(cmd[cmd.index('-var_stream_map') + 1].count('name:'), 4)
+        self.assertNotIn('scale=1920:1080', ' '.join(cmd))
+        mock_open.assert_not_called()
         mock_logger.info.assert_any_call(f"Starting HLS conversion for video ID: {self.video.id}")
         mock_logger.info.assert_any_call(f"Successfully completed HLS conversion for video ID: {self.video.id}")
 
         self.video.refresh_from_db()
         self.assertIsNotNone(self.video.hls_master_playlist)
+        self.assertEqual((self.video.width, self.video.height), (1280, 720))
+        self.assertEqual(self.video.audio_layout, 'stereo')
+        self.assertTrue(self.video.hls_complete)
+        self.assertEqual(self.video.hls_renditions, ['240p', '360p', '480p', '720p'])
+        job = self.video.transcode_jobs.get()
+        self.assertEqual(job.state, TranscodeJob.DONE)
+        self.assertEqual(job.progress, 100.0)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(set(job.renditions.values()), {'done'})
+
+    @override_settings(HLS_ENCODING_MODE='per_variant', HLS_CHUNKED_MIN_DURATION=0, HLS_PROGRESSIVE_PUBLISH=False)
+    @patch("videoflix_videos.tasks.probe_video", return_value=SOURCE_METADATA)
+    @patch("videoflix_videos.tasks.run_ffmpeg")
+    @patch("os.makedirs") 
+    @patch("os.replace")
+    @patch("builtins.open", new_callable=MagicMock) 
+    @patch("videoflix_videos.tasks.logger")  
+    def test_convert_to_hls_per_variant(self, mock_logger, mock_open, mock_replace, mock_makedirs, mock_subprocess, mock_probe):
+        """Test HLS conversion running one ffmpeg process per variant"""
+        mock_subprocess.return_value = MagicMock()
+        convert_to_hls(self.video.id)
+        self.assertEqual(mock_subprocess.call_count, 4) 
+        master = default_storage.path(f'videos/hls/{self.video.id}/master.m3u8')
+        mock_open.assert_called_once_with(f'{master}.tmp', 'w')
+        mock_replace.assert_called_once_with(f'{master}.tmp', master)
+
+        self.video.refresh_from_db()
+        self.assertIsNotNone(self.video.hls_master_playlist)
+
+    @patch("videoflix_videos.tasks.probe_video", return_value=SOURCE_METADATA)
+    @patch("videoflix_videos.tasks.run_ffmpeg")
+    @patch("videoflix_videos.storage.write_playlist")
+    @patch("os.makedirs")
+    def test_convert_to_hls_progressive(self, mock_makedirs, mock_write_playlist, mock_subprocess, mock_probe):
+        """Test priority renditions are published before the rest of the ladder"""
+        published = []
+        mock_subprocess.side_effect = lambda *args, **kwargs: published.append(
+            list(Video.objects.get(id=self.video.id).hls_renditions)
+        )
+        convert_to_hls(self.video.id)
+        self.assertEqual(mock_subprocess.call_count, 2)
+        self.assertEqual(published, [[], ['240p', '360p']])
+        first_cmd, second_cmd = [call[0][0] for call in mock_subprocess.call_args_list]
+        self.assertIn('split=2[v0][v1]', ' '.join(first_cmd))
+        self.assertNotIn('-master_pl_name', first_cmd)
+        self.assertIn('split=2[v0][v1]', ' '.join(second_cmd))
+        self.assertEqual(second_cmd[second_cmd.index('-var_stream_map') + 1], 'v:0,a:0,name:2 v:1,a:1,name:3')
+        masters = [call[0][1] for call in mock_write_playlist.call_args_list]
+        self.assertEqual([m.count('#EXT-X-STREAM-INF') for m in masters], [2, 4])
+        self.video.refresh_from_db()
+        self.assertTrue(self.video.hls_complete)
+        self.assertEqual(self.video.hls_master_playlist.name, f"videos/hls/{self.video.id}/master.m3u8")
+
+    @override_settings(HLS_CHUNKED_MIN_DURATION=600, HLS_CHUNK_SECONDS=120)
+    @patch("videoflix_videos.tasks.chord")
+    @patch("videoflix_videos.tasks.probe_keyframes", return_value=[0.0, 118.0, 241.0, 362.0, 481.0, 598.0, 719.0])
+    @patch("videoflix_videos.tasks.probe_video", return_value=dict(SOURCE_METADATA, duration=720.0))
+    @patch("videoflix_videos.tasks.run_ffmpeg")
+    @patch("os.makedirs")
+    def test_convert_to_hls_long_video_is_chunked(self, mock_makedirs, mock_subprocess, mock_probe, mock_keyframes, mock_chord):
+        """Test long sources are fanned out as a chord of chunk encodes"""
+        convert_to_hls(self.video.id)
+        mock_subprocess.assert_not_called()
+        header = mock_chord.call_args[0][0]
+        self.assertEqual(len(header.tasks), 6)
+        job = self.video.transcode_jobs.get()
+        self.assertEqual(header.tasks[1].args, (self.video.id, 1, 0.0 + 118.0, 241.0 - 118.0, job.id))
+        callback = mock_chord.return_value.call_args[0][0]
+        self.assertEqual(callback.args, (self.video.id, 6, job.id))
+        self.assertEqual(callback.options['link_error'][0]['args'], (job.id,))
+        self.assertEqual(job.state, TranscodeJob.ENCODING)
+
+    @patch("videoflix_videos.tasks.run_ffmpeg")
+    @patch("os.makedirs")
+    def test_encode_hls_chunk(self, mock_makedirs, mock_subprocess):
+        """Test a chunk encode seeks to its range and prefixes its outputs"""
+        Video.objects.filter(id=self.video.id).update(width=1280, height=720, frame_rate=25.0, audio_channels=2, duration=600.0)
+        job = self.video.transcode_jobs.get()
+        self.assertEqual(encode_hls_chunk(self.video.id, 2, 240.0, 120.0, job.id), 2)
+        job.refresh_from_db()
+        self.assertEqual(job.progress, 19.0)
+        cmd = mock_subprocess.call_args[0][0]
+        self.assertEqual(cmd[1:5], ['-ss', '240.000', '-t', '120.000'])
+        self.assertIn('-output_ts_offset', cmd)
+        self.assertNotIn('-master_pl_name', cmd)
+        self.assertTrue(cmd[-1].endswith('chunk_002_variant_%v.m3u8'))
+
+    def test_stitch_hls_chunks(self):
+        """Test chunk playlists are joined into variant and master playlists"""
+        Video.objects.filter(id=self.video.id).update(width=1280, height=720)
+        job = self.video.transcode_jobs.get()
+        TranscodeJob.objects.filter(id=job.id).update(state=TranscodeJob.ENCODING)
+        output_dir = default_storage.path(f'videos/hls/{self.video.id}')
+        os.makedirs(output_dir, exist_ok=True)
+        try:
+            for i in range(2):
+                for v in range(4):
+                    with open(os.path.join(output_dir, f'chunk_00{i}_variant_{v}.m3u8'), 'w') as f:
+                        f.write(f"#EXTM3U\n#EXTINF:5.0,\nchunk_00{i}_segment_{v}_000.ts\n#EXT-X-ENDLIST")
+            stitch_hls_chunks([0, 1], self.video.id, 2, job.id)
+            with open(os.path.join(output_dir, 'variant_0.m3u8')) as f:
+                content = f.read()
+            self.assertIn('chunk_000_segment_0_000.ts', content)
+            self.assertIn('chunk_001_segment_0_000.ts', content)
+            self.assertEqual(content.count('#EXT-X-ENDLIST'), 1)
+            self.assertFalse(os.path.exists(os.path.join(output_dir, 'chunk_000_variant_0.m3u8')))
+            self.video.refresh_from_db()
+            self.assertEqual(self.video.hls_master_playlist.name, f"videos/hls/{self.video.id}/master.m3u8")
+            self.assertTrue(self.video.hls_complete)
+            job.refresh_from_db()
+            self.assertEqual(job.state, TranscodeJob.DONE)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    @override_settings(HLS_PROGRESSIVE_PUBLISH=False)
+    @patch("videoflix_videos.tasks.probe_video", return_value=SOURCE_METADATA)
+    @patch("videoflix_videos.tasks.run_ffmpeg", side_effect=subprocess.CalledProcessError(1, 'ffmpeg', stderr='boom'))
+    @patch("os.makedirs")
+    def test_convert_to_hls_failure_is_retried(self, mock_makedirs, mock_run, mock_probe):
+        """Test a failed attempt is recorded and queued for retry instead of swallowed"""
+        with self.assertRaises(subprocess.CalledProcessError):
+            convert_to_hls(self.video.id)
+        job = self.video.transcode_jobs.get()
+        self.assertEqual(job.state, TranscodeJob.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('returned non-zero exit status 1', job.error)
+        self.assertEqual(set(job.renditions.values()), {'failed'})
+
+    @override_settings(HLS_PROGRESSIVE_PUBLISH=False)
+    @patch("videoflix_videos.tasks.probe_video", return_value=SOURCE_METADATA)
+    @patch("videoflix_videos.tasks.run_ffmpeg", side_effect=subprocess.CalledProcessError(1, 'ffmpeg'))
+    @patch("os.makedirs")
+    def test_convert_to_hls_fails_after_last_retry(self, mock_makedirs, mock_run, mock_probe):
+        """Test the job fails once no retries remain"""
+        with patch.object(convert_to_hls, 'max_retries', 0):
+            with self.assertRaises(subprocess.CalledProcessError):
+                convert_to_hls(self.video.id)
+        job = self.video.transcode_jobs.get()
+        self.assertEqual(job.state, TranscodeJob.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    @patch("videoflix_videos.tasks.run_ffmpeg")
+    def test_convert_to_hls_skips_job_owned_by_other_run(self, mock_run):
+        """Test a duplicate delivery does not encode the video a second time"""
+        TranscodeJob.objects.filter(video=self.video).update(state=TranscodeJob.ENCODING)
+        convert_to_hls(self.video.id)
+        mock_run.assert_not_called()
+        self.assertEqual(self.video.transcode_jobs.get().attempts, 0)
+
+    @patch("videoflix_videos.tasks.convert_to_hls.delay")
+    def test_start_transcode_is_deduplicated(self, mock_delay):
+        """Test no second job is queued while one is active"""
+        job = start_transcode(self.video)
+        self.assertEqual(job, self.video.transcode_jobs.get())
+        mock_delay.assert_not_called()
+        TranscodeJob.objects.filter(id=job.id).update(state=TranscodeJob.DONE)
+        with self.captureOnCommitCallbacks(execute=True):
+            new_job = start_transcode(self.video)
+        self.assertNotEqual(new_job, job)
+        mock_delay.assert_called_once_with(self.video.id)
+
+    def test_fail_transcode_job(self):
+        """Test the chord error callback marks the job failed"""
+        job = self.video.transcode_jobs.get()
+        TranscodeJob.objects.filter(id=job.id).update(state=TranscodeJob.ENCODING, renditions={'240p': 'encoding'})
+        fail_transcode_job(MagicMock(), RuntimeError('chunk 3 failed'), None, job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, TranscodeJob.FAILED)
+        self.assertEqual(job.error, 'chunk 3 failed')
+        self.assertEqual(job.renditions, {'240p': 'failed'})
 
     def test_test_celery_task(self):
         """Test a simple Celery task"""
@@ -44,3 +232,64 @@ class CeleryTasksTestCase(TestCase):
         """Cleanup after tests"""
         if os.path.exists(self.video.file.path):
             os.remove(self.video.file.path)
+
+
+class ContentDedupeTestCase(TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.workdir)
+        self.settings_override.enable()
+        self.delay = patch("videoflix_videos.tasks.convert_to_hls.delay", return_value=MagicMock(id='task-1')).start()
+        self.addCleanup(patch.stopall)
+        self.source = self.create_video(content_hash='a' * 64)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.workdir)
+
+    def create_video(self, **fields):
+        return Video.objects.create(
+            title="Test Video", file=SimpleUploadedFile("test_video.mp4", b"dummy_video_data"), **fields,
+        )
+
+    def publish_source(self):
+        os.makedirs(os.path.join(self.workdir, f"videos/hls/{self.source.id}"))
+        with open(os.path.join(self.workdir, f"videos/hls/{self.source.id}/master.m3u8"), 'w') as f:
+            f.write("#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1000000,RESOLUTION=640x360\nvariant_0.m3u8")
+        Video.objects.filter(id=self.source.id).update(
+            hls_master_playlist=f"videos/hls/{self.source.id}/master.m3u8",
+            hls_renditions=['360p'], hls_complete=True, **SOURCE_METADATA,
+        )
+
+    def test_duplicate_reuses_original_and_hls_output(self):
+        """Test an identical upload is published from the existing output without encoding"""
+        self.publish_source()
+        self.delay.reset_mock()
+        video = self.create_video(content_hash='a' * 64)
+        video.refresh_from_db()
+        self.delay.assert_not_called()
+        self.assertEqual(video.file.name, self.source.file.name)
+        self.assertEqual(os.listdir(os.path.join(self.workdir, 'videos', 'originals')), ['test_video.mp4'])
+        self.assertTrue(video.hls_complete)
+        self.assertEqual((video.hls_renditions, video.width), (['360p'], 1280))
+        with open(os.path.join(self.workdir, f"videos/hls/{video.id}/master.m3u8")) as f:
+            self.assertIn(f"../{self.source.id}/variant_0.m3u8", f.read())
+        job = video.transcode_jobs.get()
+        self.assertEqual((job.state, job.renditions), (TranscodeJob.DONE, {'360p': 'done'}))
+
+    def test_duplicate_of_unfinished_video_is_converted(self):
+        """Test an identical upload shares the original but is still converted"""
+        with self.captureOnCommitCallbacks(execute=True):
+            video = self.create_video(content_hash='a' * 64)
+        video.refresh_from_db()
+        self.assertEqual(video.file.name, self.source.file.name)
+        self.delay.assert_called_with(video.id)
+
+    def test_different_hash_is_converted(self):
+        """Test uploads with another or no hash are converted from their own original"""
+        self.publish_source()
+        for content_hash in ('b' * 64, ''):
+            with self.captureOnCommitCallbacks(execute=True):
+                video = self.create_video(content_hash=content_hash)
+            self.assertNotEqual(video.file.name, self.source.file.name)
+            self.delay.assert_called_with(video.id)
@@ -0,0 +1,194 @@
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest.mock import patch, MagicMock
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError
+from django.test import override_settings
+from django.utils.timezone import now
+from datetime import timedelta
+from rest_framework.test import APITestCase
+from videoflix_videos import uploads
+from videoflix_videos.models import Video, UploadSession
+from videoflix_videos.tasks import purge_stale_uploads
+
+
+class UploadSessionTestCase(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.delay = patch('videoflix_videos.tasks.convert_to_hls.delay', return_value=MagicMock(id='task-1')).start()
+        self.addCleanup(patch.stopall)
+        uploads.hashers.clear()
+        self.admin = User.objects.create_superuser(username='admin', password='adminpassword')
+        self.client.force_authenticate(user=self.admin)
+        self.data = os.urandom(3000)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def create(self, **extra):
+        body = {'filename': 'movie.mp4', 'size': len(self.data), 'title': 'Movie', 'genre': 'Drama', **extra}
+        return self.client.post('/videoflix/api/videos/uploads/', body, format='json')
+
+    def send(self, upload_id, offset, chunk, checksum=None):
+        headers = {'HTTP_UPLOAD_OFFSET': str(offset)}
+        if checksum is not None:
+            headers['HTTP_UPLOAD_CHECKSUM'] = f"sha256 {base64.b64encode(checksum).decode()}"
+        return self.client.generic('PATCH', f'/videoflix/api/videos/uploads/{upload_id}/', chunk,
+                                   content_type='application/offset+octet-stream', **headers)
+
+    def test_chunks_are_written_in_place(self):
+        response = self.create()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Upload-Offset'], '0')
+        self.assertTrue(response['Location'].endswith(f"/videoflix/api/videos/uploads/{response.data['id']}/"))
+        upload_id = response.data['id']
+        response = self.send(upload_id, 0, self.data[:1000])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], '1000')
+        self.send(upload_id, 1000, self.data[1000:])
+        session = UploadSession.objects.get(id=upload_id)
+        self.assertEqual(session.offset, len(self.data))
+        with open(os.path.join(self.media_root, session.path), 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_resume_from_reported_offset(self):
+        upload_id = self.create().data['id']
+        self.send(upload_id, 0, self.data[:1200])
+        response = self.client.head(f'/videoflix/api/videos/uploads/{upload_id}/')
+        self.assertEqual(response['Upload-Offset'], '1200')
+        self.assertEqual(response['Upload-Length'], str(len(self.data)))
+        self.assertEqual(self.send(upload_id, 1200, self.data[1200:]).status_code, 204)
+
+    def test_wrong_offset_conflicts(self):
+        upload_id = self.create().data['id']
+        self.send(upload_id, 0, self.data[:1000])
+        response = self.send(upload_id, 500, self.data[500:1500])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(UploadSession.objects.get(id=upload_id).offset, 1000)
+
+    def test_locked_upload_conflicts(self):
+        upload_id = self.create().data['id']
+        finalize_url = f'/videoflix/api/videos/uploads/{upload_id}/finalize/'
+        lock = patch.object(UploadSession.objects, 'select_for_update')
+        with lock as mock_lock:
+            mock_lock.return_value.get.side_effect = OperationalError('could not obtain lock on row')
+            self.assertEqual(self.send(upload_id, 0, self.data).status_code, 409)
+        mock_lock.assert_called_once_with(nowait=True)
+        self.assertEqual(UploadSession.objects.get(id=upload_id).offset, 0)
+        self.assertEqual(self.send(upload_id, 0, self.data).status_code, 204)
+        with lock as mock_lock:
+            mock_lock.return_value.get.side_effect = OperationalError('could not obtain lock on row')
+            self.assertEqual(self.client.post(finalize_url).status_code, 409)
+        self.assertEqual(self.client.post(finalize_url).status_code, 201)
+
+    def test_chunk_beyond_size_is_rejected(self):
+        upload_id = self.create().data['id']
+        self.assertEqual(self.send(upload_id, 0, self.data + b'extra').status_code, 400)
+
+    def test_bad_chunk_checksum_keeps_offset(self):
+        upload_id = self.create().data['id']
+        response = self.send(upload_id, 0, self.data[:1000], checksum=hashlib.sha256(b'other').digest())
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(UploadSession.objects.get(id=upload_id).offset, 0)
+        chunk = self.data[:1000]
+        response = self.send(upload_id, 0, chunk, checksum=hashlib.sha256(chunk).digest())
+        self.assertEqual(response.status_code, 204)
+        self.send(upload_id, 1000, self.data[1000:])
+        response = self.client.post(f'/videoflix/api/videos/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.data['sha256'], hashlib.sha256(self.data).hexdigest())
+
+    def test_hash_state_is_rebuilt_from_disk(self):
+        upload_id = self.create(sha256=hashlib.sha256(self.data).hexdigest()).data['id']
+        self.send(upload_id, 0, self.data[:1000])
+        uploads.hashers.clear()
+        self.send(upload_id, 1000, self.data[1000:])
+        uploads.hashers.clear()
+        response = self.client.post(f'/videoflix/api/videos/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 201)
+
+    def test_finalize_creates_video_and_starts_transcode(self):
+        upload_id = self.create().data['id']
+        self.send(upload_id, 0, self.data)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(f'/videoflix/api/videos/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 201)
+        self.delay.assert_not_called()
+        for callback in callbacks:
+            callback()
+        video = Video.objects.get(id=response.data['video_id'])
+        session = UploadSession.objects.get(id=upload_id)
+        self.assertEqual(video.file.name, session.path)
+        self.assertEqual((video.title, video.genre), ('Movie', 'Drama'))
+        self.assertEqual(session.state, UploadSession.COMPLETE)
+        self.assertEqual(session.sha256, hashlib.sha256(self.data).hexdigest())
+        self.assertIsNotNone(response.data['job_id'])
+        self.delay.assert_called_once_with(video.id)
+        response = self.client.post(f'/videoflix/api/videos/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 409)
+
+    def test_finalize_rejects_incomplete_or_mismatching_uploads(self):
+        upload_id = self.create(sha256='0' * 64).data['id']
+        self.send(upload_id, 0, self.data[:1000])
+        self.assertEqual(self.client.post(f'/videoflix/api/videos/uploads/{upload_id}/finalize/').status_code, 409)
+        self.send(upload_id, 1000, self.data[1000:])
+        self.assertEqual(self.client.post(f'/videoflix/api/videos/uploads/{upload_id}/finalize/').status_code, 400)
+        self.assertFalse(Video.objects.exists())
+
+    def test_abort_and_purge_delete_partial_files(self):
+        upload_id = self.create().data['id']
+        path = os.path.join(self.media_root, UploadSession.objects.get(id=upload_id).path)
+        self.assertEqual(self.client.delete(f'/videoflix/api/videos/uploads/{upload_id}/').status_code, 204)
+        self.assertFalse(os.path.exists(path))
+        stale_id = self.create().data['id']
+        UploadSession.objects.filter(id=stale_id).update(updated_at=now() - timedelta(days=2))
+        self.create()
+        self.assertEqual(purge_stale_uploads(), 1)
+        self.assertFalse(UploadSession.objects.filter(id=stale_id).exists())
+
+    def test_size_limit_and_admin_only(self):
+        with override_settings(UPLOAD_MAX_SIZE=100):
+            self.assertEqual(self.create().status_code, 400)
+        user = User.objects.create_user(username='viewer', password='viewerpassword')
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.create().status_code, 403)
+
+
+class UploadHashTestCase(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        patch('videoflix_videos.tasks.convert_to_hls.delay', return_value=MagicMock(id='task-1')).start()
+        self.addCleanup(patch.stopall)
+        self.client.force_authenticate(user=User.objects.create_superuser(username='admin', password='adminpassword'))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_upload_stores_sha256_of_original(self):
+        data = os.urandom(5000)
+        response = self.client.post('/videoflix/api/videos/upload/', {
+            'title': 'Movie',
+            'file': SimpleUploadedFile('movie.mp4', data, content_type='video/mp4'),
+            'thumbnail': SimpleUploadedFile('poster.jpg', b'jpeg', content_type='image/jpeg'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Video.objects.get(id=response.data['video_id']).content_hash, hashlib.sha256(data).hexdigest())
+
+    def test_finalized_upload_stores_sha256(self):
+        data = os.urandom(3000)
+        upload_id = self.client.post('/videoflix/api/videos/uploads/', {
+            'filename': 'movie.mp4', 'size': len(data), 'title': 'Movie',
+        }, format='json').data['id']
+        self.client.generic('PATCH', f'/videoflix/api/videos/uploads/{upload_id}/', data,
+                            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0')
+        video_id = self.client.post(f'/videoflix/api/videos/uploads/{upload_id}/finalize/').data['video_id']
+        self.assertEqual(Video.objects.get(id=video_id).content_hash, hashlib.sha256(data).hexdigest())
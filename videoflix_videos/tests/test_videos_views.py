@@ -1,9 +1,12 @@
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
-from videoflix_videos.models import Video, UserVideoProgress
+from videoflix_videos.models import Video, UserVideoProgress, TranscodeJob
+from unittest.mock import patch
 from django.core.files.uploadedfile import SimpleUploadedFile
 import os
+from django.core.cache import cache
+from videoflix_videos.cache import bump_catalogue_version
 
 class VideoAPITestCase(APITestCase):
     def setUp(self):
@@ -28,6 +31,43 @@ class VideoAPITestCase(APITestCase):
             viewed=True
         )
 
+    @patch("videoflix_videos.tasks.convert_to_hls.delay")
+    def test_upload_video_queues_one_conversion(self, mock_delay):
+        """Test an upload is transcoded once and reports its job"""
+        admin_user = User.objects.create_superuser(username='adminuser', password='adminpassword')
+        self.client.force_authenticate(user=admin_user)
+        mock_delay.return_value.id = "task-1"
+
+        data = {
+            "title": "New Test Video",
+            "file": SimpleUploadedFile("new_test.mp4", b"video_data", content_type="video/mp4"),
+            "thumbnail": SimpleUploadedFile("thumbnail.jpg", b"image_data", content_type="image/jpeg"),
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/videoflix/api/videos/upload/", data, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_delay.assert_called_once_with(response.data["video_id"])
+        job = TranscodeJob.objects.get(id=response.data["job_id"])
+        self.assertEqual(job.task_id, "task-1")
+        video = Video.objects.get(id=response.data["video_id"])
+        self.assertEqual(job.video, video)
+        for file in [video.file, video.thumbnail]:
+            file.delete(save=False)
+
+    def test_transcode_job_status(self):
+        """Test admins can poll the transcode job of a video"""
+        admin_user = User.objects.create_superuser(username='adminuser', password='adminpassword')
+        self.client.force_authenticate(user=admin_user)
+        response = self.client.get(f"/videoflix/api/videos/{self.video.id}/transcode/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["state"], TranscodeJob.QUEUED)
+        self.assertEqual(response.data["progress"], 0.0)
+
+    def test_transcode_job_status_requires_admin(self):
+        """Test regular users cannot see transcode jobs"""
+        response = self.client.get(f"/videoflix/api/videos/{self.video.id}/transcode/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_upload_video_as_admin(self):
         """Test uploading a new video as an admin"""
         admin_user = User.objects.create_superuser(username='adminuser', password='adminpassword')
@@ -52,6 +92,86 @@ class VideoAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertGreater(len(response.data), 0)
 
+    def test_list_videos_query_count_is_constant(self):
+        """Listing videos takes the same number of queries for any catalogue size"""
+        url = "/videoflix/api/videos/"
+        for total in (5, 50):
+            Video.objects.bulk_create([
+                Video(title=f"Video {i}", file="videos/x.mp4", description="", genre="Drama")
+                for i in range(total - Video.objects.count())
+            ])
+            UserVideoProgress.objects.bulk_create([
+                UserVideoProgress(user=self.user, video=video, last_viewed_position=1)
+                for video in Video.objects.filter(user_progress__isnull=True)
+            ])
+            bump_catalogue_version()
+            with self.assertNumQueries(2):
+                response = self.client.get(url, {'page_size': 100})
+            self.assertEqual(len(response.data['results']), total)
+            with self.assertNumQueries(1):
+                self.client.get(url, {'page_size': 100})
+        self.assertEqual(response.data['results'][-1]['user_progress']['last_viewed_position'], 30)
+
+    def create_catalogue(self, total, uploaded_at=None):
+        Video.objects.bulk_create([
+            Video(title=f"Catalogue {i}", file="videos/x.mp4", description="", genre="Drama" if i % 2 else "Comedy")
+            for i in range(total)
+        ])
+        if uploaded_at:
+            Video.objects.update(uploaded_at=uploaded_at)
+        bump_catalogue_version()
+
+    def test_list_videos_keyset_pages(self):
+        """Pages follow each other without gaps or repeats, also for equal timestamps"""
+        from django.utils.timezone import now
+        self.create_catalogue(9, uploaded_at=now())
+        url = "/videoflix/api/videos/?page_size=4"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 4)
+            seen += [video['id'] for video in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, sorted(Video.objects.values_list('id', flat=True), reverse=True))
+
+    def test_list_videos_cursor_is_a_row_comparison(self):
+        """The cursor is applied as one (uploaded_at, id) range bound"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.utils.timezone import now
+        from datetime import timedelta
+        self.create_catalogue(5)
+        for i, video in enumerate(Video.objects.order_by('id')):
+            Video.objects.filter(id=video.id).update(uploaded_at=now() - timedelta(minutes=i // 2))
+        bump_catalogue_version()
+        next_url = self.client.get("/videoflix/api/videos/", {'page_size': 3}).data['next']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(next_url)
+        expected = list(Video.objects.order_by('-uploaded_at', '-id').values_list('id', flat=True))[3:]
+        self.assertEqual([video['id'] for video in response.data['results']], expected)
+        self.assertTrue(any('"uploaded_at", "videoflix_videos_video"."id") < (' in q['sql'] for q in queries))
+
+    def test_list_videos_filters(self):
+        """Videos can be filtered by genre and searched by title"""
+        self.create_catalogue(6)
+        response = self.client.get("/videoflix/api/videos/", {'genre': 'Comedy'})
+        self.assertEqual({video['genre'] for video in response.data['results']}, {'Comedy'})
+        self.assertEqual(len(response.data['results']), 3)
+        response = self.client.get("/videoflix/api/videos/", {'search': 'test vid'})
+        self.assertEqual([video['id'] for video in response.data['results']], [self.video.id])
+
+    def test_list_videos_grid_fields(self):
+        """The grid field set leaves out the heavy fields"""
+        response = self.client.get("/videoflix/api/videos/", {'fields': 'grid'})
+        video = response.data['results'][0]
+        self.assertEqual(set(video), {'id', 'title', 'thumbnail', 'thumbnail_webp', 'genre', 'uploaded_at', 'user_progress'})
+        self.assertEqual(video['user_progress']['last_viewed_position'], 30)
+
+    def test_list_videos_invalid_cursor(self):
+        response = self.client.get("/videoflix/api/videos/", {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_list_videos_unauthenticated(self):
         """Test retrieving a list of videos fails when unauthenticated"""
         self.client.logout()
@@ -111,3 +231,51 @@ class VideoAPITestCase(APITestCase):
         for file in [self.video.file, self.video.thumbnail]:
             if file and hasattr(file, 'path') and os.path.exists(file.path):
                 os.remove(file.path)
+
+
+class ContinueWatchingTestCase(APITestCase):
+    url = "/videoflix/api/videos/continue/"
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.videos = [
+            Video.objects.create(title=f"Video {i}", file="videos/x.mp4", thumbnail="thumbnails/x.jpg")
+            for i in range(4)
+        ]
+
+    def watch(self, video, position, viewed=False):
+        return self.client.patch(f"/videoflix/api/video/{video.id}/progress/",
+                                 {"last_viewed_position": position, "viewed": viewed}, format="json")
+
+    def test_lists_unfinished_videos_most_recent_first(self):
+        self.watch(self.videos[0], 10)
+        self.watch(self.videos[1], 20, viewed=True)
+        self.watch(self.videos[2], 30)
+        self.watch(self.videos[3], 0)
+        other = User.objects.create_user(username='other', password='testpassword')
+        UserVideoProgress.objects.create(user=other, video=self.videos[3], last_viewed_position=5)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([v['id'] for v in response.data['results']], [self.videos[2].id, self.videos[0].id])
+        self.assertEqual(response.data['results'][0]['user_progress'], {"last_viewed_position": 30.0, "viewed": False})
+        self.assertEqual(len(self.client.get(self.url, {'limit': 1}).data['results']), 1)
+
+    def test_cached_per_user_until_progress_changes(self):
+        self.watch(self.videos[0], 10)
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 1)
+        self.watch(self.videos[1], 10)
+        self.assertEqual(len(self.client.get(self.url).data['results']), 2)
+        self.watch(self.videos[1], 50, viewed=True)
+        self.assertEqual([v['id'] for v in self.client.get(self.url).data['results']], [self.videos[0].id])
+
+    def test_not_modified(self):
+        self.watch(self.videos[0], 10)
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -0,0 +1,334 @@
+"""
+Resumable chunked uploads of original videos, modelled on the tus protocol.
+
+An upload is created with its total size, then the file is sent in chunks
+with ``PATCH`` requests that carry the current ``Upload-Offset``. Every chunk
+is written with ``os.pwrite`` straight into the final file below
+``videos/originals/``, so nothing is buffered in memory or copied again, and
+a dropped connection only loses the chunk in flight: the client asks for the
+offset with ``HEAD`` and continues from there. With a remote storage the
+file is assembled below MEDIA_ROOT the same way and moved to the storage
+when the upload is finalized.
+
+The SHA-256 of the file is computed while the chunks arrive. The hash state
+of recent uploads is kept in the process; if a chunk lands on another
+process, the state is rebuilt once from the bytes already on disk. A chunk
+may carry an ``Upload-Checksum: sha256 <base64>`` header, which is verified
+before the offset moves on.
+
+Regular multipart uploads are hashed on the fly as well, by
+HashingUploadHandler.
+"""
+
+from collections import OrderedDict
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import OperationalError, transaction
+from django.utils.text import get_valid_filename
+from rest_framework.exceptions import APIException, ValidationError
+from videoflix_videos.models import Video, UploadSession
+from videoflix_videos.storage import is_local
+import base64
+import hashlib
+import os
+import threading
+import logging
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1024 * 1024
+HASH_CACHE_SIZE = 64
+
+hashers = OrderedDict()
+hashers_lock = threading.Lock()
+
+
+class OffsetConflict(APIException):
+    status_code = 409
+    default_detail = 'Upload-Offset does not match the offset of the upload.'
+    default_code = 'offset_conflict'
+
+
+class ChecksumMismatch(APIException):
+    status_code = 460
+    default_detail = 'Checksum mismatch.'
+    default_code = 'checksum_mismatch'
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Compute the SHA-256 of each uploaded file while it is received.
+
+    The handler runs first in FILE_UPLOAD_HANDLERS and passes every chunk on
+    to the handler that stores it, so the file is not read a second time.
+    The hex digests are put on the request by field name, see
+    uploaded_sha256.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.hasher = None
+        if request is not None:
+            request.upload_sha256 = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.request is not None:
+            self.request.upload_sha256[self.field_name] = self.hasher.hexdigest()
+        return None
+
+
+def uploaded_sha256(request, field_name):
+    """
+    Return the SHA-256 in hex of the file uploaded in a field, or ''.
+    """
+
+    return getattr(request, 'upload_sha256', {}).get(field_name, '')
+
+
+def full_path(session):
+    return os.path.join(settings.MEDIA_ROOT, session.path)
+
+
+def create_upload(user, filename, size, title, description='', genre='', sha256=''):
+    """
+    Start an upload and create its empty file.
+
+    Args:
+        user (User): The admin uploading the video.
+        filename (str): The original file name.
+        size (int): The total size of the file in bytes.
+        title, description, genre (str): The fields of the video to create.
+        sha256 (str): The expected SHA-256 of the file in hex, if known.
+
+    Returns:
+        UploadSession: The new upload.
+    """
+
+    if size > settings.UPLOAD_MAX_SIZE:
+        raise ValidationError({'size': f'Uploads are limited to {settings.UPLOAD_MAX_SIZE} bytes.'})
+    session = UploadSession(
+        user=user, filename=filename, size=size, title=title, description=description,
+        genre=genre, expected_sha256=sha256.lower(),
+    )
+    session.path = f"videos/originals/{session.id.hex}_{get_valid_filename(os.path.basename(filename))}"
+    os.makedirs(os.path.dirname(full_path(session)), exist_ok=True)
+    os.close(os.open(full_path(session), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+    session.save()
+    return session
+
+
+def get_hasher(session):
+    """
+    Return the SHA-256 state of an upload at its current offset.
+    """
+
+    with hashers_lock:
+        entry = hashers.pop(session.id, None)
+    if entry and entry[0] == session.offset:
+        return entry[1]
+    logger.info(f"Rebuilding hash state of upload {session.id} at offset {session.offset}")
+    hasher = hashlib.sha256()
+    with open(full_path(session), 'rb') as f:
+        remaining = session.offset
+        while remaining:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def keep_hasher(session, hasher):
+    with hashers_lock:
+        hashers[session.id] = (session.offset, hasher)
+        hashers.move_to_end(session.id)
+        while len(hashers) > HASH_CACHE_SIZE:
+            hashers.popitem(last=False)
+
+
+def parse_checksum(header):
+    """
+    Return the expected SHA-256 digest of an ``Upload-Checksum`` header, or None.
+    """
+
+    if not header:
+        return None
+    algorithm, _, value = header.partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise ValidationError({'Upload-Checksum': 'Only sha256 is supported.'})
+    try:
+        return base64.b64decode(value.strip(), validate=True)
+    except ValueError:
+        raise ValidationError({'Upload-Checksum': 'The checksum is not valid base64.'})
+
+
+def lock_session(session_id):
+    """
+    Lock the row of an upload for the current transaction.
+
+    The lock is taken with ``NOWAIT``: if another request holds it, this one
+    fails right away instead of waiting for the other transfer to end.
+
+    Raises:
+        OffsetConflict: If the upload is locked by another request.
+    """
+
+    try:
+        return UploadSession.objects.select_for_update(nowait=True).get(id=session_id)
+    except OperationalError:
+        raise OffsetConflict('Another request is writing to the upload.')
+
+
+def append_chunk(session_id, offset, stream, length, checksum=None):
+    """
+    Write a chunk of an upload at its offset.
+
+    The upload row is locked for the duration of the chunk, see
+    lock_session, so a concurrent request for the same upload fails with a
+    conflict at once and the client resumes from the offset it reads with
+    ``HEAD``. If the client disconnects midway, the
+    bytes received so far are kept. A chunk with a wrong checksum is
+    discarded.
+
+    Args:
+        session_id (UUID): The upload.
+        offset (int): The ``Upload-Offset`` the client sends the chunk for.
+        stream: The request body, read in blocks.
+        length (int): The announced length of the chunk.
+        checksum (bytes): The expected SHA-256 digest of the chunk, if any.
+
+    Returns:
+        UploadSession: The upload with its new offset.
+
+    Raises:
+        OffsetConflict: If offset is not the current offset of the upload,
+            or another request is writing to it.
+        ChecksumMismatch: If the chunk does not match checksum.
+    """
+
+    with transaction.atomic():
+        session = lock_session(session_id)
+        if session.state != UploadSession.UPLOADING or offset != session.offset:
+            raise OffsetConflict()
+        if session.offset + length > session.size:
+            raise ValidationError({'Upload-Offset': 'The chunk exceeds the size of the upload.'})
+        hasher = get_hasher(session)
+        chunk_hasher = hashlib.sha256()
+        written = 0
+        fd = os.open(full_path(session), os.O_WRONLY)
+        try:
+            while written < length:
+                try:
+                    block = stream.read(min(BLOCK_SIZE, length - written))
+                except OSError:
+                    logger.warning(f"Upload {session.id} interrupted after {written} bytes of the chunk")
+                    break
+                if not block:
+                    break
+                write_at(fd, block, session.offset + written)
+                written += len(block)
+                hasher.update(block)
+                chunk_hasher.update(block)
+        finally:
+            os.close(fd)
+        # The hash state now includes the chunk; a rejected chunk drops it.
+        if checksum is not None and (written < length or chunk_hasher.digest() != checksum):
+            raise ChecksumMismatch()
+        session.offset += written
+        session.save(update_fields=['offset', 'updated_at'])
+    keep_hasher(session, hasher)
+    return session
+
+
+def write_at(fd, data, position):
+    """
+    Write all of data at position without moving the file offset.
+    """
+
+    view = memoryview(data)
+    while view:
+        count = os.pwrite(fd, view, position)
+        view = view[count:]
+        position += count
+
+
+def finalize_upload(session_id):
+    """
+    Turn a complete upload into a video.
+
+    The SHA-256 of the file comes from the hash state built while the chunks
+    arrived, so the file is not read again unless the state was lost. The
+    video is created with the uploaded file in place, and its post_save
+    signal queues the transcode as for a regular upload.
+
+    Args:
+        session_id (UUID): The upload.
+
+    Returns:
+        Video: The new video.
+
+    Raises:
+        OffsetConflict: If the upload is not complete, already finalized or
+            locked by a chunk in flight.
+        ValidationError: If the file does not match the announced SHA-256.
+    """
+
+    with transaction.atomic():
+        session = lock_session(session_id)
+        if session.state != UploadSession.UPLOADING or session.offset != session.size:
+            raise OffsetConflict('The upload is not complete.')
+        session.sha256 = get_hasher(session).hexdigest()
+        if session.expected_sha256 and session.sha256 != session.expected_sha256:
+            logger.warning(f"Upload {session.id} does not match its SHA-256")
+            raise ValidationError({'sha256': 'The uploaded file does not match the announced SHA-256.'})
+        name = session.path if is_local() else store_original(session)
+        video = Video.objects.create(
+            title=session.title, description=session.description, genre=session.genre, file=name,
+            content_hash=session.sha256,
+        )
+        session.state = UploadSession.COMPLETE
+        session.video = video
+        session.save(update_fields=['sha256', 'state', 'video', 'updated_at'])
+    with hashers_lock:
+        hashers.pop(session.id, None)
+    logger.info(f"Upload {session.id} finalized as video ID {video.id}")
+    return video
+
+
+def store_original(session):
+    """
+    Move a complete upload from MEDIA_ROOT to the remote storage.
+
+    Returns:
+        str: The storage name of the original.
+    """
+
+    with open(full_path(session), 'rb') as f:
+        name = default_storage.save(session.path, File(f))
+    os.remove(full_path(session))
+    return name
+
+
+def abort_upload(session):
+    """
+    Delete an unfinished upload and its partial file.
+    """
+
+    with hashers_lock:
+        hashers.pop(session.id, None)
+    if session.state == UploadSession.UPLOADING:
+        try:
+            os.remove(full_path(session))
+        except FileNotFoundError:
+            pass
+    session.delete()